@@ -0,0 +1,1070 @@
+import io
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlparse
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.fields import format_multipart_header_param
+
+from metricas import percentil, registrar
+
+if TYPE_CHECKING:
+    # pandas se importa solo al construir una tabla (~0,3 s): el dashboard normal no la necesita
+    import pandas as pd
+
+# --------------------------------------------------
+# CONFIG BACKEND
+# --------------------------------------------------
+# EXTRACTA_API_BASE permite apuntar a otro backend (p. ej. mock_backend.py en local)
+API_BASE = os.environ.get(
+    "EXTRACTA_API_BASE",
+    "https://proyectoback-h6ajcba8cpewd5bc.brazilsouth-01.azurewebsites.net",
+)
+API_UPLOAD_URL = f"{API_BASE}/storage/pdf"
+API_UPLOAD_SESSIONS_URL = f"{API_BASE}/storage/pdf/uploads"
+API_UPLOAD_BATCH_URL = f"{API_BASE}/storage/pdf/batch"
+API_PDF_LOOKUP_URL = f"{API_BASE}/storage/pdf/lookup"
+API_PDF_LINK_URL = f"{API_BASE}/storage/pdf/link"
+API_ID_CARGA_URL = f"{API_BASE}/dashboard/id-carga"
+API_DASHBOARD_CARGAS_URL = f"{API_BASE}/dashboard/cargas"
+API_RETRY_URL = f"{API_BASE}/dashboard/cargas"
+
+# ✅ Endpoint del Excel global (ajústalo si tu backend es diferente)
+API_EXCEL_GLOBAL_URL = f"{API_BASE}/dashboard/extractions/excel"
+
+# (connect, read): conectar debe fallar rápido; leer puede tardar (PDFs grandes)
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 120
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# Circuit breaker: tras N fallos seguidos se deja de llamar al backend durante un rato
+CB_UMBRAL_FALLOS = 5
+CB_ENFRIAMIENTO_SECS = 30
+
+# Timeout de lectura adaptativo (GET): p99 observado x factor, entre el mínimo y HTTP_READ_TIMEOUT
+TIMEOUT_ADAPTATIVO_MIN_MUESTRAS = 20
+TIMEOUT_ADAPTATIVO_FACTOR = 4
+TIMEOUT_ADAPTATIVO_MIN = 2
+
+# Conexiones keep-alive reutilizables por host (>= workers de subida concurrentes)
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+
+# Tamaño de bloque al enviar PDFs en streaming (lo que se copia a la vez)
+UPLOAD_STREAM_CHUNK = 64 * 1024
+
+# Bloque al bajar el Excel de extracciones a disco (lo que se tiene en memoria a la vez)
+EXCEL_STREAM_CHUNK = 1024 * 1024
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Subida reanudable por bloques para PDFs grandes
+UPLOAD_CHUNKED_THRESHOLD = 32 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Una sesión sin completar se recuerda este tiempo para reanudarla en otro intento
+UPLOAD_SESION_TTL_SECS = 6 * 3600
+UPLOAD_MAX_RETRIES = 5
+UPLOAD_BACKOFF_BASE = 0.5
+UPLOAD_BACKOFF_MAX = 30
+# Lookup/link por hash: menos reintentos; si aun así falla se sube el PDF sin
+# más y no se vuelve a consultar durante la pausa
+DEDUP_MAX_RETRIES = 2
+DEDUP_PAUSA_SECS = 30
+
+# Vida de /dashboard/cargas en caché (compartida entre todas las sesiones)
+CARGAS_CACHE_TTL = 15
+
+# Reintento masivo: llamadas al backend por segundo, en paralelo, y ids por lote
+RETRY_MAX_POR_SEGUNDO = 10
+RETRY_MAX_WORKERS = 4
+RETRY_LOTE = 50
+RETRY_MAX_INTENTOS = 3
+
+
+# --------------------------------------------------
+# SESIÓN HTTP COMPARTIDA (una por proceso)
+# --------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    """
+    Sesión con pool de conexiones keep-alive compartida por todas las
+    sesiones de Streamlit y reruns. Evita abrir TCP+TLS en cada llamada.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Accept-Encoding": "gzip, deflate",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, resp: requests.Response):
+        super().__init__(f"HTTP {resp.status_code}: {resp.text}")
+        self.status_code = resp.status_code
+
+
+def nombre_endpoint(method: str, url: str) -> str:
+    """"POST /dashboard/cargas/{id}/retry": agrupa las métricas sin un nombre por id."""
+    ruta = urlparse(url).path
+    ruta = re.sub(r"(/dashboard/cargas|/storage/pdf/uploads)/(?!retry$)[^/]+", r"\1/{id}", ruta)
+    return f"{method} {ruta}"
+
+
+# --------------------------------------------------
+# RESILIENCIA (circuit breaker + timeouts adaptativos)
+# --------------------------------------------------
+class CircuitoAbierto(Exception):
+    """El backend viene fallando: la llamada ni se intenta (no es reintentable)."""
+
+
+class Disyuntor:
+    """
+    Circuit breaker del backend, compartido por el proceso. Tras
+    `umbral` fallos seguidos (conexión, timeout, 5xx, 429) se abre y las
+    llamadas fallan al instante durante `enfriamiento` segundos; luego deja
+    pasar una sola llamada de prueba que lo cierra o lo vuelve a abrir.
+    """
+
+    def __init__(self, umbral: int, enfriamiento: float):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self._abierto_hasta = 0.0
+        self._sondeando = False
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self) -> str:
+        if self.fallos < self.umbral:
+            return "cerrado"
+        return "abierto" if time.monotonic() < self._abierto_hasta else "semiabierto"
+
+    def permitir(self) -> None:
+        with self._lock:
+            if self.fallos < self.umbral:
+                return
+            restante = self._abierto_hasta - time.monotonic()
+            if restante > 0 or self._sondeando:
+                raise CircuitoAbierto(
+                    f"circuito abierto tras {self.fallos} fallos seguidos; "
+                    f"nuevo intento en {max(0.0, restante):.0f} s"
+                )
+            self._sondeando = True
+
+    def exito(self) -> None:
+        with self._lock:
+            self.fallos = 0
+            self._sondeando = False
+
+    def liberar(self) -> None:
+        """La llamada acabó sin decir nada del backend: no cuenta, pero suelta la prueba."""
+        with self._lock:
+            self._sondeando = False
+
+    def fallo(self) -> None:
+        with self._lock:
+            self.fallos += 1
+            self._sondeando = False
+            if self.fallos >= self.umbral:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+
+
+class TimeoutsAdaptativos:
+    """
+    Últimas latencias correctas con cuerpo (no 304) por endpoint. Con muestras suficientes el
+    timeout de lectura pasa a p99 x TIMEOUT_ADAPTATIVO_FACTOR: un backend
+    degradado se detecta en segundos, no en HTTP_READ_TIMEOUT.
+    """
+
+    def __init__(self, max_muestras: int = 200):
+        self.max_muestras = max_muestras
+        self._latencias = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, endpoint: str, segundos: float) -> None:
+        with self._lock:
+            self._latencias.setdefault(endpoint, deque(maxlen=self.max_muestras)).append(segundos)
+
+    def timeout(self, endpoint: str) -> tuple:
+        with self._lock:
+            latencias = sorted(self._latencias.get(endpoint, ()))
+        if len(latencias) < TIMEOUT_ADAPTATIVO_MIN_MUESTRAS:
+            return HTTP_TIMEOUT
+        lectura = percentil(latencias, 99) * TIMEOUT_ADAPTATIVO_FACTOR
+        return (HTTP_CONNECT_TIMEOUT, min(HTTP_READ_TIMEOUT, max(TIMEOUT_ADAPTATIVO_MIN, lectura)))
+
+
+@st.cache_resource(show_spinner=False)
+def get_disyuntor() -> Disyuntor:
+    return Disyuntor(CB_UMBRAL_FALLOS, CB_ENFRIAMIENTO_SECS)
+
+
+@st.cache_resource(show_spinner=False)
+def get_timeouts_adaptativos() -> TimeoutsAdaptativos:
+    return TimeoutsAdaptativos()
+
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Todas las llamadas a la API pasan por aquí:
+    - circuit breaker: con el circuito abierto falla al instante (CircuitoAbierto);
+    - timeout adaptativo en GET sin stream (subidas y Excel usan HTTP_TIMEOUT);
+    - métricas de duración, status y bytes (enviados + recibidos según
+      Content-Length). Con stream=True la duración es hasta recibir las cabeceras.
+    Con opcional=True (atajos como la deduplicación) un 5xx/429 no abre el
+    circuito: que falle un endpoint accesorio no debe cortar las subidas.
+    `acepta` es el Accept de la llamada: JSON salvo que se pida otra cosa (Excel).
+    """
+    opcional = kwargs.pop("opcional", False)
+    kwargs["headers"] = {"Accept": kwargs.pop("acepta", "application/json"), **(kwargs.get("headers") or {})}
+    disyuntor = get_disyuntor()
+    disyuntor.permitir()
+
+    endpoint = nombre_endpoint(method, url)
+    timeouts = get_timeouts_adaptativos()
+    adaptativo = "timeout" not in kwargs and method == "GET" and not kwargs.get("stream")
+    kwargs.setdefault("timeout", timeouts.timeout(endpoint) if adaptativo else HTTP_TIMEOUT)
+
+    inicio = time.perf_counter()
+    status, bytes_ = "EXC", 0
+    try:
+        resp = get_http_session().request(method, url, **kwargs)
+    except requests.Timeout:
+        disyuntor.fallo()
+        if adaptativo:
+            # El timeout cuenta como muestra: si el backend se vuelve más lento, el límite sube
+            timeouts.registrar(endpoint, kwargs["timeout"][1])
+        raise
+    except requests.RequestException:
+        # ConnectionError, ChunkedEncodingError, TooManyRedirects...
+        disyuntor.fallo()
+        raise
+    except BaseException:
+        # Cualquier otra cosa no culpa al backend, pero la prueba semiabierta
+        # debe quedar libre o el circuito no se cerraría nunca
+        disyuntor.liberar()
+        raise
+    else:
+        status = resp.status_code
+        bytes_ = int(resp.request.headers.get("Content-Length") or 0) + int(resp.headers.get("Content-Length") or 0)
+        if status >= 500 or status == 429:
+            if opcional:
+                disyuntor.liberar()
+            else:
+                disyuntor.fallo()
+        else:
+            disyuntor.exito()
+            # Un 304 no trae cuerpo: mezclarlo con los 200 del mismo endpoint bajaría
+            # el límite hasta el mínimo y la siguiente respuesta completa no cabría
+            if adaptativo and status != 304:
+                timeouts.registrar(endpoint, time.perf_counter() - inicio)
+        return resp
+    finally:
+        registrar("http", endpoint, (time.perf_counter() - inicio) * 1000, status, bytes_)
+
+
+# --------------------------------------------------
+# API HELPERS
+# --------------------------------------------------
+def obtener_id_carga() -> str:
+    resp = http_request("GET", API_ID_CARGA_URL)
+    if resp.status_code != 200:
+        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
+    data = resp.json()
+    if "id_carga" not in data or not data["id_carga"]:
+        raise Exception(f"Respuesta inválida: {data}")
+    return data["id_carga"]
+
+
+def descargar_excel(params: dict, destino: str, al_avanzar=None) -> int:
+    """
+    Baja el Excel de extracciones (filtrado por `params`) en streaming a
+    `destino`, pasando por un .part que se renombra al terminar. Devuelve
+    los bytes escritos; `al_avanzar(escritos, total)` recibe total=0 si el
+    backend no envía Content-Length.
+    """
+    parcial = f"{destino}.part"
+    try:
+        with http_request("GET", API_EXCEL_GLOBAL_URL, params=params, stream=True, acepta=EXCEL_MIME) as resp:
+            if resp.status_code != 200:
+                raise ErrorHTTP(resp)
+            total = int(resp.headers.get("Content-Length") or 0)
+            escritos = 0
+            with open(parcial, "wb") as f:
+                for bloque in resp.iter_content(EXCEL_STREAM_CHUNK):
+                    f.write(bloque)
+                    escritos += len(bloque)
+                    if al_avanzar:
+                        al_avanzar(escritos, total)
+        os.replace(parcial, destino)
+        return escritos
+    finally:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+
+
+def retry_carga_backend(id_carga: str):
+    url = f"{API_RETRY_URL}/{id_carga}/retry"
+    resp = http_request("POST", url)
+    return _json_o_error(resp, ok=(200,))
+
+
+def obtener_detalle_carga(id_carga: str, recurso: str, pagina: int, tam_pagina: int) -> dict:
+    """GET /dashboard/cargas/<id>/<recurso> paginado -> {"items": [...], "total": N}."""
+    resp = http_request(
+        "GET", f"{API_DASHBOARD_CARGAS_URL}/{id_carga}/{recurso}",
+        params={"page": pagina, "page_size": tam_pagina},
+    )
+    return _json_o_error(resp, ok=(200,))
+
+
+def subir_pdf_a_api(contenido, filename: str, id_carga: str):
+    """
+    `contenido` puede ser bytes o un file-like (p. ej. el UploadedFile de
+    Streamlit). El cuerpo multipart se arma al vuelo en bloques de
+    UPLOAD_STREAM_CHUNK, sin duplicar el PDF en memoria.
+    """
+    fileobj = io.BytesIO(contenido) if isinstance(contenido, (bytes, bytearray, memoryview)) else contenido
+    body = MultipartStream({"id_carga": id_carga}, [("file", filename, fileobj, "application/pdf")])
+    resp = http_request(
+        "POST",
+        API_UPLOAD_URL,
+        data=body,
+        headers={"Content-Type": body.content_type},
+    )
+    if resp.status_code not in (200, 201):
+        raise ErrorHTTP(resp)
+    return resp.json()
+
+
+class MultipartStream:
+    """
+    Cuerpo multipart/form-data con uno o varios archivos
+    [(campo, filename, fileobj, content_type)], leídos por bloques.
+    Implementa read()/__iter__/__len__ para que requests lo envíe en
+    streaming con Content-Length conocido.
+    """
+
+    def __init__(self, campos: dict, archivos: list, chunk_size: int = UPLOAD_STREAM_CHUNK):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.chunk_size = chunk_size
+
+        # Nombres escapados como lo hace urllib3 (comillas, CR/LF...): un PDF
+        # llamado 'fact "2024".pdf' no debe romper ni inyectar cabeceras
+        cabecera = b"".join(
+            (
+                f"--{boundary}\r\nContent-Disposition: form-data; "
+                f"{format_multipart_header_param('name', k)}\r\n\r\n{v}\r\n"
+            ).encode("utf-8")
+            for k, v in campos.items()
+        )
+        self._partes, self._len = [], 0
+        for i, (campo, filename, fileobj, content_type) in enumerate(archivos):
+            inicio = (b"" if i else cabecera) + (
+                f"--{boundary}\r\nContent-Disposition: form-data; "
+                f"{format_multipart_header_param('name', campo)}; "
+                f"{format_multipart_header_param('filename', filename)}\r\n"
+                f"Content-Type: {content_type}\r\n\r\n"
+            ).encode("utf-8")
+            fin = b"\r\n"
+
+            fileobj.seek(0, os.SEEK_END)
+            tam_archivo = fileobj.tell()
+            fileobj.seek(0)
+
+            self._partes += [io.BytesIO(inicio), fileobj, io.BytesIO(fin)]
+            self._len += len(inicio) + tam_archivo + len(fin)
+
+        cierre = f"--{boundary}--\r\n".encode("utf-8")
+        self._partes.append(io.BytesIO(cierre))
+        self._len += len(cierre)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self._len
+        salida = []
+        while n > 0 and self._partes:
+            bloque = self._partes[0].read(n)
+            if not bloque:
+                self._partes.pop(0)
+                continue
+            salida.append(bloque)
+            n -= len(bloque)
+        return b"".join(salida)
+
+    def __iter__(self):
+        while True:
+            bloque = self.read(self.chunk_size)
+            if not bloque:
+                return
+            yield bloque
+
+
+# --------------------------------------------------
+# SUBIDA REANUDABLE + REINTENTOS CON BACKOFF
+# --------------------------------------------------
+# Protocolo (ver mock_backend.py):
+#   POST {API_UPLOAD_SESSIONS_URL}                  {"filename","id_carga","size"} -> {"upload_id"}
+#   GET  {API_UPLOAD_SESSIONS_URL}/<id>             -> {"offset"}  (último byte confirmado)
+#   PUT  {API_UPLOAD_SESSIONS_URL}/<id>             Content-Range: bytes a-b/total -> {"offset"}
+#   POST {API_UPLOAD_SESSIONS_URL}/<id>/complete    {"id_carga"} -> respuesta de /storage/pdf
+# Si el backend no lo implementa (404/405) se usa el POST único de siempre.
+
+def es_error_reintentable(e: Exception) -> bool:
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(e, ErrorHTTP) and (e.status_code == 429 or e.status_code >= 500)
+
+
+def es_error_sin_efecto(e: Exception) -> bool:
+    """
+    Reintentable para un POST que no es idempotente: solo si la petición no
+    llegó (sin conexión) o el backend la rechazó sin procesarla (429, 503).
+    Un timeout de lectura o un 502/504 pueden esconder un PDF ya guardado.
+    """
+    if isinstance(e, (requests.ConnectionError, requests.ConnectTimeout)):
+        return True
+    return isinstance(e, ErrorHTTP) and e.status_code in (429, 503)
+
+
+def esperar_backoff(intento: int) -> None:
+    # Backoff exponencial con "full jitter": evita que todos los workers reintenten a la vez
+    time.sleep(random.uniform(0, min(UPLOAD_BACKOFF_MAX, UPLOAD_BACKOFF_BASE * (2 ** intento))))
+
+
+def con_reintentos(fn, intentos: int = UPLOAD_MAX_RETRIES, reintentable=es_error_reintentable):
+    for intento in range(intentos + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if intento >= intentos or not reintentable(e):
+                raise
+            esperar_backoff(intento)
+
+
+class EstadoSubidas:
+    """Sesiones de subida abiertas por contenido, para reanudar en el siguiente intento."""
+
+    def __init__(self, sesion_ttl: float = UPLOAD_SESION_TTL_SECS):
+        self.lock = threading.Lock()
+        self.sesion_ttl = sesion_ttl
+        self.sesiones = {}
+        # None = aún no se sabe si el backend soporta subidas reanudables
+        self.reanudable_servidor = None
+        # None = aún no se sabe si el backend soporta lookup/link por hash
+        self.dedup_servidor = None
+        # Tras un lookup/link fallido no se vuelve a consultar hasta este instante (monotonic)
+        self.dedup_pausa_hasta = 0.0
+        # None = aún no se sabe si el backend acepta varios PDFs por petición
+        self.lote_servidor = None
+
+    def sesion(self, clave) -> Optional[dict]:
+        with self.lock:
+            previa = self.sesiones.get(clave)
+            if previa is not None and previa["expira"] <= time.monotonic():
+                del self.sesiones[clave]
+                previa = None
+            return previa
+
+    def guardar_sesion(self, clave, upload_id: str, size: int) -> None:
+        ahora = time.monotonic()
+        with self.lock:
+            # Las que nadie volvió a intentar caducan aquí, no viven lo que el proceso
+            for vencida in [k for k, s in self.sesiones.items() if s["expira"] <= ahora]:
+                del self.sesiones[vencida]
+            self.sesiones[clave] = {"upload_id": upload_id, "size": size, "expira": ahora + self.sesion_ttl}
+
+    def olvidar_sesion(self, clave) -> None:
+        with self.lock:
+            self.sesiones.pop(clave, None)
+
+
+@st.cache_resource(show_spinner=False)
+def get_estado_subidas() -> EstadoSubidas:
+    return EstadoSubidas()
+
+
+def _json_o_error(resp: requests.Response, ok=(200, 201)) -> dict:
+    if resp.status_code not in ok:
+        raise ErrorHTTP(resp)
+    return resp.json()
+
+
+def _crear_subida(filename: str, id_carga: str, size: int) -> str:
+    resp = http_request("POST", API_UPLOAD_SESSIONS_URL, json={"filename": filename, "id_carga": id_carga, "size": size})
+    return _json_o_error(resp)["upload_id"]
+
+
+def _offset_subida(upload_id: str) -> int:
+    resp = http_request("GET", f"{API_UPLOAD_SESSIONS_URL}/{upload_id}")
+    return int(_json_o_error(resp, ok=(200,))["offset"])
+
+
+def _enviar_bloque(upload_id: str, offset: int, bloque: bytes, total: int) -> int:
+    resp = http_request(
+        "PUT",
+        f"{API_UPLOAD_SESSIONS_URL}/{upload_id}",
+        data=bloque,
+        headers={
+            "Content-Type": "application/octet-stream",
+            "Content-Range": f"bytes {offset}-{offset + len(bloque) - 1}/{total}",
+        },
+    )
+    if resp.status_code == 409:
+        # El backend tenía otro offset confirmado: se continúa desde ahí
+        return int(resp.json()["offset"])
+    return int(_json_o_error(resp)["offset"])
+
+
+def _completar_subida(upload_id: str, id_carga: str, filename: str) -> dict:
+    resp = http_request(
+        "POST", f"{API_UPLOAD_SESSIONS_URL}/{upload_id}/complete", json={"id_carga": id_carga, "filename": filename}
+    )
+    return _json_o_error(resp)
+
+
+def _abrir_sesion(filename: str, id_carga: str, size: int) -> Optional[str]:
+    """upload_id nuevo, o None si el backend no implementa el protocolo."""
+    estado = get_estado_subidas()
+    try:
+        upload_id = con_reintentos(lambda: _crear_subida(filename, id_carga, size))
+    except ErrorHTTP as e:
+        # Solo el alta de sesión dice si hay soporte: un 404 sobre un upload_id
+        # concreto es una sesión caducada, no un backend sin el endpoint
+        if estado.reanudable_servidor or e.status_code not in (404, 405):
+            raise
+        estado.reanudable_servidor = False
+        return None
+    estado.reanudable_servidor = True
+    return upload_id
+
+
+def _enviar_bloques(fileobj, upload_id: str, offset: int, size: int) -> None:
+    fallos = 0
+    while offset < size:
+        try:
+            fileobj.seek(offset)
+            bloque = fileobj.read(UPLOAD_CHUNK_SIZE)
+            offset = _enviar_bloque(upload_id, offset, bloque, size)
+            fallos = 0
+        except Exception as e:
+            if fallos >= UPLOAD_MAX_RETRIES or not es_error_reintentable(e):
+                raise
+            esperar_backoff(fallos)
+            fallos += 1
+            try:
+                offset = _offset_subida(upload_id)
+            except Exception:
+                pass  # se reintenta desde el offset conocido
+
+
+def subir_pdf_reanudable(fileobj, filename: str, id_carga: str, size: int, clave=None) -> Optional[dict]:
+    """
+    Sube por bloques de UPLOAD_CHUNK_SIZE. Ante un fallo transitorio espera
+    (backoff con jitter), pregunta al backend el último offset confirmado y
+    sigue desde ahí. La sesión queda registrada por `clave` (el sha256 del
+    contenido), así que volver a pulsar "Iniciar carga" reanuda aunque sea
+    con otro id_carga: la carga se indica al completar. Devuelve None si el
+    backend no soporta subidas reanudables.
+    """
+    estado = get_estado_subidas()
+    previa = estado.sesion(clave) if clave is not None else None
+
+    upload_id, offset = None, 0
+    # Con otro tamaño (p. ej. una recompresión distinta) no es el mismo envío: se empieza de cero
+    if previa is not None and previa["size"] == size:
+        try:
+            offset = con_reintentos(lambda: _offset_subida(previa["upload_id"]))
+            upload_id = previa["upload_id"]
+        except ErrorHTTP as e:
+            if e.status_code != 404:
+                raise
+            # la sesión expiró en el backend: se abre otra
+
+    try:
+        reabierta = False
+        while True:
+            if upload_id is None:
+                upload_id, offset = _abrir_sesion(filename, id_carga, size), 0
+                if upload_id is None:
+                    return None
+                if clave is not None:
+                    estado.guardar_sesion(clave, upload_id, size)
+            try:
+                _enviar_bloques(fileobj, upload_id, offset, size)
+                resultado = con_reintentos(lambda: _completar_subida(upload_id, id_carga, filename))
+                break
+            except ErrorHTTP as e:
+                # upload_id desconocido: el backend descartó la sesión a mitad de subida
+                if e.status_code != 404 or reabierta:
+                    raise
+                reabierta, upload_id = True, None
+    except Exception as e:
+        # Un fallo transitorio (o el circuito abierto) deja la sesión para el
+        # próximo intento; cualquier otro la da por perdida
+        if clave is not None and not (es_error_reintentable(e) or isinstance(e, CircuitoAbierto)):
+            estado.olvidar_sesion(clave)
+        raise
+
+    if clave is not None:
+        estado.olvidar_sesion(clave)
+    return resultado
+
+
+def subir_pdf(fileobj, filename: str, id_carga: str, clave=None):
+    """
+    Punto de entrada de subida: PDFs >= UPLOAD_CHUNKED_THRESHOLD van por el
+    protocolo reanudable (si el backend lo soporta); el resto en un POST
+    único. Ambos caminos reintentan con backoff: los bloques ante cualquier
+    error transitorio (Content-Range los hace idempotentes), el POST único
+    solo si no llegó a procesarse (ver es_error_sin_efecto).
+    `clave` identifica el contenido para reanudar la sesión en otro intento.
+    """
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+
+    if size >= UPLOAD_CHUNKED_THRESHOLD and get_estado_subidas().reanudable_servidor is not False:
+        resultado = subir_pdf_reanudable(fileobj, filename, id_carga, size, clave)
+        if resultado is not None:
+            return resultado
+
+    return con_reintentos(lambda: subir_pdf_a_api(fileobj, filename, id_carga), reintentable=es_error_sin_efecto)
+
+
+# --------------------------------------------------
+# VARIOS PDFs PEQUEÑOS EN UNA PETICIÓN
+# --------------------------------------------------
+#   POST {API_UPLOAD_BATCH_URL}  multipart: id_carga + un campo "files" por PDF
+#        -> {"results": [{"filename","ok","error"}]}  (mismo orden que los archivos)
+# Si el backend no lo implementa (404/405) cada PDF va en su propio POST.
+def subir_pdfs_en_lote(envios: list, id_carga: str) -> Optional[list]:
+    """
+    `envios` = [(fileobj, filename)]. Devuelve [{"ok", "error"}] en el mismo
+    orden, o None si el backend no acepta lotes (el llamador los envía de uno en uno).
+    """
+    estado = get_estado_subidas()
+    if estado.lote_servidor is False:
+        return None
+
+    def enviar():
+        body = MultipartStream(
+            {"id_carga": id_carga},
+            [("files", filename, fileobj, "application/pdf") for fileobj, filename in envios],
+        )
+        return _json_o_error(http_request(
+            "POST", API_UPLOAD_BATCH_URL, data=body, headers={"Content-Type": body.content_type}
+        ))
+
+    try:
+        # Como el POST único: una respuesta perdida no debe reenviar todo el paquete
+        data = con_reintentos(enviar, reintentable=es_error_sin_efecto)
+    except ErrorHTTP as e:
+        if estado.lote_servidor or e.status_code not in (404, 405):
+            raise
+        estado.lote_servidor = False
+        return None
+    estado.lote_servidor = True
+
+    resultados = data.get("results") or []
+    return [
+        {"ok": bool(r.get("ok", not r.get("error"))), "error": r.get("error")} if r is not None
+        else {"ok": False, "error": "sin respuesta del backend"}
+        for r in (resultados + [None] * len(envios))[:len(envios)]
+    ]
+
+
+# --------------------------------------------------
+# DEDUPLICACIÓN POR HASH (lookup + link en backend)
+# --------------------------------------------------
+#   GET  {API_PDF_LOOKUP_URL}?sha256=<hex>          -> {"exists": bool}
+#   POST {API_PDF_LINK_URL}  {"sha256","id_carga","filename"} -> vincula sin reenviar bytes
+def _llamada_dedup(method: str, url: str, sin_soporte: tuple, **kwargs) -> Optional[tuple]:
+    """
+    Lookup/link con reintentos (5xx, 429, red) -> (status, cuerpo JSON), con
+    cuerpo None si el status está en `sin_soporte`. La deduplicación es solo
+    un atajo: si sigue fallando, el circuito está abierto o la respuesta no
+    es un objeto JSON, devuelve None y el PDF se sube normalmente.
+    """
+    estado = get_estado_subidas()
+    if time.monotonic() < estado.dedup_pausa_hasta:
+        return None
+
+    def llamar() -> tuple:
+        resp = http_request(method, url, opcional=True, **kwargs)
+        if resp.status_code in sin_soporte:
+            return resp.status_code, None
+        if resp.status_code >= 400:
+            raise ErrorHTTP(resp)
+        data = resp.json()
+        if not isinstance(data, dict):
+            raise ValueError(f"Respuesta inesperada: {data!r}")
+        return resp.status_code, data
+
+    try:
+        return con_reintentos(llamar, DEDUP_MAX_RETRIES)
+    except Exception:
+        estado.dedup_pausa_hasta = time.monotonic() + DEDUP_PAUSA_SECS
+        return None
+
+
+def existe_pdf_en_backend(sha256: str) -> Optional[bool]:
+    """True/False según el backend; None si no soporta la consulta o no respondió."""
+    estado = get_estado_subidas()
+    if estado.dedup_servidor is False:
+        return None
+    respuesta = _llamada_dedup("GET", API_PDF_LOOKUP_URL, (404, 405), params={"sha256": sha256})
+    if respuesta is None:
+        return None
+    status, data = respuesta
+    if status in (404, 405):
+        estado.dedup_servidor = False
+        return None
+    estado.dedup_servidor = True
+    return bool(data.get("exists"))
+
+
+def vincular_pdf_existente(sha256: str, id_carga: str, filename: str) -> bool:
+    """Asocia un PDF ya almacenado a `id_carga`. False si el backend no puede hacerlo."""
+    estado = get_estado_subidas()
+    if estado.dedup_servidor is False:
+        return False
+    respuesta = _llamada_dedup(
+        "POST", API_PDF_LINK_URL, (404, 405, 409),
+        json={"sha256": sha256, "id_carga": id_carga, "filename": filename},
+    )
+    if respuesta is None:
+        return False
+    status, _ = respuesta
+    if status in (404, 405, 409):
+        # 404/405: sin soporte; 409: el backend ya no tiene ese contenido
+        if status != 409:
+            estado.dedup_servidor = False
+        return False
+    return True
+
+
+# --------------------------------------------------
+# CACHÉ DE CARGAS (TTL + ETag, compartida entre sesiones)
+# --------------------------------------------------
+class CacheCargas:
+    """
+    Guarda la respuesta de /dashboard/cargas (la lista completa, como
+    tabla columnar: tabla_cargas) durante `ttl` segundos. Al expirar
+    revalida con If-None-Match / If-Modified-Since; un 304 solo renueva el
+    TTL. Con muchas sesiones solo una consulta el backend a la vez y el
+    resto reutiliza el resultado; invalidar() no espera a esa consulta.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # None = aún no se sabe si el backend respeta ?updated_since=
+        self.incremental_servidor = None
+        # None = aún no se sabe si el backend acepta reintentos por lotes
+        self.reintento_lote_servidor = None
+        # Última lista completa ya volcada al espejo (base para calcular cambios)
+        self.tabla_sincronizada = None
+        # _lock protege solo la entrada (nunca se tiene durante una petición);
+        # _lock_consulta hace que solo una sesión consulte el backend a la vez
+        self._lock = threading.Lock()
+        self._lock_consulta = threading.Lock()
+        self._entrada = None
+        # Sube con cada invalidar(): una consulta que empezó antes no deja su resultado como vigente
+        self._generacion = 0
+
+    def invalidar(self) -> None:
+        # Se conserva ETag/datos: la próxima lectura revalida en vez de bajar todo
+        with self._lock:
+            self._generacion += 1
+            if self._entrada is not None:
+                self._entrada["expira"] = 0.0
+
+    def _vigente(self) -> Optional["pd.DataFrame"]:
+        with self._lock:
+            entrada = self._entrada
+            if entrada is not None and time.monotonic() < entrada["expira"]:
+                return entrada["data"]
+            return None
+
+    def obtener(self) -> "pd.DataFrame":
+        data = self._vigente()
+        if data is not None:
+            return data
+
+        with self._lock_consulta:
+            # Quien esperaba aquí reutiliza lo que acaba de traer otra sesión
+            data = self._vigente()
+            if data is not None:
+                return data
+            with self._lock:
+                entrada, generacion = self._entrada, self._generacion
+
+            headers = {}
+            if entrada is not None:
+                if entrada["etag"]:
+                    headers["If-None-Match"] = entrada["etag"]
+                if entrada["last_modified"]:
+                    headers["If-Modified-Since"] = entrada["last_modified"]
+
+            resp = http_request("GET", API_DASHBOARD_CARGAS_URL, headers=headers)
+            if resp.status_code == 304 and entrada is not None:
+                pass
+            elif resp.status_code != 200:
+                raise Exception(f"HTTP {resp.status_code}: {resp.text}")
+            else:
+                entrada = {
+                    "data": tabla_cargas(_como_lista(resp.json())),
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                }
+
+            with self._lock:
+                # Si se invalidó mientras tanto, la respuesta puede ser anterior
+                # al cambio: se devuelve, pero la próxima lectura revalida
+                vigente = generacion == self._generacion
+                entrada["expira"] = time.monotonic() + self.ttl if vigente else 0.0
+                self._entrada = entrada
+            return entrada["data"]
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache_cargas() -> CacheCargas:
+    return CacheCargas(CARGAS_CACHE_TTL)
+
+
+def invalidar_cache_cargas() -> None:
+    get_cache_cargas().invalidar()
+
+
+# --------------------------------------------------
+# CAMPOS DE UNA CARGA
+# --------------------------------------------------
+def estado_carga(r: dict) -> str:
+    return (r.get("status") or r.get("estado") or "").upper()
+
+
+def fecha_carga(r: dict) -> str:
+    return r.get("updated_at") or r.get("fecha") or ""
+
+
+# --------------------------------------------------
+# TABLA COLUMNAR DE CARGAS (historiales grandes)
+# --------------------------------------------------
+_COLUMNAS_BACKEND = [
+    "id_carga", "status", "estado", "updated_at", "fecha", "error_message", "total_archivos", "created_at",
+]
+
+
+def tabla_cargas(registros: list) -> "pd.DataFrame":
+    """
+    Lista de cargas del backend -> DataFrame columnar, normalizado de una
+    vez y sin .get() por fila: estado y error_message categóricos (cada
+    texto se guarda una sola vez) y cadenas en Arrow. Ocupa una fracción de
+    la lista de dicts.
+    """
+    import pandas as pd
+
+    crudo = pd.DataFrame.from_records(registros, columns=_COLUMNAS_BACKEND)
+    crudo = crudo[crudo["id_carga"].notna() & (crudo["id_carga"] != "")]
+    fecha_txt = crudo["updated_at"].fillna(crudo["fecha"]).fillna("").astype(str)
+    return pd.DataFrame({
+        "id_carga": crudo["id_carga"].astype(str).astype("string[pyarrow]"),
+        "estado": crudo["status"].fillna(crudo["estado"]).fillna("").astype(str).str.upper().astype("category"),
+        "fecha_txt": fecha_txt.astype("string[pyarrow]"),
+        "error_message": crudo["error_message"].astype("category"),
+        "updated_at": crudo["updated_at"].astype("string[pyarrow]"),
+        "total_archivos": pd.to_numeric(crudo["total_archivos"], errors="coerce").astype("Int32"),
+        "created_at": crudo["created_at"].astype("string[pyarrow]"),
+    }).reset_index(drop=True)
+
+
+def registros_tabla(tabla: "pd.DataFrame") -> list:
+    """Filas de la tabla como dicts con los nombres del backend (lo que espera guardar_cargas)."""
+    columnas = tabla[["id_carga", "estado", "updated_at", "fecha_txt", "error_message", "total_archivos", "created_at"]]
+    columnas = columnas.astype(object)
+    columnas = columnas.where(columnas.notna(), None)
+    return columnas.rename(columns={"estado": "status", "fecha_txt": "fecha"}).to_dict("records")
+
+
+def _firma_tabla(tabla: "pd.DataFrame") -> "pd.Series":
+    # Los mismos campos que comprueba el upsert del espejo
+    return (
+        tabla["estado"].astype(str)
+        + "\x1f" + tabla["updated_at"].fillna("").astype(str)
+        + "\x1f" + tabla["error_message"].astype(object).fillna("").astype(str)
+    )
+
+
+def cambiadas_tabla(actual: "pd.DataFrame", anterior: "pd.DataFrame") -> "pd.Series":
+    """Máscara de filas de `actual` nuevas o con estado/updated_at/error distintos a `anterior`."""
+    import pandas as pd
+
+    previa = pd.Series(_firma_tabla(anterior).to_numpy(), index=anterior["id_carga"].to_numpy())
+    previa = previa[~previa.index.duplicated(keep="last")]
+    firma_previa = previa.reindex(actual["id_carga"].to_numpy()).to_numpy()
+    return pd.Series(_firma_tabla(actual).to_numpy() != firma_previa, index=actual.index)
+
+
+# --------------------------------------------------
+# SINCRONIZACIÓN INCREMENTAL (cursor updated_at)
+# --------------------------------------------------
+def _como_lista(data) -> list:
+    if isinstance(data, dict):
+        return data.get("items") or []
+    return data or []
+
+
+def obtener_cargas_cambiadas(desde: str) -> list:
+    resp = http_request("GET", API_DASHBOARD_CARGAS_URL, params={"updated_since": desde})
+    if resp.status_code != 200:
+        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
+    return _como_lista(resp.json())
+
+
+def olvidar_cargas_sincronizadas() -> None:
+    """Tras una pasada fallida la siguiente compara contra la lista completa, no contra la anterior."""
+    get_cache_cargas().tabla_sincronizada = None
+
+
+def obtener_cambios_cargas(cursor: Optional[str]) -> list:
+    """
+    Cargas cambiadas desde `cursor` (updated_at). Sin cursor devuelve la
+    lista completa compartida de la caché. Si el backend ignora
+    ?updated_since=, los cambios se calculan comparando la lista completa
+    con la última ya sincronizada (un 304 no devuelve nada).
+    """
+    cache = get_cache_cargas()
+    if cursor is None or cache.incremental_servidor is False:
+        tabla = cache.obtener()
+        anterior, cache.tabla_sincronizada = cache.tabla_sincronizada, tabla
+        if cursor is None or anterior is None:
+            return registros_tabla(tabla)
+        if tabla is anterior:
+            return []
+        return registros_tabla(tabla[cambiadas_tabla(tabla, anterior)])
+
+    cambios = obtener_cargas_cambiadas(cursor)
+    if cache.incremental_servidor is None and cambios:
+        # Si devuelve filas anteriores al cursor, el filtro no se aplicó
+        cache.incremental_servidor = all(fecha_carga(r) >= cursor for r in cambios)
+    return cambios
+
+
+# --------------------------------------------------
+# REINTENTO MASIVO (lotes + límite de tasa)
+# --------------------------------------------------
+#   POST {API_RETRY_URL}/retry  {"ids": [...]} -> {"results": [{"id_carga","ok","error"}]}
+# Si el backend no lo implementa (404/405) se hace un POST .../<id>/retry por carga.
+class LimitadorTasa:
+    """Reparte turnos entre hilos: como mucho `por_segundo` llamadas por segundo."""
+
+    def __init__(self, por_segundo: float):
+        self.intervalo = 1.0 / por_segundo
+        self._lock = threading.Lock()
+        self._siguiente = time.monotonic()
+
+    def esperar(self) -> None:
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo
+        time.sleep(max(0.0, turno - ahora))
+
+
+def _con_limite(limitador: LimitadorTasa, fn):
+    def llamada():
+        limitador.esperar()
+        return fn()
+    return con_reintentos(llamada, RETRY_MAX_INTENTOS)
+
+
+def _reintentar_lote_backend(ids: list) -> list:
+    data = _json_o_error(http_request("POST", f"{API_RETRY_URL}/retry", json={"ids": ids}))
+    por_id = {r.get("id_carga"): r for r in data.get("results") or []}
+    resultados = []
+    for id_carga in ids:
+        r = por_id.get(id_carga)
+        if r is None:
+            resultados.append({"id_carga": id_carga, "ok": False, "error": "sin respuesta del backend"})
+        else:
+            resultados.append({"id_carga": id_carga, "ok": bool(r.get("ok", not r.get("error"))), "error": r.get("error")})
+    return resultados
+
+
+def _tarea_lote(limitador: LimitadorTasa, ids: list) -> list:
+    try:
+        return _con_limite(limitador, lambda: _reintentar_lote_backend(ids))
+    except Exception as e:
+        return [{"id_carga": i, "ok": False, "error": str(e)} for i in ids]
+
+
+def _tarea_una(limitador: LimitadorTasa, id_carga: str) -> list:
+    try:
+        _con_limite(limitador, lambda: retry_carga_backend(id_carga))
+        return [{"id_carga": id_carga, "ok": True, "error": None}]
+    except Exception as e:
+        return [{"id_carga": id_carga, "ok": False, "error": str(e)}]
+
+
+def reintentar_cargas(ids: list, al_avanzar=None) -> list:
+    """
+    Reintenta `ids` en paralelo (RETRY_MAX_WORKERS) sin pasar de
+    RETRY_MAX_POR_SEGUNDO llamadas al backend, por lotes si el backend lo
+    soporta. Devuelve [{"id_carga", "ok", "error"}] en el orden de `ids`.
+    `al_avanzar(hechos, total)` se llama desde el hilo que invoca, así que
+    puede pintar progreso en Streamlit.
+    """
+    cache = get_cache_cargas()
+    limitador = LimitadorTasa(RETRY_MAX_POR_SEGUNDO)
+    resultados = {}
+    pendientes = list(dict.fromkeys(ids))
+
+    if cache.reintento_lote_servidor is None and pendientes:
+        # El primer lote averigua si el backend soporta reintentos por lotes
+        lote = pendientes[:RETRY_LOTE]
+        try:
+            hechos = _con_limite(limitador, lambda: _reintentar_lote_backend(lote))
+            cache.reintento_lote_servidor = True
+        except ErrorHTTP as e:
+            if e.status_code not in (404, 405):
+                raise
+            cache.reintento_lote_servidor = False
+        else:
+            resultados.update((r["id_carga"], r) for r in hechos)
+            pendientes = pendientes[RETRY_LOTE:]
+            if al_avanzar:
+                al_avanzar(len(resultados), len(pendientes) + len(resultados))
+
+    if cache.reintento_lote_servidor:
+        tareas = [(_tarea_lote, pendientes[i:i + RETRY_LOTE]) for i in range(0, len(pendientes), RETRY_LOTE)]
+    else:
+        tareas = [(_tarea_una, id_carga) for id_carga in pendientes]
+
+    total = len(resultados) + len(pendientes)
+    with ThreadPoolExecutor(max_workers=RETRY_MAX_WORKERS, thread_name_prefix="retry") as pool:
+        futuros = [pool.submit(fn, limitador, arg) for fn, arg in tareas]
+        for fut in as_completed(futuros):
+            resultados.update((r["id_carga"], r) for r in fut.result())
+            if al_avanzar:
+                al_avanzar(len(resultados), total)
+
+    return [resultados[i] for i in dict.fromkeys(ids)]
@@ -1,28 +1,31 @@
 import streamlit as st
-import requests
 import os
-import uuid
-import time
 import base64
+import math
+import re
+import time
+from functools import partial
 from typing import Optional
 
+from metricas import get_metricas, medido, medir, percentil, registrar, throughput_subidas
+
 # --------------------------------------------------
 # CONFIG
 # --------------------------------------------------
 APP_NAME = "Extracta"
-LOGO_PATH = "assets/buho.png"
-
-API_BASE = "https://proyectoback-h6ajcba8cpewd5bc.brazilsouth-01.azurewebsites.net"
-API_UPLOAD_URL = f"{API_BASE}/storage/pdf"
-API_ID_CARGA_URL = f"{API_BASE}/dashboard/id-carga"
-API_DASHBOARD_CARGAS_URL = f"{API_BASE}/dashboard/cargas"
-API_RETRY_URL = f"{API_BASE}/dashboard/cargas"
-
-# ✅ Endpoint del Excel global (ajústalo si tu backend es diferente)
-API_EXCEL_GLOBAL_URL = f"{API_BASE}/dashboard/extractions/excel"
+STATIC_DIR = "static"
+LOGO_PATH = f"{STATIC_DIR}/buho.png"
+CSS_PATH = "assets/extracta.css"
 
-HTTP_TIMEOUT = 120
 UPLOAD_DIR = "uploads"
+DASHBOARD_PAGE_SIZES = (25, 50, 100)
+DASHBOARD_AUTO_REFRESH_SECS = 10
+# Antigüedad del espejo a partir de la cual se avisa de que los datos pueden estar desfasados
+DASHBOARD_DATOS_VIEJOS_SECS = 30
+TRABAJOS_REFRESH_SECS = 1
+ESTADOS_FILTRO = {"Todos": None, "Procesados": "PROCESSED", "Errores": "ERROR", "Cargados": "UPLOADED"}
+HISTORIAL_TIPOS = {"Todos": None, "Subidas": "subida", "Reintentos": "reintento", "Exports": "export"}
+HISTORIAL_TAM_PAGINA = 50
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 st.set_page_config(
@@ -31,254 +34,38 @@ st.set_page_config(
     page_icon="🦉",
     initial_sidebar_state="expanded",
 )
+_inicio_rerun = time.perf_counter()
 
 # --------------------------------------------------
 # CSS (STREAMLIT 1.52.2 FRIENDLY)
 # --------------------------------------------------
-def inject_css():
-    st.markdown(
-        """
-        <style>
-          header[data-testid="stHeader"] { display: none !important; }
-          div[data-testid="stToolbar"] { display: none !important; }
-
-          html, body, [class*="css"] { font-size: 18px !important; }
-          .block-container { padding-top: 0.9rem !important; padding-bottom: 2rem !important; }
-
-          .stApp{
-            background:
-              radial-gradient(1200px 700px at 10% 0%, rgba(0, 120, 212, 0.18), transparent 60%),
-              radial-gradient(900px 600px at 90% 10%, rgba(0, 153, 188, 0.14), transparent 55%),
-              linear-gradient(180deg, #0b1220 0%, #070b14 100%) !important;
-          }
-
-          h1 { font-size: 34px !important; }
-          h2 { font-size: 28px !important; }
-          h3 { font-size: 22px !important; }
-          h1,h2,h3 { color: rgba(255,255,255,0.92) !important; }
-
-          /* Sidebar */
-          section[data-testid="stSidebar"]{
-            background: linear-gradient(180deg, #0a0f1c 0%, #070b14 100%) !important;
-            border-right: 1px solid rgba(255,255,255,0.08) !important;
-          }
-          section[data-testid="stSidebar"] * { color: rgba(255,255,255,0.90) !important; }
-
-          /* Selectbox sidebar */
-          section[data-testid="stSidebar"] div[data-baseweb="select"] > div {
-            background: rgba(255,255,255,0.06) !important;
-            border: 1px solid rgba(255,255,255,0.18) !important;
-            border-radius: 12px !important;
-          }
-          section[data-testid="stSidebar"] div[data-baseweb="select"] div[role="combobox"]{
-            background: transparent !important;
-            color: rgba(255,255,255,0.95) !important;
-          }
-          section[data-testid="stSidebar"] div[data-baseweb="select"] span,
-          section[data-testid="stSidebar"] div[data-baseweb="select"] input{
-            color: rgba(255,255,255,0.95) !important;
-            -webkit-text-fill-color: rgba(255,255,255,0.95) !important;
-          }
-
-          ul[role="listbox"]{
-            background: rgba(10, 15, 28, 0.98) !important;
-            border: 1px solid rgba(255,255,255,0.14) !important;
-            border-radius: 12px !important;
-            padding: 6px !important;
-          }
-          ul[role="listbox"] li{
-            color: rgba(255,255,255,0.92) !important;
-            border-radius: 10px !important;
-            font-size: 16px !important;
-          }
+def static_serving_activo() -> bool:
+    return bool(st.get_option("server.enableStaticServing"))
 
-          /* Card general */
-          .card{
-            border: 1px solid rgba(255,255,255,0.10);
-            border-radius: 18px;
-            background: rgba(255,255,255,0.06);
-            box-shadow: 0 14px 34px rgba(0,0,0,0.35);
-            padding: 22px 24px;
-          }
-
-          /* Login */
-          .login-wrap { max-width: 460px; margin: 7vh auto 0 auto; }
-          .soft-divider { height: 1px; background: rgba(255,255,255,0.10); margin: 16px 0; }
-
-          /* Botones */
-          .stButton button, div[data-testid="stDownloadButton"] button{
-            border-radius: 12px !important;
-            font-size: 16px !important;
-            font-weight: 800 !important;
-            border: 1px solid rgba(255,255,255,0.16) !important;
-            background: rgba(255,255,255,0.08) !important;
-            color: rgba(255,255,255,0.92) !important;
-            padding: 0.75rem 1.0rem !important;
-          }
-          .stButton button:hover, div[data-testid="stDownloadButton"] button:hover{
-            border-color: rgba(0,120,212,0.60) !important;
-            background: rgba(0,120,212,0.22) !important;
-          }
-
-          /* KPI */
-          .kpi-row { display:flex; gap: 12px; flex-wrap: wrap; margin: 12px 0 16px 0; }
-          .kpi {
-            border: 1px solid rgba(255,255,255,0.10);
-            border-radius: 14px;
-            background: rgba(255,255,255,0.06);
-            padding: 14px 16px;
-            min-width: 190px;
-          }
-          .kpi .k { font-size: 13px; font-weight: 900; letter-spacing:.6px; text-transform: uppercase; color: rgba(255,255,255,0.62); }
-          .kpi .v { font-size: 26px; font-weight: 950; color: rgba(255,255,255,0.92); margin-top: 2px; }
-
-          /* Tabla tipo datatable */
-          .grid-wrap {
-            border: 1px solid rgba(255,255,255,0.10);
-            border-radius: 16px;
-            background: rgba(255,255,255,0.04);
-            box-shadow: 0 14px 34px rgba(0,0,0,0.35);
-            overflow: hidden;
-          }
-          .grid-head, .grid-row {
-            display: grid;
-            grid-template-columns: 2.2fr 2.4fr 1.6fr 5.2fr 2.3fr;
-            gap: 12px;
-            align-items: center;
-            padding: 14px 16px;
-          }
-          .grid-head {
-            background: rgba(10, 15, 28, 0.88);
-            border-bottom: 1px solid rgba(255,255,255,0.10);
-            font-size: 14px;
-            font-weight: 950;
-            letter-spacing: .6px;
-            text-transform: uppercase;
-            color: rgba(255,255,255,0.75);
-          }
-          .grid-row { border-bottom: 1px solid rgba(255,255,255,0.06); }
-          .grid-row:nth-child(even) { background: rgba(255,255,255,0.02); }
-          .grid-row:hover { background: rgba(0,120,212,0.12); }
-
-          .grid-cell {
-            overflow: hidden;
-            white-space: nowrap;
-            text-overflow: ellipsis;
-            font-size: 18px !important;
-            color: rgba(255,255,255,0.92) !important;
-            font-weight: 750 !important;
-          }
-
-          /* ID CARGA (TABLA) – BLANCO FORZADO */
-          .grid-mono, .grid-mono *{
-            font-family: ui-monospace, SFMono-Regular, Menlo, monospace !important;
-            color: #ffffff !important;
-            -webkit-text-fill-color: #ffffff !important;
-            opacity: 1 !important;
-            font-weight: 950 !important;
-            letter-spacing: 0.4px !important;
-            text-shadow: 0 0 10px rgba(0,120,212,0.45) !important;
-          }
 
-          .grid-muted { color: rgba(255,255,255,0.78) !important; font-size: 17px !important; font-weight: 700 !important; }
-
-          .chip {
-            display: inline-flex;
-            align-items: center;
-            gap: 8px;
-            padding: 9px 14px !important;
-            border-radius: 999px;
-            font-size: 16px !important;
-            font-weight: 900;
-            border: 1px solid rgba(255,255,255,0.12);
-            background: rgba(255,255,255,0.06);
-            color: rgba(255,255,255,0.92);
-          }
-          .chip-ok { border-color: rgba(46,204,113,0.40); background: rgba(46,204,113,0.14); }
-          .chip-warn { border-color: rgba(241,196,15,0.50); background: rgba(241,196,15,0.14); }
-          .chip-err { border-color: rgba(231,76,60,0.55); background: rgba(231,76,60,0.14); }
-
-          /* Panel búho */
-          .owl-panel {
-            border: 1px solid rgba(255,255,255,0.10);
-            border-radius: 16px;
-            background: rgba(255,255,255,0.04);
-            box-shadow: 0 14px 34px rgba(0,0,0,0.35);
-            height: 170px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-          }
-          .owl-panel img { max-height: 120px; width: auto; opacity: 0.95; }
-
-          /* =========================
-             FOOTER – HECHO CON AMOR
-             ========================= */
-          .app-footer{
-            margin-top: 48px;
-            padding: 18px 0 8px 0;
-            text-align: center;
-            font-size: 14px;
-            font-weight: 700;
-            color: rgba(255,255,255,0.55);
-            letter-spacing: 0.4px;
-          }
-          .app-footer span{
-            color: rgba(0, 120, 212, 0.85);
-            font-weight: 900;
-          }
-          .app-footer .heart{
-            color: #ff4d6d;
-            margin: 0 4px;
-          }
+def url_estatica(path: str) -> str:
+    # ?v=mtime: el navegador cachea la imagen y solo la vuelve a pedir si cambia
+    return f"app/{path}?v={int(os.path.getmtime(path))}"
 
-          /* =========================================================
-             SIDEBAR FIJO – NO COLAPSABLE + QUITAR BOTONES (<<)
-             ========================================================= */
-          section[data-testid="stSidebar"] {
-            width: 10rem !important;
-            min-width: 10rem !important;
-            max-width: 10rem !important;
-            transform: none !important;
-            visibility: visible !important;
-          }
 
-          section[data-testid="stSidebar"][aria-hidden="true"] {
-            transform: none !important;
-          }
+@st.cache_data(show_spinner=False, max_entries=4)
+def _css_compacto(path: str, mtime: float) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{};])\s*", r"\1", css).strip()
 
-          button[aria-label="Collapse sidebar"],
-          button[aria-label="Expand sidebar"],
-          button[aria-label="Close sidebar"],
-          button[aria-label="Open sidebar"] {
-            display: none !important;
-          }
 
-          /* ==========================================
-             BOTÓN DESCARGA EXCEL (LINK ESTILADO)
-             ========================================== */
-          .btn-download {
-            display: inline-block;
-            width: 100%;
-            text-align: center;
-            padding: 0.6rem 0.9rem;
-            border-radius: 0.6rem;
-            border: 1px solid rgba(255,255,255,0.18);
-            background: rgba(255,255,255,0.06);
-            color: inherit;
-            text-decoration: none;
-            font-weight: 800;
-            font-size: 16px;
-          }
-          .btn-download:hover {
-            border-color: rgba(255,255,255,0.28);
-            background: rgba(255,255,255,0.10);
-            text-decoration: none;
-          }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+def inject_css():
+    """
+    La hoja se lee y compacta una vez por proceso. Como el mensaje es idéntico
+    en cada rerun, Streamlit lo envía completo solo la primera vez por sesión
+    y luego una referencia por hash (global.minCachedMessageSize en
+    .streamlit/config.toml).
+    """
+    css = _css_compacto(CSS_PATH, os.path.getmtime(CSS_PATH))
+    st.markdown(f"<style>{css}</style>", unsafe_allow_html=True)
 
 
 def hide_sidebar():
@@ -313,27 +100,21 @@ def show_sidebar():
     )
 
 
-def img_to_base64(path: str) -> str:
+@st.cache_data(show_spinner=False, max_entries=16)
+def _img_to_base64(path: str, mtime: float) -> str:
     with open(path, "rb") as f:
         return base64.b64encode(f.read()).decode("utf-8")
 
 
-def render_download_excel_button(download_url: str) -> None:
-    """
-    Un SOLO botón que dispara descarga directa (sin segundo botón).
-    Se implementa como <a> estilado como botón.
-    """
-    st.markdown(
-        f"""
-        <!-- ✅ ESPACIO para que NO queden pegados (imagen vs botón) -->
-        <div style="height: 12px;"></div>
+def img_to_base64(path: str) -> str:
+    # Se codifica una vez por proceso; el mtime invalida si cambia el archivo
+    return _img_to_base64(path, os.path.getmtime(path))
 
-        <a class="btn-download" href="{download_url}" target="_self" rel="noopener">
-          ⬇️ Descargar Excel (Extracciones)
-        </a>
-        """,
-        unsafe_allow_html=True,
-    )
+
+def logo_src(path: str = LOGO_PATH) -> str:
+    if static_serving_activo():
+        return url_estatica(path)
+    return f"data:image/png;base64,{img_to_base64(path)}"
 
 
 inject_css()
@@ -341,27 +122,35 @@ inject_css()
 # --------------------------------------------------
 # LOGIN
 # --------------------------------------------------
-USUARIOS = {
-    "admin": {"password": "admin123", "rol": "admin"},
-    "usuario": {"password": "user123", "rol": "usuario"},
-}
+# Credenciales en crud.db (hash PBKDF2) y sesiones por token en memoria:
+# ver autenticacion.py. Solo stdlib + Streamlit, barato de importar aquí.
+from autenticacion import SinCredenciales, cerrar_sesion, iniciar_sesion, preparar_credenciales, sesion_activa
+
 
-if "login" not in st.session_state:
-    st.session_state.login = False
+def sesion_actual():
+    # Búsqueda O(1) en el almacén de sesiones; también vale dentro de fragments
+    return sesion_activa(st.session_state.get("token"))
 
-if "rol" not in st.session_state:
-    st.session_state.rol = "usuario"
+
+def es_admin() -> bool:
+    sesion = sesion_actual()
+    return sesion is not None and sesion.rol == "admin"
+
+
+def usuario_actual() -> Optional[str]:
+    sesion = sesion_actual()
+    return sesion.usuario if sesion else None
 
 
 def login():
     hide_sidebar()
     st.markdown('<div class="login-wrap"><div class="card">', unsafe_allow_html=True)
 
-    logo_b64 = img_to_base64(LOGO_PATH) if os.path.exists(LOGO_PATH) else ""
+    logo = logo_src() if os.path.exists(LOGO_PATH) else ""
     st.markdown(
         f"""
         <div style="display:flex;flex-direction:column;align-items:center;justify-content:center;text-align:center;">
-          {"<img src='data:image/png;base64," + logo_b64 + "' style='width:120px;height:auto;display:block;margin:0 auto 12px auto;' />" if logo_b64 else "<div style='font-size:64px;margin-bottom:8px;'>🦉</div>"}
+          {"<img src='" + logo + "' style='width:120px;height:auto;display:block;margin:0 auto 12px auto;' />" if logo else "<div style='font-size:64px;margin-bottom:8px;'>🦉</div>"}
           <div style="font-size:34px;font-weight:950;margin-bottom:4px;color:rgba(255,255,255,0.92);">{APP_NAME}</div>
           <div style="font-size:15px;color:rgba(255,255,255,0.70);">Dashboard de cargas y extracción de PDFs</div>
         </div>
@@ -378,9 +167,10 @@ def login():
         ingresar = st.button("Ingresar", use_container_width=True)
 
     if ingresar:
-        if usuario in USUARIOS and USUARIOS[usuario]["password"] == password:
-            st.session_state.login = True
-            st.session_state.rol = USUARIOS[usuario]["rol"]
+        with st.spinner("Verificando…"):
+            token = iniciar_sesion(usuario, password)
+        if token:
+            st.session_state.token = token
             st.rerun()
         else:
             st.error("Credenciales incorrectas")
@@ -388,54 +178,44 @@ def login():
     st.markdown("</div></div>", unsafe_allow_html=True)
 
 
-if not st.session_state.login:
-    login()
+try:
+    preparar_credenciales()
+except SinCredenciales as e:
+    st.error(str(e))
     st.stop()
 
+sesion = sesion_actual()
+if sesion is None:
+    with medir("login"):
+        login()
+    st.stop()
+
+# Módulos con dependencias pesadas (requests, sqlite, pypdf...) y hilos de
+# fondo: solo tras autenticarse. La pantalla de login no los carga ni llama
+# al backend; en los reruns siguientes el import ya está en sys.modules.
+with medir("imports"):
+    from auditoria import get_escritor_auditoria, registrar_evento
+    from api_client import (
+        EXCEL_MIME,
+        estado_carga,
+        fecha_carga,
+        get_disyuntor,
+        invalidar_cache_cargas,
+        obtener_id_carga,
+        reintentar_cargas,
+        retry_carga_backend,
+    )
+    from db_local import consultar_eventos, cursor_cargas, ids_cargas
+    from detalle import pagina_documentos, pagina_extracciones
+    from exportacion import export_en_cache, leer_export, params_export, preparar_export
+    from sincronizacion import get_sincronizador, vista_cargas, vista_kpis
+    from subida import get_gestor_cargas
+
 show_sidebar()
 
 # --------------------------------------------------
-# API HELPERS
+# HELPERS
 # --------------------------------------------------
-def obtener_id_carga() -> str:
-    resp = requests.get(API_ID_CARGA_URL, timeout=HTTP_TIMEOUT)
-    if resp.status_code != 200:
-        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
-    data = resp.json()
-    if "id_carga" not in data or not data["id_carga"]:
-        raise Exception(f"Respuesta inválida: {data}")
-    return data["id_carga"]
-
-
-def obtener_cargas_desde_backend():
-    resp = requests.get(API_DASHBOARD_CARGAS_URL, timeout=HTTP_TIMEOUT)
-    if resp.status_code != 200:
-        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
-    return resp.json()
-
-
-def retry_carga_backend(id_carga: str):
-    url = f"{API_RETRY_URL}/{id_carga}/retry"
-    resp = requests.post(url, timeout=HTTP_TIMEOUT)
-    if resp.status_code != 200:
-        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
-    return resp.json()
-
-
-def nombre_unico(nombre: str) -> str:
-    base, ext = os.path.splitext(nombre)
-    return f"{base}_{uuid.uuid4().hex}{ext}"
-
-
-def subir_pdf_a_api(file_bytes: bytes, filename: str, id_carga: str):
-    files = {"file": (filename, file_bytes, "application/pdf")}
-    data = {"id_carga": id_carga}
-    resp = requests.post(API_UPLOAD_URL, files=files, data=data, timeout=HTTP_TIMEOUT)
-    if resp.status_code not in (200, 201):
-        raise Exception(f"HTTP {resp.status_code}: {resp.text}")
-    return resp.json()
-
-
 def comentario_por_estado(status: str, error_message: Optional[str]) -> str:
     st_norm = (status or "").upper()
     if st_norm == "ERROR":
@@ -448,86 +228,166 @@ def comentario_por_estado(status: str, error_message: Optional[str]) -> str:
     return "Estado actualizado."
 
 
-# --------------------------------------------------
-# SIDEBAR + MENU
-# --------------------------------------------------
-st.sidebar.markdown(f"## {APP_NAME}")
-st.sidebar.caption(f"Rol: **{st.session_state.rol}**")
+def ir_a_pagina(n: int) -> None:
+    st.session_state.dash_pagina = n
+
+
+def ir_a_pagina_historial(n: int) -> None:
+    st.session_state.hist_pagina = n
+
+
+def alternar_detalle(id_carga: str) -> None:
+    # Un solo detalle abierto a la vez; al abrir otro se empieza por la primera página
+    abierto = st.session_state.get("dash_detalle") == id_carga
+    st.session_state.dash_detalle = None if abierto else id_carga
+    st.session_state.det_paginas = {"documentos": 1, "extracciones": 0}
+
+
+def cargar_mas_detalle(recurso: str) -> None:
+    st.session_state.det_paginas[recurso] += 1
+
+
+def sincronizar_espejo() -> Optional[str]:
+    """Pasada inmediata de sincronización; devuelve el error si el backend falla."""
+    try:
+        get_sincronizador().sincronizar()
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def hace(segundos: float) -> str:
+    if segundos < 90:
+        return f"{segundos:.0f} s"
+    if segundos < 90 * 60:
+        return f"{segundos / 60:.0f} min"
+    return f"{segundos / 3600:.1f} h"
+
+
+def avisar_si_desfasado(sincronizador) -> None:
+    """
+    Stale-while-revalidate: el grid siempre muestra la última copia buena
+    (el espejo) y, si está desfasada, lo indica con su antigüedad.
+    """
+    if sincronizador.ultima_ok is None:
+        edad = None
+    else:
+        edad = time.time() - sincronizador.ultima_ok
+
+    if sincronizador.ultimo_error:
+        desde = f"datos de hace {hace(edad)}" if edad is not None else "datos de una sesión anterior"
+        st.warning(
+            f"Backend no disponible ({sincronizador.ultimo_error}). "
+            f"Se muestra la copia local ({desde})."
+        )
+    elif edad is None:
+        st.caption("⏳ Mostrando la copia local; actualizando en segundo plano…")
+    elif edad > DASHBOARD_DATOS_VIEJOS_SECS:
+        st.caption(f"⏳ Datos de hace {hace(edad)}; actualizando en segundo plano…")
 
-menu = st.sidebar.selectbox(
-    "Menú",
-    ["Dashboard", "Subir PDFs"] if st.session_state.rol == "admin" else ["Dashboard"],
-    index=0,
-)
 
 # --------------------------------------------------
-# DASHBOARD
+# REINTENTO MASIVO (errores que cumplen los filtros)
 # --------------------------------------------------
-if menu == "Dashboard":
-    top_left, top_right = st.columns([3.4, 1.4], vertical_alignment="top")
+def reintentar_errores_filtrados(filtros: dict) -> None:
+    ids = ids_cargas({**filtros, "estado": "ERROR"})
+    barra = st.progress(0, text=f"Reintentando {len(ids)} cargas…")
 
-    with top_left:
-        st.markdown("## Estado de las cargas")
+    def al_avanzar(hechos: int, total: int) -> None:
+        barra.progress(hechos / total if total else 1.0, text=f"Reintentando… {hechos}/{total}")
 
-        c1, c2 = st.columns([1.4, 1.6], vertical_alignment="center")
-        with c1:
-            refrescar = st.button("Refrescar", use_container_width=True)
-        with c2:
-            ocultar_ok = st.toggle("Ocultar OK", value=False)
+    inicio = time.perf_counter()
+    try:
+        resultados = reintentar_cargas(ids, al_avanzar)
+    except Exception as e:
+        st.error(f"No se pudo reintentar: {e}")
+        registrar_evento("reintento", False, usuario=usuario_actual(), resultado="masivo", detalle=str(e),
+                         latencia_ms=(time.perf_counter() - inicio) * 1000)
+        return
+
+    # Los reintentos van por lotes y en paralelo: cada fila lleva la duración de la operación completa
+    ms = (time.perf_counter() - inicio) * 1000
+    for r in resultados:
+        registrar_evento("reintento", r["ok"], usuario=usuario_actual(), id_carga=r["id_carga"],
+                         latencia_ms=ms, resultado="masivo", detalle=r["error"])
+
+    # Una sola invalidación + sincronización para todo el lote
+    invalidar_cache_cargas()
+    sincronizar_espejo()
+    st.session_state.resumen_reintentos = resultados
+    st.rerun()
 
-        if refrescar:
-            st.rerun()
 
-    with top_right:
-        # ✅ Imagen del búho + botón debajo (un solo botón, descarga directa)
-        if os.path.exists(LOGO_PATH):
-            logo_b64 = img_to_base64(LOGO_PATH)
-            st.markdown(
-                f"""
-                <div class="owl-panel">
-                  <img src="data:image/png;base64,{logo_b64}" alt="logo"/>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-        else:
-            st.markdown('<div class="owl-panel" style="font-size:64px;">🦉</div>', unsafe_allow_html=True)
+def render_resumen_reintentos(resultados: list) -> None:
+    fallidos = [f"{r['id_carga']}: {r['error']}" for r in resultados if not r["ok"]]
+    ok_count = len(resultados) - len(fallidos)
+    if fallidos:
+        st.error(f"Reintentos enviados: {ok_count}/{len(resultados)}. Fallaron {len(fallidos)}:")
+        st.code("\n".join(fallidos), language=None)
+    else:
+        st.success(f"Reintentos enviados: {ok_count}/{len(resultados)}.")
+
+
+# --------------------------------------------------
+# PANEL DE CARGAS (KPIs + GRID, se re-ejecuta como fragment)
+# --------------------------------------------------
+@medido("dashboard.grid")
+def render_panel_cargas(filtros: dict, tam_pagina: int) -> None:
+    """
+    KPIs + grid paginado. Corre como st.fragment: con auto-refresco se
+    re-ejecuta solo esta parte cada DASHBOARD_AUTO_REFRESH_SECS, sin volver a
+    inyectar CSS ni repintar el resto de la página.
 
-        # ✅ Botón debajo del búho (descarga directa) + espacio (ya incluido en render_download_excel_button)
-        render_download_excel_button(API_EXCEL_GLOBAL_URL)
+    Lee del espejo local en crud.db a través de las vistas compartidas del
+    sincronizador: la sesión solo guarda filtros y página.
+    """
+    # La página se lee aquí (no como argumento): Anterior/Siguiente solo re-ejecutan el fragment
+    pagina = st.session_state.get("dash_pagina", 1)
+
+    sincronizador = get_sincronizador()
+    if sincronizador.ultima_ok is None and sincronizador.ultimo_error is None:
+        if cursor_cargas() is None:
+            # Espejo vacío: no hay nada que servir mientras se revalida, se espera a la primera pasada
+            sincronizar_espejo()
+        else:
+            # Primera vez en este proceso: se sirve el espejo tal cual y se revalida en segundo plano
+            sincronizador.despertar()
+    avisar_si_desfasado(sincronizador)
 
     try:
-        cargas = obtener_cargas_desde_backend()
+        resultado = vista_cargas(filtros, pagina, tam_pagina)
+        total = resultado["total"]
+        total_paginas = max(1, math.ceil(total / tam_pagina))
+        if pagina > total_paginas:
+            # Quedan menos filas que antes (reintento, refresco): se ajusta aquí
+            # mismo; un rerun del fragment falla si corre dentro de un rerun completo
+            pagina = total_paginas
+            ir_a_pagina(pagina)
+            resultado = vista_cargas(filtros, pagina, tam_pagina)
     except Exception as e:
         st.error(f"No se pudo consultar el dashboard: {e}")
-        st.stop()
+        return
 
-    if not cargas:
-        st.info("No hay cargas registradas.")
-        st.stop()
+    if total == 0:
+        filtros_activos = any(filtros[k] for k in ("estado", "desde", "hasta", "texto"))
+        st.info("Ninguna carga coincide con los filtros." if filtros_activos else "No hay cargas registradas.")
+        return
 
     rows = []
-    for r in cargas:
-        id_carga = r.get("id_carga") or ""
-        fecha = r.get("updated_at") or r.get("fecha") or ""
+    for r in resultado["items"]:
         status = (r.get("status") or r.get("estado") or "")
-        status_norm = status.upper()
-        error_message = r.get("error_message")
-
-        if ocultar_ok and status_norm == "PROCESSED":
-            continue
-
         rows.append({
-            "id_carga": id_carga,
-            "fecha": fecha,
-            "status_norm": status_norm,
-            "comentario": comentario_por_estado(status, error_message),
+            "id_carga": r.get("id_carga") or "",
+            "fecha": fecha_carga(r),
+            "status_norm": estado_carga(r),
+            "updated_at": r.get("updated_at"),
+            "comentario": comentario_por_estado(status, r.get("error_message")),
         })
 
-    total = len(rows)
-    ok = sum(1 for x in rows if x["status_norm"] == "PROCESSED")
-    err = sum(1 for x in rows if x["status_norm"] == "ERROR")
-    upl = sum(1 for x in rows if x["status_norm"] == "UPLOADED")
+    conteos = resultado["conteos"] or {}
+    ok = conteos.get("PROCESSED", "—")
+    err = conteos.get("ERROR", "—")
+    upl = conteos.get("UPLOADED", "—")
 
     st.markdown(
         f"""
@@ -541,6 +401,17 @@ if menu == "Dashboard":
         unsafe_allow_html=True,
     )
 
+    if "resumen_reintentos" in st.session_state:
+        render_resumen_reintentos(st.session_state.pop("resumen_reintentos"))
+
+    # Se comprueba en cada ejecución del fragment: una sesión caducada deja de ver las acciones
+    admin = es_admin()
+    if admin and conteos.get("ERROR"):
+        with st.popover(f"Reintentar errores filtrados ({conteos['ERROR']})"):
+            st.caption(f"Se reintentarán las {conteos['ERROR']} cargas en ERROR que cumplen los filtros actuales.")
+            if st.button("Confirmar reintento", key="retry_masivo", type="primary"):
+                reintentar_errores_filtrados(filtros)
+
     st.markdown('<div class="grid-wrap">', unsafe_allow_html=True)
     st.markdown(
         """
@@ -595,16 +466,39 @@ if menu == "Dashboard":
             st.markdown(f'<div class="grid-cell grid-muted">{x["comentario"]}</div>', unsafe_allow_html=True)
 
         with c_accion:
-            if status_norm == "ERROR" and st.session_state.rol == "admin":
-                if st.button("Reintentar", key=f"retry_{id_carga}", use_container_width=True):
-                    try:
-                        retry_carga_backend(id_carga)
-                        st.success(f"Reintento enviado: {id_carga}")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"No se pudo reintentar: {e}")
-            else:
-                st.caption("—")
+            abierto = st.session_state.get("dash_detalle") == id_carga
+            c_det, c_btn = st.columns([1, 2.4], vertical_alignment="center")
+            with c_det:
+                st.button(
+                    "✕" if abierto else "🔍",
+                    key=f"det_{id_carga}",
+                    help="Ocultar detalle" if abierto else "Ver documentos y extracciones",
+                    on_click=alternar_detalle,
+                    args=(id_carga,),
+                    use_container_width=True,
+                )
+            with c_btn:
+                if status_norm == "ERROR" and admin:
+                    if st.button("Reintentar", key=f"retry_{id_carga}", use_container_width=True):
+                        inicio = time.perf_counter()
+                        try:
+                            retry_carga_backend(id_carga)
+                            registrar_evento("reintento", True, usuario=usuario_actual(), id_carga=id_carga,
+                                             latencia_ms=(time.perf_counter() - inicio) * 1000, resultado="individual")
+                            invalidar_cache_cargas()
+                            sincronizar_espejo()
+                            st.success(f"Reintento enviado: {id_carga}")
+                            st.rerun()
+                        except Exception as e:
+                            registrar_evento("reintento", False, usuario=usuario_actual(), id_carga=id_carga,
+                                             latencia_ms=(time.perf_counter() - inicio) * 1000,
+                                             resultado="individual", detalle=str(e))
+                            st.error(f"No se pudo reintentar: {e}")
+                else:
+                    st.caption("—")
+
+        if abierto:
+            render_detalle_carga(id_carga, x["updated_at"])
 
         st.markdown(
             "<div style='height:1px; background:rgba(255,255,255,0.06); margin: 0 16px;'></div>",
@@ -613,32 +507,502 @@ if menu == "Dashboard":
 
     st.markdown("</div>", unsafe_allow_html=True)
 
+    p_prev, p_info, p_next = st.columns([1.2, 3.0, 1.2], vertical_alignment="center")
+    with p_prev:
+        st.button(
+            "← Anterior",
+            disabled=pagina <= 1,
+            on_click=ir_a_pagina,
+            args=(pagina - 1,),
+            use_container_width=True,
+        )
+    with p_info:
+        st.markdown(
+            f'<div class="grid-muted" style="text-align:center;">Página {pagina} de {total_paginas} · {total} cargas</div>',
+            unsafe_allow_html=True,
+        )
+    with p_next:
+        st.button(
+            "Siguiente →",
+            disabled=pagina >= total_paginas,
+            on_click=ir_a_pagina,
+            args=(pagina + 1,),
+            use_container_width=True,
+        )
+
+
+# --------------------------------------------------
+# DETALLE DE UNA CARGA (solo al abrirlo, página a página)
+# --------------------------------------------------
+def _filas_detalle(obtener, id_carga: str, version: Optional[str], paginas: int) -> Optional[dict]:
+    """Junta las `paginas` primeras páginas; cada una sale de la caché LRU o se pide una vez."""
+    filas, total, local = [], 0, False
+    for p in range(1, paginas + 1):
+        resultado = obtener(id_carga, version, p)
+        if resultado is None:
+            return None
+        filas.extend(resultado["items"])
+        total, local = resultado["total"], resultado.get("local", False)
+    return {"items": filas, "total": total, "local": local}
+
+
+def _boton_cargar_mas(recurso: str, cargadas: int, total: int) -> None:
+    if cargadas < total:
+        st.button(
+            f"Cargar más ({cargadas} de {total})",
+            key=f"det_mas_{recurso}",
+            on_click=cargar_mas_detalle,
+            args=(recurso,),
+        )
+
+
+def render_detalle_carga(id_carga: str, version: Optional[str]) -> None:
+    paginas = st.session_state.setdefault("det_paginas", {"documentos": 1, "extracciones": 0})
+    with st.container(border=True):
+        try:
+            docs = _filas_detalle(pagina_documentos, id_carga, version, paginas["documentos"])
+        except Exception as e:
+            st.error(f"No se pudo cargar el detalle: {e}")
+            return
+
+        st.markdown(f"**Documentos de {id_carga}** ({docs['total']})")
+        if docs["local"]:
+            st.caption("El backend no expone el detalle: se listan los PDFs subidos desde este front, sin estado por documento.")
+        if docs["items"]:
+            st.dataframe(docs["items"], hide_index=True, use_container_width=True)
+        else:
+            st.caption("Sin documentos registrados.")
+        _boton_cargar_mas("documentos", len(docs["items"]), docs["total"])
+
+        if not paginas["extracciones"]:
+            st.button("Ver extracciones", key="det_ver_ext", on_click=cargar_mas_detalle, args=("extracciones",))
+            return
+
+        try:
+            ext = _filas_detalle(pagina_extracciones, id_carga, version, paginas["extracciones"])
+        except Exception as e:
+            st.error(f"No se pudieron cargar las extracciones: {e}")
+            return
+        if ext is None:
+            st.caption("El backend no expone extracciones por carga; están en el Excel de extracciones.")
+            return
+        st.markdown(f"**Extracciones** ({ext['total']})")
+        if ext["items"]:
+            st.dataframe(ext["items"], hide_index=True, use_container_width=True)
+        else:
+            st.caption("Sin datos extraídos todavía.")
+        _boton_cargar_mas("extracciones", len(ext["items"]), ext["total"])
+
+
+# --------------------------------------------------
+# TENDENCIAS (agregados por hora/día de los contadores KPI)
+# --------------------------------------------------
+def render_tendencias() -> None:
+    granularidad = st.radio(
+        "Agrupar por", ["dia", "hora"], horizontal=True, key="dash_granularidad",
+        format_func=lambda g: "Día" if g == "dia" else "Hora",
+    )
+    kpis = vista_kpis(granularidad, 30 if granularidad == "dia" else 48)
+    if not kpis:
+        st.caption("Sin datos todavía.")
+        return
+
+    buckets = [k["bucket"] for k in kpis]
+    st.bar_chart(
+        {
+            "periodo": buckets,
+            "Procesadas": [k["procesadas"] for k in kpis],
+            "Errores": [k["errores"] for k in kpis],
+        },
+        x="periodo",
+        height=220,
+    )
+
+    terminadas = sum(k["procesadas"] + k["errores"] for k in kpis)
+    errores = sum(k["errores"] for k in kpis)
+    con_tiempo = sum(k["con_tiempo"] for k in kpis)
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Cargas nuevas", sum(k["recibidas"] for k in kpis))
+    m2.metric("Tasa de error", f"{errores / terminadas:.1%}" if terminadas else "—")
+    m3.metric(
+        "Media UPLOADED → PROCESSED",
+        f"{sum(k['segundos_proceso'] for k in kpis) / con_tiempo:.0f}s" if con_tiempo else "—",
+    )
+
+
+# --------------------------------------------------
+# EXPORTACIÓN EXCEL (streaming a disco + caché, se re-ejecuta como fragment)
+# --------------------------------------------------
+def render_exportacion_excel() -> None:
+    """
+    Excel de extracciones, completo o filtrado. Se baja del backend a disco
+    por bloques mostrando el progreso y queda en caché hasta que cambie
+    alguna carga; el botón de descarga lee el archivo solo al pulsarlo.
+    """
+    with st.popover("⬇️ Descargar Excel (Extracciones)", use_container_width=True):
+        id_carga = st.text_input("ID carga", placeholder="Todas", key="exp_id").strip()
+        estado_sel = st.selectbox("Estado", list(ESTADOS_FILTRO), key="exp_estado")
+        rango = st.date_input("Fechas", value=(), format="YYYY-MM-DD", key="exp_fechas")
+        params = params_export({
+            "id_carga": id_carga,
+            "estado": ESTADOS_FILTRO[estado_sel],
+            "desde": rango[0] if len(rango) > 0 else None,
+            "hasta": rango[1] if len(rango) > 1 else None,
+        })
+
+        ruta = export_en_cache(params)
+        if ruta is None and st.button("Preparar Excel", key="exp_preparar", use_container_width=True):
+            barra = st.progress(0, text="Descargando del backend…")
+
+            def al_avanzar(escritos: int, total: int) -> None:
+                mb = escritos / 1024 / 1024
+                if total:
+                    barra.progress(min(escritos / total, 1.0), text=f"{mb:.1f} / {total / 1024 / 1024:.1f} MB")
+                else:
+                    barra.progress(0, text=f"{mb:.1f} MB")
+
+            inicio = time.perf_counter()
+            try:
+                ruta = preparar_export(params, al_avanzar)
+                st.session_state["exp_generado"] = ruta
+                registrar_evento("export", True, usuario=usuario_actual(), id_carga=id_carga or None,
+                                 archivo=os.path.basename(ruta), size_bytes=os.path.getsize(ruta),
+                                 latencia_ms=(time.perf_counter() - inicio) * 1000, resultado="excel",
+                                 detalle=str(params) if params else None)
+            except Exception as e:
+                registrar_evento("export", False, usuario=usuario_actual(), id_carga=id_carga or None,
+                                 latencia_ms=(time.perf_counter() - inicio) * 1000, resultado="excel",
+                                 detalle=str(e))
+                st.error(f"No se pudo generar el Excel: {e}")
+            barra.empty()
+
+        if ruta:
+            # Lo generado en esta sesión ya quedó auditado; lo servido desde
+            # la caché se registra al pulsar Descargar
+            en_cache = ruta != st.session_state.get("exp_generado")
+            st.download_button(
+                "Descargar",
+                data=partial(leer_export, ruta),
+                file_name=f"extracciones_{id_carga}.xlsx" if id_carga else "extracciones.xlsx",
+                mime=EXCEL_MIME,
+                key="exp_descargar",
+                on_click=registrar_evento if en_cache else None,
+                args=("export", True),
+                kwargs={
+                    "usuario": usuario_actual(), "id_carga": id_carga or None, "archivo": os.path.basename(ruta),
+                    "size_bytes": os.path.getsize(ruta), "resultado": "excel (caché)",
+                    "detalle": str(params) if params else None,
+                },
+                use_container_width=True,
+            )
+            st.caption("Listo: no se vuelve a generar mientras no cambie ninguna carga.")
+
+
+# --------------------------------------------------
+# LOTES DE SUBIDA EN SEGUNDO PLANO (progreso, se re-ejecuta como fragment)
+# --------------------------------------------------
+def render_resumen_carga(resultados: list, total: int) -> None:
+    ok_count = sum(1 for r in resultados if r["ok"])
+    errores = [f"{r['archivo']}: {r['error']}" for r in resultados if not r["ok"]]
+    vinculados = sum(1 for r in resultados if r["accion"] == "vinculado")
+    duplicados = [f"{r['archivo']}: {r['error']}" for r in resultados if r["accion"] == "duplicado"]
+
+    if errores:
+        st.error(f"Carga finalizada con errores. OK={ok_count}/{total}")
+        st.code("\n".join(errores), language=None)
+    else:
+        st.success(f"Carga completada correctamente. OK={ok_count}/{total}")
+
+    if vinculados or duplicados:
+        st.caption(
+            f"Sin reenviar bytes: {vinculados} ya almacenados (vinculados a la carga), "
+            f"{len(duplicados)} repetidos en el lote."
+        )
+        if duplicados:
+            st.code("\n".join(duplicados), language=None)
+
+    rechazados = sum(1 for r in resultados if r["accion"] == "rechazado")
+    ahorro = sum(r.get("ahorro", 0) for r in resultados)
+    if rechazados or ahorro:
+        st.caption(
+            f"Validación previa: {rechazados} rechazados sin llegar al backend, "
+            f"{ahorro / 1024 / 1024:.1f} MB ahorrados por recompresión."
+        )
+
+
+@medido("subida.progreso")
+def render_trabajos(trabajo_ids: list, con_resumen: bool, sondeando: bool) -> None:
+    """
+    Progreso de los lotes indicados, leído del gestor compartido. Si se está
+    sondeando y ya no queda ninguno activo, un rerun completo apaga el sondeo.
+    """
+    gestor = get_gestor_cargas()
+    activos = 0
+    for trabajo_id in trabajo_ids:
+        trabajo = gestor.obtener(trabajo_id)
+        if trabajo is None:
+            continue
+        r = trabajo.resumen()
+        activos += 0 if r["terminado"] else 1
+
+        st.markdown(f"**Carga {r['id_carga']}** · {r['hechos']}/{r['total']} archivos · {r['segundos']:.0f}s")
+        if r["terminado"]:
+            texto = f"{r['hechos'] / r['segundos']:.1f} archivos/s" if r["segundos"] else None
+        elif r["eta"] is not None:
+            texto = f"Quedan ~{hace(r['eta'])}"
+        else:
+            texto = "Calculando tiempo restante…"
+        st.progress(int((r["hechos"] / r["total"]) * 100) if r["total"] else 100, text=texto)
+        if r["terminado"] and con_resumen:
+            render_resumen_carga(r["resultados"], r["total"])
+
+    if sondeando and activos == 0:
+        st.rerun()
+
+
+# --------------------------------------------------
+# HISTORIAL (auditoría de subidas, reintentos y exports, se re-ejecuta como fragment)
+# --------------------------------------------------
+@medido("historial")
+def render_historial() -> None:
+    """Eventos guardados en crud.db por el escritor de auditoría, filtrados y paginados en SQLite."""
+    h_tipo, h_fechas, h_texto, h_err = st.columns([1.5, 2.2, 2.2, 1.1], vertical_alignment="bottom")
+    with h_tipo:
+        tipo_sel = st.selectbox("Tipo", list(HISTORIAL_TIPOS), key="hist_tipo")
+    with h_fechas:
+        rango = st.date_input("Fechas", value=(), format="YYYY-MM-DD", key="hist_fechas")
+    with h_texto:
+        texto = st.text_input("Buscar", placeholder="Archivo o ID carga", key="hist_texto")
+    with h_err:
+        solo_errores = st.toggle("Solo fallos", key="hist_errores")
+
+    filtros = {
+        "tipo": HISTORIAL_TIPOS[tipo_sel],
+        "solo_errores": solo_errores,
+        "desde": rango[0] if len(rango) > 0 else None,
+        "hasta": rango[1] if len(rango) > 1 else None,
+        "texto": texto.strip(),
+    }
+    firma = tuple(filtros.values())
+    if st.session_state.get("hist_firma") != firma:
+        st.session_state.hist_firma = firma
+        st.session_state.hist_pagina = 1
+    pagina = st.session_state.get("hist_pagina", 1)
+
+    datos = consultar_eventos(filtros, pagina, HISTORIAL_TAM_PAGINA)
+    if datos["items"]:
+        st.dataframe(
+            datos["items"],
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "ok": st.column_config.CheckboxColumn("OK"),
+                "tamaño_kb": st.column_config.NumberColumn("KB", format="%.1f"),
+                "latencia_ms": st.column_config.NumberColumn("Latencia (ms)", format="%.0f"),
+            },
+        )
+    else:
+        st.caption("Sin eventos para estos filtros.")
+
+    total_paginas = max(1, math.ceil(datos["total"] / HISTORIAL_TAM_PAGINA))
+    p_prev, p_info, p_next = st.columns([1.2, 3.0, 1.2], vertical_alignment="center")
+    with p_prev:
+        st.button(
+            "← Anterior",
+            key="hist_prev",
+            disabled=pagina <= 1,
+            on_click=ir_a_pagina_historial,
+            args=(pagina - 1,),
+            use_container_width=True,
+        )
+    with p_info:
+        st.markdown(
+            f'<div class="grid-muted" style="text-align:center;">Página {pagina} de {total_paginas} · {datos["total"]} eventos</div>',
+            unsafe_allow_html=True,
+        )
+    with p_next:
+        st.button(
+            "Siguiente →",
+            key="hist_next",
+            disabled=pagina >= total_paginas,
+            on_click=ir_a_pagina_historial,
+            args=(pagina + 1,),
+            use_container_width=True,
+        )
+
+    escritor = get_escritor_auditoria()
+    if escritor.pendientes or escritor.descartados:
+        st.caption(
+            f"{escritor.pendientes} eventos pendientes de escribir · {escritor.descartados} descartados"
+            + (f" (último error: {escritor.ultimo_error})" if escritor.ultimo_error else "")
+        )
+
+
+# --------------------------------------------------
+# PANEL DE RENDIMIENTO (solo admin)
+# --------------------------------------------------
+def _tabla_percentiles(filas: list) -> None:
+    if filas:
+        st.dataframe(filas, hide_index=True, use_container_width=True)
+    else:
+        st.caption("Sin mediciones todavía.")
+
+
+@st.dialog("Rendimiento", width="large")
+def render_panel_rendimiento() -> None:
+    metricas = get_metricas()
+
+    reruns = sorted(m["ms"] for m in metricas.mediciones("rerun"))
+    mbps = throughput_subidas()
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Rerun p50", f"{percentil(reruns, 50):.0f} ms" if reruns else "—")
+    m2.metric("Rerun p95", f"{percentil(reruns, 95):.0f} ms" if reruns else "—")
+    m3.metric("Rerun p99", f"{percentil(reruns, 99):.0f} ms" if reruns else "—")
+    m4.metric("Subida", f"{mbps:.2f} MB/s" if mbps is not None else "—")
+
+    disyuntor = get_disyuntor()
+    if disyuntor.estado != "cerrado":
+        st.warning(f"Circuito del backend {disyuntor.estado} tras {disyuntor.fallos} fallos seguidos.")
+
+    st.markdown("**API (ms por endpoint)**")
+    _tabla_percentiles(metricas.resumen("http"))
+    st.markdown("**Secciones de render (ms)**")
+    _tabla_percentiles(metricas.resumen("seccion") + metricas.resumen("rerun"))
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.download_button(
+            "Exportar (JSONL)",
+            data=metricas.exportar_jsonl,
+            file_name="metricas_extracta.jsonl",
+            mime="application/jsonl",
+            use_container_width=True,
+        )
+    with c2:
+        if st.button("Vaciar", use_container_width=True):
+            metricas.limpiar()
+            st.rerun()
+
+
+# --------------------------------------------------
+# SIDEBAR + MENU
+# --------------------------------------------------
+st.sidebar.markdown(f"## {APP_NAME}")
+st.sidebar.caption(f"{sesion.usuario} · Rol: **{sesion.rol}**")
+
+menu = st.sidebar.selectbox(
+    "Menú",
+    ["Dashboard", "Subir PDFs", "Historial"] if sesion.rol == "admin" else ["Dashboard"],
+    index=0,
+)
+
+if sesion.rol == "admin" and st.sidebar.button("📈 Rendimiento", key="perf_btn"):
+    render_panel_rendimiento()
+
+# --------------------------------------------------
+# DASHBOARD
+# --------------------------------------------------
+if menu == "Dashboard":
+    top_left, top_right = st.columns([3.4, 1.4], vertical_alignment="top")
+
+    with top_left:
+        st.markdown("## Estado de las cargas")
+
+        c1, c2, c3 = st.columns([1.4, 1.6, 1.8], vertical_alignment="center")
+        with c1:
+            refrescar = st.button("Refrescar", use_container_width=True)
+        with c2:
+            ocultar_ok = st.toggle("Ocultar OK", value=False)
+        with c3:
+            auto_refresco = st.toggle(f"Auto-refrescar ({DASHBOARD_AUTO_REFRESH_SECS}s)", value=False, key="dash_auto")
+
+        if refrescar:
+            invalidar_cache_cargas()
+            sincronizar_espejo()
+            st.rerun()
+
+    with top_right:
+        # ✅ Imagen del búho + botón debajo (un solo botón, descarga directa)
+        if os.path.exists(LOGO_PATH):
+            st.markdown(
+                f"""
+                <div class="owl-panel">
+                  <img src="{logo_src()}" alt="logo"/>
+                </div>
+                """,
+                unsafe_allow_html=True,
+            )
+        else:
+            st.markdown('<div class="owl-panel" style="font-size:64px;">🦉</div>', unsafe_allow_html=True)
+
+        # ✅ Botón debajo del búho + espacio para que no queden pegados
+        st.markdown("<div style='height: 12px;'></div>", unsafe_allow_html=True)
+        st.fragment(render_exportacion_excel)()
+
+    trabajos_activos = [t.id for t in get_gestor_cargas().activos()]
+    if trabajos_activos:
+        with st.expander(f"Cargas en curso ({len(trabajos_activos)})", expanded=True):
+            st.fragment(render_trabajos, run_every=TRABAJOS_REFRESH_SECS)(trabajos_activos, False, True)
+
+    f_estado, f_fechas, f_texto, f_tam = st.columns([1.5, 2.2, 2.2, 1.1], vertical_alignment="bottom")
+    with f_estado:
+        estado_sel = st.selectbox("Estado", list(ESTADOS_FILTRO), key="dash_estado")
+    with f_fechas:
+        rango = st.date_input("Fechas", value=(), format="YYYY-MM-DD", key="dash_fechas")
+    with f_texto:
+        texto = st.text_input("Buscar ID carga", placeholder="ID carga", key="dash_texto")
+    with f_tam:
+        tam_pagina = st.selectbox("Por página", DASHBOARD_PAGE_SIZES, key="dash_tam")
+
+    filtros = {
+        "estado": ESTADOS_FILTRO[estado_sel],
+        "ocultar_ok": ocultar_ok,
+        "desde": rango[0] if len(rango) > 0 else None,
+        "hasta": rango[1] if len(rango) > 1 else None,
+        "texto": texto.strip(),
+    }
+
+    # Cualquier cambio de filtros vuelve a la primera página
+    firma_filtros = (tuple(filtros.values()), tam_pagina)
+    if st.session_state.get("dash_firma") != firma_filtros:
+        st.session_state.dash_firma = firma_filtros
+        st.session_state.dash_pagina = 1
+
+    panel = st.fragment(
+        render_panel_cargas,
+        run_every=DASHBOARD_AUTO_REFRESH_SECS if auto_refresco else None,
+    )
+    panel(filtros, tam_pagina)
+
+    with st.expander("Tendencias", expanded=False):
+        st.fragment(render_tendencias)()
+
 # --------------------------------------------------
 # SUBIR PDFs (COMPACTO)
 # --------------------------------------------------
 elif menu == "Subir PDFs":
     st.markdown("## Subir PDFs")
 
-    try:
-        id_carga = obtener_id_carga()
-    except Exception as e:
-        st.error(f"No se pudo generar ID de carga: {e}")
-        st.stop()
-
+    # El ID se pide al backend al pulsar "Iniciar carga" (uno por lote), no en cada rerun
+    ultimo_id = st.session_state.get("ultimo_id_carga")
     st.markdown(
         f"""
         <div class="idcard">
-          <div class="label">ID Carga asignado</div>
-          <div class="value">{id_carga}</div>
+          <div class="label">{"Último ID de carga" if ultimo_id else "ID Carga"}</div>
+          <div class="value">{ultimo_id or "Se asignará al iniciar la carga"}</div>
         </div>
         """,
         unsafe_allow_html=True,
     )
 
+    # La key cambia tras lanzar un lote: el uploader queda vacío y los
+    # archivos ya entregados al gestor no se pueden volver a enviar por error
+    st.session_state.setdefault("uploader_n", 0)
     archivos = st.file_uploader(
         "Selecciona archivos PDF",
         type=["pdf"],
         accept_multiple_files=True,
+        key=f"uploader_{st.session_state.uploader_n}",
     )
 
     st.markdown("<div style='height:6px'></div>", unsafe_allow_html=True)
@@ -646,39 +1010,42 @@ elif menu == "Subir PDFs":
     iniciar = st.button("Iniciar carga", disabled=not bool(archivos))
 
     if iniciar and archivos:
-        progress = st.progress(0)
-        total = len(archivos)
-        ok_count = 0
-        errores = []
-
-        for i, archivo in enumerate(archivos):
-            try:
-                if archivo.size == 0:
-                    raise Exception("PDF vacío")
-
-                file_bytes = archivo.getbuffer().tobytes()
-                nombre_envio = nombre_unico(archivo.name)
+        try:
+            id_carga = obtener_id_carga()
+        except Exception as e:
+            st.error(f"No se pudo generar ID de carga: {e}")
+            st.stop()
+
+        # Se sube en segundo plano: se puede navegar o recargar sin cortar el lote
+        trabajo_id = get_gestor_cargas().lanzar(archivos, id_carga, sesion.usuario)
+        st.session_state.setdefault("trabajos", []).append(trabajo_id)
+        st.session_state.ultimo_id_carga = id_carga
+        st.session_state.uploader_n += 1
+        st.rerun()
+
+    mis_trabajos = list(reversed(st.session_state.get("trabajos", [])))
+    if mis_trabajos:
+        activos = {t.id for t in get_gestor_cargas().activos()}
+        sondear = any(tid in activos for tid in mis_trabajos)
+        st.fragment(
+            render_trabajos,
+            run_every=TRABAJOS_REFRESH_SECS if sondear else None,
+        )(mis_trabajos, True, sondear)
 
-                subir_pdf_a_api(file_bytes, nombre_envio, id_carga)
-                ok_count += 1
-
-            except Exception as e:
-                errores.append(f"{archivo.name}: {str(e)}")
-
-            progress.progress(int(((i + 1) / total) * 100))
-            time.sleep(0.02)
-
-        if errores:
-            st.error(f"Carga finalizada con errores. OK={ok_count}/{total}")
-            st.code("\n".join(errores), language=None)
-        else:
-            st.success(f"Carga completada correctamente. OK={ok_count}/{total}")
+# --------------------------------------------------
+# HISTORIAL
+# --------------------------------------------------
+elif menu == "Historial":
+    st.markdown("## Historial")
+    st.caption("Subidas, reintentos y exports registrados en segundo plano (pueden tardar un instante en aparecer).")
+    st.fragment(render_historial)()
 
 # --------------------------------------------------
 # LOGOUT
 # --------------------------------------------------
 st.sidebar.divider()
 if st.sidebar.button("Cerrar sesión", key="logout_btn"):
+    cerrar_sesion(st.session_state.get("token"))
     st.session_state.clear()
     st.rerun()
 
@@ -693,3 +1060,5 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
+
+registrar("rerun", menu, (time.perf_counter() - _inicio_rerun) * 1000)
@@ -0,0 +1,154 @@
+"""
+Historial de subidas, reintentos y exports en crud.db.
+
+Quien registra solo encola (put_nowait, sin tocar la base); un hilo de
+fondo junta lo pendiente y lo escribe en una transacción por lote (tabla
+eventos y, para los PDFs almacenados, documentos). Si la cola se llena,
+los eventos se descartan y se cuentan: la subida nunca espera al historial.
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import streamlit as st
+
+from db_local import EVENTOS_COLUMNAS, fila_documento, guardar_lote_auditoria
+
+# --------------------------------------------------
+# CONFIG AUDITORÍA
+# --------------------------------------------------
+# Tras el primer evento se espera este rato a que lleguen más antes de escribir
+AUDITORIA_ESPERA_LOTE_SECS = 0.5
+AUDITORIA_LOTE_MAX = 500
+# Eventos pendientes como máximo (lo que no cabe se descarta)
+AUDITORIA_COLA_MAX = 20000
+# Intentos de escribir un lote (la base puede estar ocupada) antes de darlo por perdido
+AUDITORIA_REINTENTOS = 3
+
+
+# --------------------------------------------------
+# ESCRITOR EN SEGUNDO PLANO (uno por proceso)
+# --------------------------------------------------
+class EscritorAuditoria:
+    """Cola de ("evento" | "documento", fila) que un hilo daemon vuelca por lotes."""
+
+    def __init__(self, espera_lote: float = AUDITORIA_ESPERA_LOTE_SECS, lote_max: int = AUDITORIA_LOTE_MAX,
+                 cola_max: int = AUDITORIA_COLA_MAX):
+        self.espera_lote = espera_lote
+        self.lote_max = lote_max
+        # Los productores (descartes por cola llena) y el hilo escritor suman a la vez
+        self._lock_contadores = threading.Lock()
+        self.escritos = 0
+        self.descartados = 0
+        self.ultimo_error = None
+        self._cola = queue.Queue(maxsize=cola_max)
+        self._hilo = threading.Thread(target=self._bucle, name="auditoria", daemon=True)
+        self._hilo.start()
+        atexit.register(self.vaciar, 5)
+
+    def encolar(self, tabla: str, fila: tuple) -> None:
+        try:
+            self._cola.put_nowait((tabla, fila))
+        except queue.Full:
+            with self._lock_contadores:
+                self.descartados += 1
+
+    @property
+    def pendientes(self) -> int:
+        return self._cola.qsize()
+
+    def vaciar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se escriba lo encolado hasta ahora (tests, bench, cierre)."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self._cola.unfinished_tasks:
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _bucle(self) -> None:
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.espera_lote
+            while len(lote) < self.lote_max:
+                restante = limite - time.monotonic()
+                try:
+                    lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._escribir(lote)
+            finally:
+                for _ in lote:
+                    self._cola.task_done()
+
+    def _escribir(self, lote: list) -> None:
+        eventos = [fila for tabla, fila in lote if tabla == "evento"]
+        documentos = [fila for tabla, fila in lote if tabla == "documento"]
+        for intento in range(AUDITORIA_REINTENTOS):
+            try:
+                guardar_lote_auditoria(eventos, documentos)
+                with self._lock_contadores:
+                    self.escritos += len(lote)
+                return
+            except Exception as e:
+                self.ultimo_error = str(e)
+                time.sleep(0.2 * (intento + 1))
+        with self._lock_contadores:
+            self.descartados += len(lote)
+
+
+@st.cache_resource(show_spinner=False)
+def get_escritor_auditoria() -> EscritorAuditoria:
+    return EscritorAuditoria()
+
+
+# --------------------------------------------------
+# API DE REGISTRO (no bloquea)
+# --------------------------------------------------
+def registrar_evento(tipo: str, ok: bool, *, usuario: Optional[str] = None, id_carga: Optional[str] = None,
+                     archivo: Optional[str] = None, size_bytes: Optional[int] = None,
+                     sha256: Optional[str] = None, latencia_ms: Optional[float] = None,
+                     resultado: Optional[str] = None, detalle: Optional[str] = None) -> None:
+    campos = {
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "tipo": tipo,
+        "usuario": usuario,
+        "id_carga": id_carga,
+        "archivo": archivo,
+        "tamaño_kb": round(size_bytes / 1024, 2) if size_bytes is not None else None,
+        "sha256": sha256,
+        "latencia_ms": round(latencia_ms, 2) if latencia_ms is not None else None,
+        "ok": int(ok),
+        "resultado": resultado,
+        "detalle": detalle,
+    }
+    get_escritor_auditoria().encolar("evento", tuple(campos[c] for c in EVENTOS_COLUMNAS))
+
+
+def registrar_documento_async(nombre_archivo: str, ruta: str, size_bytes: int, sha256: str, id_carga: str,
+                              sha256_almacenado: Optional[str] = None) -> None:
+    """Alta en documentos de un PDF almacenado, por la cola (la fecha es la de ahora)."""
+    get_escritor_auditoria().encolar(
+        "documento", fila_documento(nombre_archivo, ruta, size_bytes, sha256, id_carga, sha256_almacenado)
+    )
+
+
+def auditar_subida(resultado: dict, id_carga: str, usuario: Optional[str] = None) -> None:
+    """Un evento por PDF de un lote, a partir del resultado de subida.subir_archivo/subir_paquete."""
+    registrar_evento(
+        "subida",
+        resultado["ok"],
+        usuario=usuario,
+        id_carga=id_carga,
+        archivo=resultado["archivo"],
+        # Tamaño original (bytes es lo enviado, menor si se recomprimió)
+        size_bytes=resultado["bytes"] + resultado.get("ahorro", 0),
+        sha256=resultado["sha256"],
+        latencia_ms=resultado.get("ms"),
+        resultado=resultado["accion"] or "error",
+        detalle=resultado["error"],
+    )
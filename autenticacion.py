@@ -0,0 +1,245 @@
+"""
+Autenticación de operadores.
+
+Las credenciales viven en la tabla usuarios de crud.db con un hash PBKDF2
+con sal y se verifican una sola vez por login. El hash tarda a propósito;
+hashlib suelta el GIL mientras calcula, así que no frena los reruns de
+otras sesiones. Un login correcto emite un token
+firmado con HMAC que se guarda en memoria con caducidad: cada rerun solo
+comprueba la firma y busca el token en un dict.
+
+No importa db_local hasta que hace falta: la pantalla de login solo abre la
+base una vez por proceso, para comprobar que hay cuentas (preparar_credenciales).
+
+Alta o cambio de contraseña desde la consola:
+
+    python autenticacion.py <usuario> <admin|usuario>
+"""
+import argparse
+import base64
+import functools
+import getpass
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+import streamlit as st
+
+# --------------------------------------------------
+# CONFIG AUTENTICACIÓN
+# --------------------------------------------------
+# PBKDF2-SHA256: ~0,3 s por verificación en un núcleo actual
+PASSWORD_ITERACIONES = 600_000
+PASSWORD_SAL_BYTES = 16
+# Verificaciones simultáneas como máximo (cada una ocupa un núcleo mientras dura)
+AUTH_MAX_WORKERS = 4
+# Vida de una sesión desde el login y sesiones vivas como máximo en el proceso
+SESION_TTL_SECS = 8 * 3600
+SESIONES_MAX = 5000
+# Clave de firma de los tokens; sin ella se genera una por proceso (los
+# tokens ya viven solo en memoria, así que un reinicio cierra las sesiones)
+SESION_SECRETO = os.environ.get("EXTRACTA_SESION_SECRETO", "").encode() or secrets.token_bytes(32)
+
+ROLES = ("admin", "usuario")
+
+# Cuentas que se crean si la tabla no tiene ninguna con contraseña (instalación
+# nueva o migración desde el antiguo dict USUARIOS). Después manda la base.
+# usuario -> (variable de entorno con la contraseña inicial, rol). No hay
+# contraseñas por defecto: sin las variables la app no arranca.
+USUARIOS_INICIALES = {
+    "admin": ("EXTRACTA_PASSWORD_ADMIN", "admin"),
+    "usuario": ("EXTRACTA_PASSWORD_USUARIO", "usuario"),
+}
+
+
+# --------------------------------------------------
+# HASH DE CONTRASEÑAS
+# --------------------------------------------------
+def hash_password(password: str, iteraciones: int = PASSWORD_ITERACIONES) -> str:
+    """'pbkdf2_sha256$iteraciones$sal$hash' (sal y hash en base64)."""
+    sal = secrets.token_bytes(PASSWORD_SAL_BYTES)
+    dk = hashlib.pbkdf2_hmac("sha256", password.encode(), sal, iteraciones)
+    return "$".join(("pbkdf2_sha256", str(iteraciones), base64.b64encode(sal).decode(), base64.b64encode(dk).decode()))
+
+
+def verificar_password(password: str, almacenado: str) -> bool:
+    try:
+        algoritmo, iteraciones, sal, esperado = almacenado.split("$")
+        if algoritmo != "pbkdf2_sha256":
+            return False
+        dk = hashlib.pbkdf2_hmac("sha256", password.encode(), base64.b64decode(sal), int(iteraciones))
+        esperado = base64.b64decode(esperado)
+    except ValueError:  # incluye binascii.Error: hash almacenado corrupto
+        return False
+    return hmac.compare_digest(dk, esperado)
+
+
+@functools.lru_cache(maxsize=1)
+def _hash_senuelo() -> str:
+    # Para usuarios inexistentes se verifica contra este hash: la respuesta
+    # tarda lo mismo y no delata qué nombres existen
+    return hash_password(secrets.token_hex(8))
+
+
+# --------------------------------------------------
+# SESIONES (compartidas por el proceso)
+# --------------------------------------------------
+class Sesion(NamedTuple):
+    usuario: str
+    rol: str
+    expira: float
+
+
+class SesionesActivas:
+    """
+    Token -> Sesion con TTL fijo. Al ser fijo, el orden de inserción es el
+    de caducidad: las vencidas se purgan desde el principio del OrderedDict.
+    """
+
+    def __init__(self, ttl: float = SESION_TTL_SECS, max_sesiones: int = SESIONES_MAX, secreto: bytes = SESION_SECRETO):
+        self.ttl = ttl
+        self.max_sesiones = max_sesiones
+        self._secreto = secreto
+        self._sesiones = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _firma(self, id_sesion: str) -> str:
+        return hmac.new(self._secreto, id_sesion.encode(), hashlib.sha256).hexdigest()
+
+    def _purgar(self, ahora: float) -> None:
+        while self._sesiones:
+            token, sesion = next(iter(self._sesiones.items()))
+            if sesion.expira > ahora and len(self._sesiones) <= self.max_sesiones:
+                break
+            del self._sesiones[token]
+
+    def abrir(self, usuario: str, rol: str) -> str:
+        id_sesion = secrets.token_urlsafe(24)
+        token = f"{id_sesion}.{self._firma(id_sesion)}"
+        ahora = time.monotonic()
+        with self._lock:
+            self._sesiones[token] = Sesion(usuario, rol, ahora + self.ttl)
+            self._purgar(ahora)
+        return token
+
+    def validar(self, token: Optional[str]) -> Optional[Sesion]:
+        if not token:
+            return None
+        id_sesion, _, firma = token.partition(".")
+        if not hmac.compare_digest(firma.encode(), self._firma(id_sesion).encode()):
+            return None
+        with self._lock:
+            sesion = self._sesiones.get(token)
+            if sesion is not None and sesion.expira <= time.monotonic():
+                del self._sesiones[token]
+                sesion = None
+        return sesion
+
+    def cerrar(self, token: Optional[str]) -> None:
+        with self._lock:
+            self._sesiones.pop(token, None)
+
+    def activas(self) -> int:
+        with self._lock:
+            self._purgar(time.monotonic())
+            return len(self._sesiones)
+
+
+@st.cache_resource(show_spinner=False)
+def get_sesiones() -> SesionesActivas:
+    return SesionesActivas()
+
+
+@st.cache_resource(show_spinner=False)
+def get_pool_auth() -> ThreadPoolExecutor:
+    """
+    Solo acota la concurrencia: quien hace login espera igual su resultado,
+    pero una ráfaga de logins no ocupa más de AUTH_MAX_WORKERS núcleos.
+    """
+    return ThreadPoolExecutor(max_workers=AUTH_MAX_WORKERS, thread_name_prefix="auth")
+
+
+# --------------------------------------------------
+# USUARIOS
+# --------------------------------------------------
+def registrar_usuario(usuario: str, password: str, rol: str, nombre: Optional[str] = None, email: str = "") -> None:
+    """Alta o cambio de contraseña. Las sesiones ya abiertas siguen hasta caducar."""
+    from db_local import guardar_usuario
+
+    guardar_usuario(usuario, hash_password(password), rol, nombre=nombre, email=email)
+
+
+class SinCredenciales(Exception):
+    pass
+
+
+@st.cache_resource(show_spinner=False)
+def preparar_credenciales() -> bool:
+    """
+    Siembra USUARIOS_INICIALES si crud.db no tiene ninguna cuenta con
+    contraseña. Sin sus variables de entorno lanza SinCredenciales (al
+    fallar no queda en caché: se reintenta en el siguiente rerun).
+    """
+    from db_local import hay_credenciales
+
+    if hay_credenciales():
+        return True
+    faltan = [variable for variable, _ in USUARIOS_INICIALES.values() if not os.environ.get(variable)]
+    if faltan:
+        raise SinCredenciales(
+            "crud.db no tiene usuarios con contraseña. Define " + " y ".join(faltan)
+            + " (ya no hay contraseñas por defecto como admin123/user123) o crea las cuentas con "
+            "`python autenticacion.py <usuario> <admin|usuario>`."
+        )
+    for usuario, (variable, rol) in USUARIOS_INICIALES.items():
+        registrar_usuario(usuario, os.environ[variable], rol)
+    return True
+
+
+def _verificar(usuario: str, password: str) -> Optional[str]:
+    """Rol del usuario si las credenciales son correctas. Corre en el pool de auth (ver get_pool_auth)."""
+    from db_local import credenciales_usuario
+
+    cred = credenciales_usuario(usuario)
+    correcta = verificar_password(password, cred["password_hash"] if cred else _hash_senuelo())
+    return cred["rol"] if cred and correcta else None
+
+
+def iniciar_sesion(usuario: str, password: str) -> Optional[str]:
+    """
+    Token de sesión, o None si usuario o contraseña no son válidos. Bloquea
+    el rerun de quien entra mientras dura el hash (y la espera en el pool).
+    """
+    if not usuario or not password:
+        return None
+    rol = get_pool_auth().submit(_verificar, usuario.strip(), password).result()
+    if rol is None:
+        return None
+    return get_sesiones().abrir(usuario.strip(), rol)
+
+
+def sesion_activa(token: Optional[str]) -> Optional[Sesion]:
+    return get_sesiones().validar(token)
+
+
+def cerrar_sesion(token: Optional[str]) -> None:
+    get_sesiones().cerrar(token)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Alta o cambio de contraseña de un usuario de Extracta en crud.db")
+    parser.add_argument("usuario")
+    parser.add_argument("rol", choices=ROLES)
+    args = parser.parse_args()
+
+    password = getpass.getpass(f"Contraseña para {args.usuario}: ")
+    if not password or password != getpass.getpass("Repítela: "):
+        parser.error("contraseña vacía o no coincide")
+    registrar_usuario(args.usuario, password, args.rol)
+    print(f"Usuario {args.usuario} ({args.rol}) guardado")
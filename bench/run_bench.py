@@ -0,0 +1,391 @@
+"""
+Benchmarks reproducibles de Extracta contra mock_backend.py (sin tocar Azure).
+
+Cada escenario corre en un subproceso propio (cachés de proceso, memoria y
+EXTRACTA_API_BASE limpios) dentro de un directorio temporal con una copia
+de crud.db, assets/, static/ y .streamlit/:
+
+  dashboard  app.py headless con AppTest: primer render (incluye la
+             sincronización del espejo), renders en caliente y cambio de
+             página, según el nº de cargas del backend.
+  subida     el gestor de lotes de subida.py (el mismo camino que
+             "Iniciar carga"), según nº y tamaño de los PDFs.
+  inicio     arranque en frío: render del login (módulos cargados y
+             llamadas al backend antes de autenticarse) y de "Subir PDFs".
+
+Los resultados (tiempos, MB/s, pico de memoria) se guardan en JSON junto al
+commit actual para comparar entre commits:
+
+    python bench/run_bench.py --cargas 100,1000,5000 --archivos 10,50 --tam-kb 256,4096
+    python bench/run_bench.py --comparar bench/resultados/A.json bench/resultados/B.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(RAIZ, "app.py")
+RESULTADOS_DIR = os.path.join(RAIZ, "bench", "resultados")
+
+
+# --------------------------------------------------
+# ENTORNO AISLADO
+# --------------------------------------------------
+def preparar_directorio() -> str:
+    destino = tempfile.mkdtemp(prefix="extracta_bench_")
+    for carpeta in ("assets", "static", ".streamlit"):
+        origen = os.path.join(RAIZ, carpeta)
+        if os.path.isdir(origen):
+            shutil.copytree(origen, os.path.join(destino, carpeta))
+    shutil.copy(os.path.join(RAIZ, "crud.db"), os.path.join(destino, "crud.db"))
+    return destino
+
+
+def iniciar_mock(args):
+    sys.path.insert(0, RAIZ)
+    import mock_backend
+
+    _, estado, api_base = mock_backend.iniciar_servidor(
+        0,
+        latencia=args.latencia,
+        fail_rate=args.fail_rate,
+        latencia_dashboard=args.latencia_dashboard,
+        fail_rate_dashboard=args.fail_rate_dashboard,
+    )
+    # api_client lee la URL al importarse: tiene que estar antes de importar la app
+    os.environ["EXTRACTA_API_BASE"] = api_base
+    # Cuentas iniciales para la copia de crud.db (el bench entra sin pasar por el login)
+    for variable in ("EXTRACTA_PASSWORD_ADMIN", "EXTRACTA_PASSWORD_USUARIO"):
+        os.environ.setdefault(variable, uuid.uuid4().hex)
+    return estado
+
+
+def memoria_pico() -> dict:
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    memoria = {"pico_rss_mb": round(rss_kb / 1024 / (1024 if sys.platform == "darwin" else 1), 2)}
+    if tracemalloc.is_tracing():
+        memoria["pico_python_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+    return memoria
+
+
+def _ms(segundos: float) -> float:
+    return round(segundos * 1000, 2)
+
+
+def _sesion_admin(at) -> None:
+    # Token abierto directamente en el almacén del proceso (sin pasar por el hash del login)
+    from autenticacion import get_sesiones
+
+    at.session_state["token"] = get_sesiones().abrir("bench", "admin")
+
+
+# --------------------------------------------------
+# ESCENARIOS (se ejecutan en el subproceso)
+# --------------------------------------------------
+def escenario_dashboard(args) -> dict:
+    estado = iniciar_mock(args)
+    estados = ("PROCESSED", "ERROR", "UPLOADED")
+    for i in range(args.n):
+        estado.tocar_carga(f"bench{i:07d}", estados[i % 3], "fallo simulado" if i % 3 == 1 else None)
+
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    _sesion_admin(at)
+
+    inicio = time.perf_counter()
+    at.run()
+    primer_render = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    calientes = []
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        at.run()
+        calientes.append(time.perf_counter() - inicio)
+
+    siguiente = next((b for b in at.button if b.label == "Siguiente →"), None)
+    cambio_pagina = None
+    if siguiente is not None and not siguiente.disabled:
+        inicio = time.perf_counter()
+        siguiente.click().run()
+        cambio_pagina = time.perf_counter() - inicio
+
+    return {
+        "cargas": args.n,
+        "primer_render_ms": _ms(primer_render),
+        "render_p50_ms": _ms(statistics.median(calientes)),
+        "render_max_ms": _ms(max(calientes)),
+        "cambio_pagina_ms": _ms(cambio_pagina) if cambio_pagina is not None else None,
+        **memoria_pico(),
+    }
+
+
+class ArchivoBench(io.BytesIO):
+    """Lo mínimo de un UploadedFile de Streamlit que usa subida.py."""
+
+    def __init__(self, nombre: str, contenido: bytes):
+        super().__init__(contenido)
+        self.name = nombre
+        self.size = len(contenido)
+
+
+def pdf_sintetico(tam: int) -> bytes:
+    """
+    PDF de una página con un stream de `tam` bytes aleatorios: pasa la
+    validación previa y la deduplicación por hash no se salta ningún envío.
+    """
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % tam + os.urandom(tam) + b"\nendstream",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objetos, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    return bytes(pdf)
+
+
+def escenario_subida(args) -> dict:
+    iniciar_mock(args)
+    import subida
+
+    tam = args.tam_kb * 1024
+    archivos = [ArchivoBench(f"bench_{i}.pdf", pdf_sintetico(tam)) for i in range(args.n)]
+    total_bytes = sum(a.size for a in archivos)
+
+    gestor = subida.get_gestor_cargas()
+    inicio = time.perf_counter()
+    trabajo = gestor.obtener(gestor.lanzar(archivos, "bench"))
+    if not trabajo.esperar(args.timeout):
+        raise RuntimeError(f"El lote no terminó en {args.timeout}s")
+    segundos = time.perf_counter() - inicio
+
+    resultados = trabajo.resumen()["resultados"]
+    return {
+        "archivos": args.n,
+        "tam_kb": args.tam_kb,
+        "segundos": round(segundos, 3),
+        "mb_s": round(total_bytes / 1024 / 1024 / segundos, 2),
+        "archivos_s": round(args.n / segundos, 2),
+        "errores": sum(1 for r in resultados if not r["ok"]),
+        "rechazados": sum(1 for r in resultados if r["accion"] == "rechazado"),
+        **memoria_pico(),
+    }
+
+
+# Módulos que la pantalla de login no debería cargar
+MODULOS_PESADOS = ("requests", "pandas", "pypdf", "api_client", "subida")
+
+
+def escenario_inicio(args) -> dict:
+    iniciar_mock(args)
+    from streamlit.testing.v1 import AppTest
+
+    from metricas import get_metricas
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    inicio = time.perf_counter()
+    at.run()
+    login = time.perf_counter() - inicio
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    resultado = {
+        "login_ms": _ms(login),
+        "login_modulos_pesados": [m for m in MODULOS_PESADOS if m in sys.modules],
+        "login_llamadas_http": len(get_metricas().mediciones("http")),
+    }
+
+    at = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+    _sesion_admin(at)
+    inicio = time.perf_counter()
+    at.run()
+    resultado["primer_render_tras_login_ms"] = _ms(time.perf_counter() - inicio)
+
+    antes = len(get_metricas().mediciones("http"))
+    at.sidebar.selectbox[0].select("Subir PDFs")
+    subir = []
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        at.run()
+        subir.append(time.perf_counter() - inicio)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    resultado.update({
+        "subir_pdfs_primer_ms": _ms(subir[0]),
+        "subir_pdfs_p50_ms": _ms(statistics.median(subir)),
+        "subir_pdfs_llamadas_id_carga": sum(
+            1 for m in get_metricas().mediciones("http")[antes:] if m["nombre"].endswith("/id-carga")
+        ),
+        **memoria_pico(),
+    })
+    return resultado
+
+
+ESCENARIOS = {"dashboard": escenario_dashboard, "subida": escenario_subida, "inicio": escenario_inicio}
+
+
+def ejecutar_hijo(args) -> None:
+    if args.tracemalloc:
+        # Mide el pico de objetos Python, pero ralentiza mucho: no mezclar con los tiempos
+        tracemalloc.start()
+    directorio = preparar_directorio()
+    os.chdir(directorio)
+    sys.path.insert(0, RAIZ)
+    try:
+        resultado = ESCENARIOS[args.escenario](args)
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(directorio, ignore_errors=True)
+    print(json.dumps(resultado))
+
+
+# --------------------------------------------------
+# ORQUESTACIÓN (proceso padre)
+# --------------------------------------------------
+def lanzar(args, escenario: str, extra: list) -> dict:
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--hijo", escenario,
+        "--latencia", str(args.latencia), "--fail-rate", str(args.fail_rate),
+        "--latencia-dashboard", str(args.latencia_dashboard),
+        "--fail-rate-dashboard", str(args.fail_rate_dashboard),
+        "--repeticiones", str(args.repeticiones), "--timeout", str(args.timeout),
+        *(["--tracemalloc"] if args.tracemalloc else []),
+        *extra,
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=RAIZ)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"código {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def commit_actual() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=RAIZ, check=True
+        ).stdout.strip()
+    except Exception:
+        return "desconocido"
+
+
+def _enteros(texto: str) -> list:
+    return [int(x) for x in texto.split(",") if x.strip()]
+
+
+def ejecutar(args) -> str:
+    import streamlit
+
+    informe = {
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "parametros": {
+            "latencia": args.latencia,
+            "fail_rate": args.fail_rate,
+            "latencia_dashboard": args.latencia_dashboard,
+            "fail_rate_dashboard": args.fail_rate_dashboard,
+            "repeticiones": args.repeticiones,
+            "tracemalloc": args.tracemalloc,
+        },
+        "inicio": [],
+        "dashboard": [],
+        "subida": [],
+    }
+
+    r = lanzar(args, "inicio", [])
+    informe["inicio"].append(r)
+    print(f"inicio     {r}")
+
+    for n in _enteros(args.cargas):
+        r = lanzar(args, "dashboard", ["--n", str(n)])
+        informe["dashboard"].append({"cargas": n, **r})
+        print(f"dashboard  cargas={n:>7}  {r}")
+
+    for n in _enteros(args.archivos):
+        for tam_kb in _enteros(args.tam_kb):
+            r = lanzar(args, "subida", ["--n", str(n), "--tam-kb", str(tam_kb)])
+            informe["subida"].append({"archivos": n, "tam_kb": tam_kb, **r})
+            print(f"subida     archivos={n:>4} tam_kb={tam_kb:>6}  {r}")
+
+    os.makedirs(args.salida, exist_ok=True)
+    ruta = os.path.join(args.salida, f"{datetime.now():%Y%m%d_%H%M%S}_{informe['commit']}.json")
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2)
+    print(f"Resultados en {ruta}")
+    return ruta
+
+
+def comparar(ruta_a: str, ruta_b: str) -> None:
+    """Imprime B/A de cada métrica numérica común (>1 en tiempos = B más lento)."""
+    with open(ruta_a, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(ruta_b, encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"A = {a['commit']} ({a['fecha']})   B = {b['commit']} ({b['fecha']})")
+
+    claves = {"inicio": (), "dashboard": ("cargas",), "subida": ("archivos", "tam_kb")}
+    for seccion, campos in claves.items():
+        indice_a = {tuple(r.get(c) for c in campos): r for r in a.get(seccion, [])}
+        for rb in b.get(seccion, []):
+            clave = tuple(rb.get(c) for c in campos)
+            ra = indice_a.get(clave)
+            if ra is None:
+                continue
+            for metrica, vb in rb.items():
+                va = ra.get(metrica)
+                if metrica in campos or not isinstance(vb, (int, float)) or not va:
+                    continue
+                print(f"{seccion:<10} {str(clave):<16} {metrica:<18} {va:>10} -> {vb:>10}  x{vb / va:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks de Extracta contra mock_backend")
+    parser.add_argument("--cargas", default="100,1000,5000", help="nº de cargas en el backend (lista)")
+    parser.add_argument("--archivos", default="10,50", help="nº de PDFs por lote (lista)")
+    parser.add_argument("--tam-kb", default="256,4096", help="tamaño de cada PDF en KB (lista)")
+    parser.add_argument("--latencia", type=float, default=0.02, help="latencia de los endpoints de subida (s)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probabilidad de 503 en subida")
+    parser.add_argument("--latencia-dashboard", type=float, default=0.02, help="latencia de /dashboard/* (s)")
+    parser.add_argument("--fail-rate-dashboard", type=float, default=0.0, help="probabilidad de 503 en /dashboard/*")
+    parser.add_argument("--repeticiones", type=int, default=5, help="renders en caliente por escenario")
+    parser.add_argument("--timeout", type=float, default=300, help="límite por escenario (s)")
+    parser.add_argument("--tracemalloc", action="store_true", help="medir también el pico de memoria Python")
+    parser.add_argument("--salida", default=RESULTADOS_DIR, help="carpeta de los JSON de resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("A.json", "B.json"), help="compara dos resultados")
+    parser.add_argument("--hijo", choices=list(ESCENARIOS), dest="escenario", help=argparse.SUPPRESS)
+    parser.add_argument("--n", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    elif args.escenario:
+        if args.escenario == "subida":
+            args.tam_kb = int(args.tam_kb)
+        ejecutar_hijo(args)
+    else:
+        ejecutar(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+import streamlit as st
+
+# --------------------------------------------------
+# BASE LOCAL (crud.db)
+# --------------------------------------------------
+DB_PATH = "crud.db"
+DB_TIMEOUT = 10
+
+
+@contextmanager
+def conexion():
+    """Una conexión por uso (sqlite3 no comparte conexiones entre hilos); commit al salir."""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _columnas(conn: sqlite3.Connection, tabla: str) -> set:
+    return {r["name"] for r in conn.execute(f"PRAGMA table_info({tabla})")}
+
+
+@st.cache_resource(show_spinner=False)
+def inicializar_db() -> bool:
+    """Migraciones idempotentes sobre crud.db, una vez por proceso."""
+    with conexion() as conn:
+        # WAL (persistente en el archivo): el escritor de auditoría no bloquea
+        # las lecturas del dashboard y cada commit cuesta menos
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        cols = _columnas(conn, "documentos")
+        if "sha256" not in cols:
+            conn.execute("ALTER TABLE documentos ADD COLUMN sha256 TEXT")
+        if "id_carga" not in cols:
+            conn.execute("ALTER TABLE documentos ADD COLUMN id_carga TEXT")
+        # Hash de los bytes que guardó el backend (otro si se envió recomprimido)
+        if "sha256_almacenado" not in cols:
+            conn.execute("ALTER TABLE documentos ADD COLUMN sha256_almacenado TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_sha256 ON documentos(sha256)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_id_carga ON documentos(id_carga)")
+
+        # Espejo local de /dashboard/cargas. Las filas antiguas sin id_carga
+        # (NULL no choca en el índice único) quedan fuera de las consultas.
+        cols = _columnas(conn, "cargas")
+        for col in ("id_carga", "updated_at", "error_message", "cargado_at"):
+            if col not in cols:
+                conn.execute(f"ALTER TABLE cargas ADD COLUMN {col} TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_cargas_id_carga ON cargas(id_carga)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cargas_estado_fecha ON cargas(estado, fecha)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cargas_fecha ON cargas(fecha)")
+
+        _migrar_kpis(conn)
+
+        # Credenciales de operadores (hash en autenticacion.py, nunca la contraseña)
+        cols = _columnas(conn, "usuarios")
+        for col in ("usuario", "password_hash", "rol"):
+            if col not in cols:
+                conn.execute(f"ALTER TABLE usuarios ADD COLUMN {col} TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_usuarios_usuario ON usuarios(usuario)")
+
+        # Historial de subidas, reintentos y exports (lo escribe auditoria.py por lotes)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS eventos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fecha TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                usuario TEXT,
+                id_carga TEXT,
+                archivo TEXT,
+                tamaño_kb REAL,
+                sha256 TEXT,
+                latencia_ms REAL,
+                ok INTEGER NOT NULL,
+                resultado TEXT,
+                detalle TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_eventos_fecha ON eventos(fecha);
+            CREATE INDEX IF NOT EXISTS idx_eventos_tipo_fecha ON eventos(tipo, fecha);
+            CREATE INDEX IF NOT EXISTS idx_eventos_id_carga ON eventos(id_carga);
+        """)
+    return True
+
+
+# --------------------------------------------------
+# ÍNDICE DE DOCUMENTOS POR HASH
+# --------------------------------------------------
+def documento_por_hash(sha256: str) -> Optional[dict]:
+    inicializar_db()
+    with conexion() as conn:
+        fila = conn.execute(
+            "SELECT * FROM documentos WHERE sha256 = ? ORDER BY id DESC LIMIT 1", (sha256,)
+        ).fetchone()
+    return dict(fila) if fila else None
+
+
+_SQL_DOCUMENTO = (
+    "INSERT INTO documentos (nombre_archivo, ruta, tamaño_kb, fecha_carga, sha256, id_carga, sha256_almacenado) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def fila_documento(nombre_archivo: str, ruta: str, size_bytes: int, sha256: str, id_carga: str,
+                   sha256_almacenado: Optional[str] = None) -> tuple:
+    """
+    Fila para documentos con la fecha de ahora (aunque se escriba más tarde).
+    `sha256` es el del PDF original; `sha256_almacenado`, el de lo que guardó
+    el backend si no es el mismo (PDF recomprimido).
+    """
+    return (
+        nombre_archivo,
+        ruta,
+        round(size_bytes / 1024, 2),
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        sha256,
+        id_carga,
+        sha256_almacenado or sha256,
+    )
+
+
+def documentos_de_carga(id_carga: str, pagina: int, tam_pagina: int) -> dict:
+    """PDFs registrados desde este front para una carga: {"items", "total"}."""
+    inicializar_db()
+    with conexion() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM documentos WHERE id_carga = ?", (id_carga,)).fetchone()[0]
+        filas = conn.execute(
+            "SELECT nombre_archivo AS filename, tamaño_kb, fecha_carga FROM documentos "
+            "WHERE id_carga = ? ORDER BY id LIMIT ? OFFSET ?",
+            (id_carga, tam_pagina, (pagina - 1) * tam_pagina),
+        ).fetchall()
+    return {"items": [dict(f) for f in filas], "total": total}
+
+
+# --------------------------------------------------
+# HISTORIAL DE EVENTOS (auditoría)
+# --------------------------------------------------
+EVENTOS_COLUMNAS = (
+    "fecha", "tipo", "usuario", "id_carga", "archivo", "tamaño_kb", "sha256", "latencia_ms", "ok", "resultado", "detalle"
+)
+
+
+def guardar_lote_auditoria(eventos: list, documentos: list) -> None:
+    """
+    Eventos (tuplas en el orden de EVENTOS_COLUMNAS) y filas de documentos
+    en una sola transacción: un commit por lote, no por archivo.
+    """
+    inicializar_db()
+    with conexion() as conn:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if eventos:
+            conn.executemany(
+                f"INSERT INTO eventos ({', '.join(EVENTOS_COLUMNAS)}) "
+                f"VALUES ({', '.join('?' * len(EVENTOS_COLUMNAS))})",
+                eventos,
+            )
+        if documentos:
+            conn.executemany(_SQL_DOCUMENTO, documentos)
+
+
+def _where_eventos(filtros: dict) -> tuple:
+    condiciones, args = [], []
+    if filtros.get("tipo"):
+        condiciones.append("tipo = ?")
+        args.append(filtros["tipo"])
+    if filtros.get("solo_errores"):
+        condiciones.append("ok = 0")
+    if filtros.get("desde"):
+        condiciones.append("fecha >= ?")
+        args.append(filtros["desde"].isoformat())
+    if filtros.get("hasta"):
+        condiciones.append("fecha < ?")
+        args.append((filtros["hasta"] + timedelta(days=1)).isoformat())
+    if filtros.get("texto"):
+        patron = filtros["texto"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        condiciones.append("(archivo LIKE ? ESCAPE '\\' OR id_carga LIKE ? ESCAPE '\\')")
+        args += [f"%{patron}%"] * 2
+    return " AND ".join(condiciones) or "1", args
+
+
+def consultar_eventos(filtros: dict, pagina: int, tam_pagina: int) -> dict:
+    """Historial filtrado, más recientes primero: {"items", "total"}."""
+    inicializar_db()
+    where, args = _where_eventos(filtros)
+    with conexion() as conn:
+        total = conn.execute(f"SELECT COUNT(*) FROM eventos WHERE {where}", args).fetchone()[0]
+        filas = conn.execute(
+            f"SELECT {', '.join(EVENTOS_COLUMNAS)} FROM eventos WHERE {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+            (*args, tam_pagina, (pagina - 1) * tam_pagina),
+        ).fetchall()
+    return {"items": [dict(f) for f in filas], "total": total}
+
+
+# --------------------------------------------------
+# USUARIOS
+# --------------------------------------------------
+def credenciales_usuario(usuario: str) -> Optional[dict]:
+    """{"usuario", "password_hash", "rol"} o None si no existe o no tiene contraseña."""
+    inicializar_db()
+    with conexion() as conn:
+        fila = conn.execute(
+            "SELECT usuario, password_hash, rol FROM usuarios WHERE usuario = ? AND password_hash IS NOT NULL",
+            (usuario,),
+        ).fetchone()
+    return dict(fila) if fila else None
+
+
+def hay_credenciales() -> bool:
+    inicializar_db()
+    with conexion() as conn:
+        return conn.execute("SELECT 1 FROM usuarios WHERE password_hash IS NOT NULL LIMIT 1").fetchone() is not None
+
+
+def guardar_usuario(usuario: str, password_hash: str, rol: str, nombre: Optional[str] = None, email: str = "") -> None:
+    """Alta o cambio de contraseña/rol (upsert por usuario)."""
+    inicializar_db()
+    with conexion() as conn:
+        conn.execute(
+            "INSERT INTO usuarios (nombre, email, usuario, password_hash, rol) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(usuario) DO UPDATE SET password_hash = excluded.password_hash, rol = excluded.rol",
+            (nombre or usuario, email, usuario, password_hash, rol),
+        )
+
+
+# --------------------------------------------------
+# ESPEJO LOCAL DE CARGAS
+# --------------------------------------------------
+def guardar_cargas(cargas: list) -> int:
+    """
+    Upsert por id_carga de filas tal como las devuelve el backend. Solo se
+    reescriben las que cambiaron; devuelve cuántas se insertaron o actualizaron.
+    Los triggers de KPIs actualizan los contadores en la misma transacción.
+    """
+    filas = []
+    for r in cargas:
+        if not r.get("id_carga"):
+            continue
+        estado = (r.get("status") or r.get("estado") or "").upper()
+        filas.append((
+            r["id_carga"],
+            r.get("updated_at") or r.get("fecha") or "",
+            estado,
+            r.get("error_message"),
+            r.get("updated_at"),
+            r.get("total_archivos"),
+            # Inicio del tramo UPLOADED -> PROCESSED
+            r.get("created_at") or (r.get("updated_at") if estado == "UPLOADED" else None),
+        ))
+    if not filas:
+        return 0
+    inicializar_db()
+    with conexion() as conn:
+        cur = conn.executemany(
+            "INSERT INTO cargas (id_carga, fecha, estado, error_message, updated_at, total_archivos, cargado_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id_carga) DO UPDATE SET "
+            "fecha = excluded.fecha, estado = excluded.estado, error_message = excluded.error_message, "
+            "updated_at = excluded.updated_at, total_archivos = COALESCE(excluded.total_archivos, total_archivos), "
+            # Cada vuelta a UPLOADED (p. ej. un reintento) reinicia el cronómetro
+            "cargado_at = CASE WHEN excluded.estado = 'UPLOADED' AND cargas.estado IS NOT 'UPLOADED' "
+            "THEN excluded.updated_at ELSE cargas.cargado_at END "
+            "WHERE cargas.estado IS NOT excluded.estado "
+            "OR cargas.updated_at IS NOT excluded.updated_at "
+            "OR cargas.error_message IS NOT excluded.error_message",
+            filas,
+        )
+        # rowcount no incluye lo que escriben los triggers de KPIs
+        return cur.rowcount
+
+
+def cursor_cargas() -> Optional[str]:
+    """updated_at más reciente del espejo (punto de partida de la siguiente sincronización)."""
+    inicializar_db()
+    with conexion() as conn:
+        fila = conn.execute("SELECT MAX(updated_at) AS cursor FROM cargas WHERE id_carga IS NOT NULL").fetchone()
+    return fila["cursor"]
+
+
+def _where_cargas(filtros: dict) -> tuple:
+    condiciones, args = ["id_carga IS NOT NULL"], []
+    if filtros.get("estado"):
+        condiciones.append("estado = ?")
+        args.append(filtros["estado"])
+    if filtros.get("ocultar_ok"):
+        condiciones.append("estado <> 'PROCESSED'")
+    # Rangos sobre el texto ISO de fecha: usan el índice (nada de date(fecha))
+    if filtros.get("desde"):
+        condiciones.append("fecha >= ?")
+        args.append(filtros["desde"].isoformat())
+    if filtros.get("hasta"):
+        condiciones.append("fecha < ?")
+        args.append((filtros["hasta"] + timedelta(days=1)).isoformat())
+    if filtros.get("texto"):
+        patron = filtros["texto"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        condiciones.append("id_carga LIKE ? ESCAPE '\\'")
+        args.append(f"%{patron}%")
+    return " AND ".join(condiciones), args
+
+
+def _contar_filtradas(conn: sqlite3.Connection, filtros: dict, where: str, args: list) -> dict:
+    if any(filtros.get(k) for k in ("desde", "hasta", "texto")):
+        filas = conn.execute(f"SELECT estado, COUNT(*) AS n FROM cargas WHERE {where} GROUP BY estado", args)
+    else:
+        # Sin filtro de fecha/texto bastan los contadores: no se recorre la tabla
+        filas = conn.execute("SELECT estado, n FROM kpi_estados WHERE n > 0")
+    por_estado = {f["estado"]: f["n"] for f in filas}
+    if filtros.get("estado"):
+        por_estado = {filtros["estado"]: por_estado.get(filtros["estado"], 0)}
+    if filtros.get("ocultar_ok"):
+        por_estado.pop("PROCESSED", None)
+    return por_estado
+
+
+def consultar_cargas_locales(filtros: dict, pagina: int, tam_pagina: int) -> dict:
+    """Página de cargas del espejo: {"items", "total", "conteos"}."""
+    inicializar_db()
+    where, args = _where_cargas(filtros)
+    with conexion() as conn:
+        por_estado = _contar_filtradas(conn, filtros, where, args)
+        total = sum(por_estado.values())
+        conteos = {k: por_estado.get(k, 0) for k in ("PROCESSED", "ERROR", "UPLOADED")}
+        items = conn.execute(
+            "SELECT id_carga, estado AS status, fecha, updated_at, error_message, total_archivos "
+            f"FROM cargas WHERE {where} ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?",
+            (*args, tam_pagina, (pagina - 1) * tam_pagina),
+        ).fetchall()
+    return {"items": [dict(r) for r in items], "total": total, "conteos": conteos}
+
+
+def ids_cargas(filtros: dict) -> list:
+    """Todos los id_carga que cumplen los filtros (sin paginar), más recientes primero."""
+    inicializar_db()
+    where, args = _where_cargas(filtros)
+    with conexion() as conn:
+        filas = conn.execute(f"SELECT id_carga FROM cargas WHERE {where} ORDER BY fecha DESC, id DESC", args)
+        return [f["id_carga"] for f in filas]
+
+
+# --------------------------------------------------
+# KPIs (contadores incrementales mantenidos por triggers)
+# --------------------------------------------------
+# kpi_estados: nº de cargas por estado actual.
+# kpi_buckets: por hora ('YYYY-MM-DD HH') y por día ('YYYY-MM-DD'), cargas
+# nuevas, transiciones a PROCESSED / ERROR y tiempo UPLOADED -> PROCESSED.
+# Cada upsert del espejo los ajusta en SQLite; nunca se recuentan filas.
+KPI_GRANULARIDADES = {"hora": 13, "dia": 10}
+
+_SEGUNDOS_PROCESO = (
+    "CASE WHEN NEW.estado = 'PROCESSED' AND NEW.cargado_at IS NOT NULL "
+    "THEN MAX(0, (julianday(NEW.updated_at) - julianday(NEW.cargado_at)) * 86400) ELSE 0 END"
+)
+
+
+def _sql_bucket(recibidas: str) -> str:
+    sentencias = []
+    for granularidad, largo in KPI_GRANULARIDADES.items():
+        sentencias.append(
+            "INSERT INTO kpi_buckets "
+            "(granularidad, bucket, recibidas, procesadas, errores, segundos_proceso, con_tiempo) "
+            f"VALUES ('{granularidad}', substr(replace(COALESCE(NEW.updated_at, NEW.fecha), 'T', ' '), 1, {largo}), "
+            f"{recibidas}, NEW.estado = 'PROCESSED', NEW.estado = 'ERROR', {_SEGUNDOS_PROCESO}, "
+            f"NEW.estado = 'PROCESSED' AND NEW.cargado_at IS NOT NULL) "
+            "ON CONFLICT(granularidad, bucket) DO UPDATE SET "
+            "recibidas = recibidas + excluded.recibidas, procesadas = procesadas + excluded.procesadas, "
+            "errores = errores + excluded.errores, segundos_proceso = segundos_proceso + excluded.segundos_proceso, "
+            "con_tiempo = con_tiempo + excluded.con_tiempo;"
+        )
+    return "\n".join(sentencias)
+
+
+def _migrar_kpis(conn: sqlite3.Connection) -> None:
+    nuevas = "kpi_estados" not in {
+        r["name"] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS kpi_estados (
+            estado TEXT PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS kpi_buckets (
+            granularidad TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            recibidas INTEGER NOT NULL DEFAULT 0,
+            procesadas INTEGER NOT NULL DEFAULT 0,
+            errores INTEGER NOT NULL DEFAULT 0,
+            segundos_proceso REAL NOT NULL DEFAULT 0,
+            con_tiempo INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularidad, bucket)
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_kpi_cargas_insert AFTER INSERT ON cargas
+        WHEN NEW.id_carga IS NOT NULL
+        BEGIN
+            INSERT INTO kpi_estados (estado, n) VALUES (NEW.estado, 1)
+            ON CONFLICT(estado) DO UPDATE SET n = n + 1;
+            {_sql_bucket("1")}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_kpi_cargas_update AFTER UPDATE OF estado ON cargas
+        WHEN NEW.id_carga IS NOT NULL AND OLD.estado IS NOT NEW.estado
+        BEGIN
+            UPDATE kpi_estados SET n = n - 1 WHERE estado = OLD.estado;
+            INSERT INTO kpi_estados (estado, n) VALUES (NEW.estado, 1)
+            ON CONFLICT(estado) DO UPDATE SET n = n + 1;
+            {_sql_bucket("0")}
+        END;
+    """)
+    if nuevas:
+        recalcular_kpis(conn)
+
+
+def recalcular_kpis(conn: sqlite3.Connection) -> None:
+    """
+    Rehace los contadores desde la tabla (al crearlos sobre un espejo ya
+    poblado). Sin historial de transiciones, cada carga cuenta en el bucket
+    de su último updated_at con su estado actual.
+    """
+    conn.execute("DELETE FROM kpi_estados")
+    conn.execute("DELETE FROM kpi_buckets")
+    conn.execute(
+        "INSERT INTO kpi_estados (estado, n) "
+        "SELECT estado, COUNT(*) FROM cargas WHERE id_carga IS NOT NULL GROUP BY estado"
+    )
+    for granularidad, largo in KPI_GRANULARIDADES.items():
+        conn.execute(
+            "INSERT INTO kpi_buckets (granularidad, bucket, recibidas, procesadas, errores) "
+            f"SELECT ?, substr(replace(COALESCE(updated_at, fecha), 'T', ' '), 1, {largo}) AS b, "
+            "COUNT(*), SUM(estado = 'PROCESSED'), SUM(estado = 'ERROR') "
+            "FROM cargas WHERE id_carga IS NOT NULL GROUP BY b",
+            (granularidad,),
+        )
+
+
+def kpis_por_periodo(granularidad: str = "dia", limite: int = 30) -> list:
+    """
+    Últimos `limite` buckets (del más antiguo al más reciente) con
+    throughput, tasa de error y tiempo medio UPLOADED -> PROCESSED.
+    """
+    if granularidad not in KPI_GRANULARIDADES:
+        raise ValueError(f"Granularidad no soportada: {granularidad}")
+    inicializar_db()
+    with conexion() as conn:
+        filas = conn.execute(
+            "SELECT * FROM kpi_buckets WHERE granularidad = ? ORDER BY bucket DESC LIMIT ?",
+            (granularidad, limite),
+        ).fetchall()
+
+    kpis = []
+    for f in reversed(filas):
+        terminadas = f["procesadas"] + f["errores"]
+        kpis.append({
+            "bucket": f["bucket"],
+            "recibidas": f["recibidas"],
+            "procesadas": f["procesadas"],
+            "errores": f["errores"],
+            "tasa_error": f["errores"] / terminadas if terminadas else None,
+            "segundos_proceso": f["segundos_proceso"],
+            "con_tiempo": f["con_tiempo"],
+            "media_proceso_s": f["segundos_proceso"] / f["con_tiempo"] if f["con_tiempo"] else None,
+        })
+    return kpis
@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import streamlit as st
+
+from api_client import ErrorHTTP, obtener_detalle_carga
+from db_local import documentos_de_carga
+
+# --------------------------------------------------
+# CONFIG DETALLE
+# --------------------------------------------------
+# Filas por página de documentos / extracciones de una carga
+DETALLE_TAM_PAGINA = 50
+# Páginas de detalle que se conservan en memoria (las menos usadas se descartan)
+DETALLE_CACHE_MAX = 256
+
+
+# --------------------------------------------------
+# DETALLE POR CARGA (bajo demanda + LRU)
+# --------------------------------------------------
+#   GET /dashboard/cargas/<id>/documentos?page=&page_size=   -> {"items": [{"filename","status","error_message"}], "total"}
+#   GET /dashboard/cargas/<id>/extracciones?page=&page_size= -> {"items": [{...campos extraídos...}], "total"}
+# Si el backend no los implementa (404/405): documentos desde crud.db, extracciones solo por el Excel global.
+class CacheDetalles:
+    """
+    Páginas de detalle por (recurso, id_carga, updated_at, página),
+    compartidas por el proceso. Cuando la carga cambia, su updated_at
+    también, así que las páginas viejas dejan de pedirse y salen por el LRU.
+    """
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        # recurso -> None (aún no se sabe) / True / False: si el backend lo expone
+        self.servidor = {"documentos": None, "extracciones": None}
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+
+    def obtener(self, clave: tuple, calcular: Callable) -> dict:
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return self._entradas[clave]
+
+        valor = calcular()
+        with self._lock:
+            self._entradas[clave] = valor
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+
+@st.cache_resource(show_spinner=False)
+def get_cache_detalles() -> CacheDetalles:
+    return CacheDetalles(DETALLE_CACHE_MAX)
+
+
+def _pagina_backend(recurso: str, id_carga: str, pagina: int) -> dict:
+    data = obtener_detalle_carga(id_carga, recurso, pagina, DETALLE_TAM_PAGINA)
+    items = tuple(data.get("items") or [])
+    return {"items": items, "total": int(data.get("total", len(items))), "local": False}
+
+
+def _pagina(recurso: str, id_carga: str, version: Optional[str], pagina: int) -> Optional[dict]:
+    """Página del backend (cacheada), o None si el backend no expone `recurso`."""
+    cache = get_cache_detalles()
+    if cache.servidor[recurso] is False:
+        return None
+    try:
+        resultado = cache.obtener(
+            (recurso, id_carga, version, pagina), lambda: _pagina_backend(recurso, id_carga, pagina)
+        )
+    except ErrorHTTP as e:
+        # Con el endpoint ya confirmado, un 404 es de la carga, no del endpoint
+        if e.status_code not in (404, 405) or cache.servidor[recurso]:
+            raise
+        cache.servidor[recurso] = False
+        return None
+    cache.servidor[recurso] = True
+    return resultado
+
+
+def pagina_documentos(id_carga: str, version: Optional[str], pagina: int) -> dict:
+    """{"items", "total", "local"}; local=True si viene del índice de crud.db (sin estado por PDF)."""
+    resultado = _pagina("documentos", id_carga, version, pagina)
+    if resultado is None:
+        return {**documentos_de_carga(id_carga, pagina, DETALLE_TAM_PAGINA), "local": True}
+    return resultado
+
+
+def pagina_extracciones(id_carga: str, version: Optional[str], pagina: int) -> Optional[dict]:
+    return _pagina("extracciones", id_carga, version, pagina)
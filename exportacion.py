@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+import streamlit as st
+
+from api_client import descargar_excel
+from db_local import cursor_cargas
+
+# --------------------------------------------------
+# CONFIG EXPORTACIÓN
+# --------------------------------------------------
+EXPORT_DIR = "exports"
+# Excels guardados en disco (los más antiguos se borran)
+EXPORT_MAX_ARCHIVOS = 20
+# Locks fijos repartidos por ruta: dos exports distintos casi nunca comparten uno
+EXPORT_LOCKS = 16
+
+
+# --------------------------------------------------
+# EXCEL DE EXTRACCIONES (streaming a disco + caché por versión)
+# --------------------------------------------------
+def params_export(filtros: dict) -> dict:
+    """Filtros del export -> query params del endpoint de Excel (mismos nombres que el dashboard)."""
+    params = {}
+    if filtros.get("id_carga"):
+        params["id_carga"] = filtros["id_carga"]
+    if filtros.get("estado"):
+        params["status"] = filtros["estado"]
+    if filtros.get("desde"):
+        params["date_from"] = filtros["desde"].isoformat()
+    if filtros.get("hasta"):
+        params["date_to"] = filtros["hasta"].isoformat()
+    return params
+
+
+def ruta_export(params: dict, version: Optional[str]) -> str:
+    """
+    Un archivo por (filtros, updated_at más reciente del espejo): mientras no
+    cambie ninguna carga, volver a descargar no toca el backend.
+    """
+    clave = hashlib.sha1(json.dumps([sorted(params.items()), version or ""]).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(EXPORT_DIR, f"extracciones_{clave}.xlsx")
+
+
+def export_en_cache(params: dict) -> Optional[str]:
+    ruta = ruta_export(params, cursor_cargas())
+    return ruta if os.path.exists(ruta) else None
+
+
+@st.cache_resource(show_spinner=False)
+def _locks_export() -> tuple:
+    return tuple(threading.Lock() for _ in range(EXPORT_LOCKS))
+
+
+def _lock_export(ruta: str) -> threading.Lock:
+    locks = _locks_export()
+    return locks[hash(ruta) % len(locks)]
+
+
+def preparar_export(params: dict, al_avanzar=None) -> str:
+    """
+    Devuelve la ruta del Excel para `params`, bajándolo antes si no está en
+    caché. Si otra sesión ya lo está bajando, espera a esa descarga en vez
+    de pedirlo otra vez.
+    """
+    ruta = ruta_export(params, cursor_cargas())
+    with _lock_export(ruta):
+        if not os.path.exists(ruta):
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            descargar_excel(params, ruta, al_avanzar)
+            _podar_exports()
+    return ruta
+
+
+def _podar_exports() -> None:
+    # Exports de otros stripes podan a la vez: lo que ya borró otro se salta
+    archivos = []
+    for nombre in os.listdir(EXPORT_DIR):
+        if not nombre.endswith(".xlsx"):
+            continue
+        ruta = os.path.join(EXPORT_DIR, nombre)
+        try:
+            archivos.append((os.path.getmtime(ruta), ruta))
+        except OSError:
+            pass
+    archivos.sort(reverse=True)
+    for _, ruta in archivos[EXPORT_MAX_ARCHIVOS:]:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+def leer_export(ruta: str) -> bytes:
+    with open(ruta, "rb") as f:
+        return f.read()
@@ -0,0 +1,157 @@
+import atexit
+import functools
+import json
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+import streamlit as st
+
+# --------------------------------------------------
+# CONFIG MÉTRICAS
+# --------------------------------------------------
+# Mediciones que se conservan en memoria (las más antiguas se descartan)
+METRICAS_MAX = 5000
+# Si se define, cada medición se añade también como una línea JSON a este archivo
+METRICAS_ARCHIVO = os.environ.get("EXTRACTA_METRICAS_ARCHIVO")
+
+
+# --------------------------------------------------
+# BUFFER CIRCULAR DE MEDICIONES (compartido por el proceso)
+# --------------------------------------------------
+class RegistroMetricas:
+    """
+    Mediciones {"ts", "tipo", "nombre", "ms", "status", "bytes"} de:
+    http (una por llamada a la API), seccion (bloques de render), rerun
+    (script completo) y subida (un PDF enviado).
+    """
+
+    def __init__(self, max_mediciones: int = METRICAS_MAX, archivo: Optional[str] = METRICAS_ARCHIVO):
+        self.archivo = archivo
+        self._lock = threading.Lock()
+        self._mediciones = deque(maxlen=max_mediciones)
+        # El archivo lo escribe un hilo propio: quien mide no espera al disco
+        self._pendientes = None
+        if archivo:
+            self._pendientes = queue.Queue()
+            threading.Thread(target=self._escribir_archivo, name="metricas", daemon=True).start()
+            atexit.register(self.vaciar, 5)
+
+    def registrar(self, tipo: str, nombre: str, ms: float, status=None, bytes_: int = 0) -> None:
+        m = {"ts": time.time(), "tipo": tipo, "nombre": nombre, "ms": round(ms, 2), "status": status, "bytes": bytes_}
+        with self._lock:
+            self._mediciones.append(m)
+        if self._pendientes is not None:
+            self._pendientes.put(m)
+
+    def vaciar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que lo registrado hasta ahora esté en el archivo (tests, bench, cierre)."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self._pendientes is not None and self._pendientes.unfinished_tasks:
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _escribir_archivo(self) -> None:
+        while True:
+            lote = [self._pendientes.get()]
+            while True:
+                try:
+                    lote.append(self._pendientes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.archivo, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(m) + "\n" for m in lote))
+            except OSError:
+                pass  # las mediciones siguen en memoria; el archivo es solo una copia
+            finally:
+                for _ in lote:
+                    self._pendientes.task_done()
+
+    def mediciones(self, tipo: Optional[str] = None) -> list:
+        with self._lock:
+            return [m for m in self._mediciones if tipo is None or m["tipo"] == tipo]
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._mediciones.clear()
+
+    def resumen(self, tipo: str) -> list:
+        """p50/p95/p99 (ms) por nombre, más errores (status >= 400 o excepción) y bytes."""
+        por_nombre = {}
+        for m in self.mediciones(tipo):
+            por_nombre.setdefault(m["nombre"], []).append(m)
+
+        filas = []
+        for nombre, ms_list in sorted(por_nombre.items()):
+            tiempos = sorted(m["ms"] for m in ms_list)
+            filas.append({
+                "nombre": nombre,
+                "n": len(tiempos),
+                "p50": percentil(tiempos, 50),
+                "p95": percentil(tiempos, 95),
+                "p99": percentil(tiempos, 99),
+                "errores": sum(1 for m in ms_list if _es_error(m["status"])),
+                "MB": round(sum(m["bytes"] or 0 for m in ms_list) / 1024 / 1024, 2),
+            })
+        return filas
+
+    def exportar_jsonl(self) -> str:
+        return "".join(json.dumps(m) + "\n" for m in self.mediciones())
+
+
+def percentil(ordenados: list, p: float) -> Optional[float]:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return None
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def _es_error(status) -> bool:
+    return status == "EXC" or (isinstance(status, int) and status >= 400)
+
+
+@st.cache_resource(show_spinner=False)
+def get_metricas() -> RegistroMetricas:
+    return RegistroMetricas()
+
+
+def registrar(tipo: str, nombre: str, ms: float, status=None, bytes_: int = 0) -> None:
+    get_metricas().registrar(tipo, nombre, ms, status, bytes_)
+
+
+@contextmanager
+def medir(nombre: str, tipo: str = "seccion"):
+    """Mide el bloque aunque termine con st.rerun()/st.stop() (que se propagan como excepción)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar(tipo, nombre, (time.perf_counter() - inicio) * 1000)
+
+
+def medido(nombre: str, tipo: str = "seccion"):
+    """Decorador de medir(); sirve también para funciones que corren como st.fragment."""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def envuelta(*args, **kwargs):
+            with medir(nombre, tipo):
+                return fn(*args, **kwargs)
+        return envuelta
+    return decorador
+
+
+def throughput_subidas() -> Optional[float]:
+    """MB/s de los lotes terminados: bytes enviados / tiempo de reloj de cada lote."""
+    lotes = [m for m in get_metricas().mediciones("subida") if m["nombre"] == "lote" and m["ms"] > 0]
+    segundos = sum(m["ms"] for m in lotes) / 1000
+    if not segundos:
+        return None
+    return sum(m["bytes"] for m in lotes) / 1024 / 1024 / segundos
@@ -0,0 +1,320 @@
+"""
+Backend local de pruebas para Extracta (solo librería estándar).
+
+Imita los endpoints que usa el front (incluidos el reintento por lotes, el
+detalle por carga y la subida de varios PDFs por petición), el protocolo de
+subida reanudable y la deduplicación por hash (lookup/link), con latencia y
+fallos configurables para probar reintentos y reanudación:
+
+    python mock_backend.py --port 8000 --fail-rate 0.2
+    EXTRACTA_API_BASE=http://127.0.0.1:8000 streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class EstadoMock:
+    def __init__(self, latencia: float = 0.0, fail_rate: float = 0.0, excel_bytes: int = 2 * 1024 * 1024,
+                 latencia_dashboard: float = 0.0, fail_rate_dashboard: float = 0.0):
+        self.latencia = latencia
+        self.fail_rate = fail_rate
+        self.latencia_dashboard = latencia_dashboard
+        self.fail_rate_dashboard = fail_rate_dashboard
+        self.excel_bytes = excel_bytes
+        self.excels_generados = 0
+        self.lock = threading.Lock()
+        self.cargas = {}
+        self.documentos = []
+        self.subidas = {}
+
+    def tocar_carga(self, id_carga: str, status: str = "UPLOADED", error_message=None) -> None:
+        with self.lock:
+            self.cargas[id_carga] = {
+                "id_carga": id_carga,
+                "status": status,
+                "error_message": error_message,
+                "updated_at": datetime.now().isoformat(timespec="microseconds"),
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    estado: EstadoMock = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    # ---------------- utilidades ----------------
+    def _json(self, code: int, obj) -> None:
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _simular_red(self, dashboard: bool = False) -> bool:
+        """Aplica latencia; devuelve True si esta petición debe fallar (503)."""
+        latencia = self.estado.latencia_dashboard if dashboard else self.estado.latencia
+        fail_rate = self.estado.fail_rate_dashboard if dashboard else self.estado.fail_rate
+        if latencia:
+            time.sleep(latencia)
+        if random.random() < fail_rate:
+            self._body()
+            self._json(503, {"detail": "fallo simulado"})
+            return True
+        return False
+
+    # ---------------- GET ----------------
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path.startswith("/dashboard/") and self._simular_red(dashboard=True):
+            return
+
+        if url.path == "/dashboard/id-carga":
+            return self._json(200, {"id_carga": uuid.uuid4().hex[:12]})
+
+        if url.path == "/dashboard/cargas":
+            with self.estado.lock:
+                cargas = sorted(self.estado.cargas.values(), key=lambda r: r["updated_at"], reverse=True)
+            if q.get("updated_since"):
+                cargas = [r for r in cargas if r["updated_at"] >= q["updated_since"]]
+            return self._json(200, cargas)
+
+        if url.path == "/storage/pdf/lookup":
+            with self.estado.lock:
+                existe = any(d["sha256"] == q.get("sha256") for d in self.estado.documentos)
+            return self._json(200, {"exists": existe})
+
+        m = re.fullmatch(r"/storage/pdf/uploads/([\w-]+)", url.path)
+        if m:
+            sub = self.estado.subidas.get(m.group(1))
+            if sub is None:
+                return self._json(404, {"detail": "upload_id desconocido"})
+            return self._json(200, {"offset": sub["offset"]})
+
+        m = re.fullmatch(r"/dashboard/cargas/([\w-]+)/(documentos|extracciones)", url.path)
+        if m:
+            return self._detalle(m.group(1), m.group(2), q)
+
+        if url.path == "/dashboard/extractions/excel":
+            return self._excel(q)
+
+        self._json(404, {"detail": "not found"})
+
+    def _detalle(self, id_carga: str, recurso: str, q: dict) -> None:
+        """Documentos de la carga (con el estado de la carga) o 3 campos extraídos por documento."""
+        with self.estado.lock:
+            carga = self.estado.cargas.get(id_carga)
+            docs = [d for d in self.estado.documentos if d["id_carga"] == id_carga]
+        if carga is None:
+            return self._json(404, {"detail": "carga no encontrada"})
+        if recurso == "documentos":
+            filas = [
+                {"filename": d["filename"], "status": carga["status"], "error_message": carga["error_message"]}
+                for d in docs
+            ]
+        else:
+            filas = [
+                {"filename": d["filename"], "campo": campo, "valor": f"{campo}-{d['sha256'][:8]}"}
+                for d in docs for campo in ("proveedor", "fecha", "total")
+            ]
+        pagina, tam = int(q.get("page", 1)), int(q.get("page_size", 50))
+        return self._json(200, {"items": filas[(pagina - 1) * tam:pagina * tam], "total": len(filas)})
+
+    def _excel(self, q: dict) -> None:
+        """Cuerpo de relleno de `excel_bytes` enviado por bloques (no es un .xlsx real)."""
+        with self.estado.lock:
+            self.estado.excels_generados += 1
+        total = self.estado.excel_bytes
+        bloque = (json.dumps(q).encode("utf-8") + b"\n") * 1024
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        self.send_header("Content-Length", str(total))
+        self.end_headers()
+        enviados = 0
+        while enviados < total:
+            trozo = bloque[:total - enviados]
+            self.wfile.write(trozo)
+            enviados += len(trozo)
+
+    # ---------------- POST ----------------
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/dashboard/") and self._simular_red(dashboard=True):
+            return
+
+        if url.path == "/dashboard/cargas/retry":
+            ids = json.loads(self._body() or b"{}").get("ids") or []
+            resultados = []
+            for id_carga in ids:
+                if id_carga in self.estado.cargas:
+                    self.estado.tocar_carga(id_carga, "UPLOADED")
+                    resultados.append({"id_carga": id_carga, "ok": True})
+                else:
+                    resultados.append({"id_carga": id_carga, "ok": False, "error": "carga no encontrada"})
+            return self._json(200, {"results": resultados})
+
+        m = re.fullmatch(r"/dashboard/cargas/([\w-]+)/retry", url.path)
+        if m:
+            self._body()
+            if m.group(1) not in self.estado.cargas:
+                return self._json(404, {"detail": "carga no encontrada"})
+            self.estado.tocar_carga(m.group(1), "UPLOADED")
+            return self._json(200, {"id_carga": m.group(1), "status": "UPLOADED"})
+
+        if url.path == "/storage/pdf":
+            if self._simular_red():
+                return
+            body = self._body()
+            msg = BytesParser().parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+            )
+            partes = {p.get_param("name", header="content-disposition"): p for p in msg.get_payload()}
+            archivo = partes["file"]
+            contenido = archivo.get_payload(decode=True)
+            id_carga = partes["id_carga"].get_payload(decode=True).decode()
+            return self._registrar_documento(id_carga, archivo.get_filename(), len(contenido),
+                                             hashlib.sha256(contenido).hexdigest())
+
+        if url.path == "/storage/pdf/batch":
+            if self._simular_red():
+                return
+            body = self._body()
+            msg = BytesParser().parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body
+            )
+            partes = msg.get_payload()
+            nombre = lambda p: p.get_param("name", header="content-disposition")
+            id_carga = next(p for p in partes if nombre(p) == "id_carga").get_payload(decode=True).decode()
+            resultados = []
+            for p in partes:
+                if nombre(p) != "files":
+                    continue
+                contenido = p.get_payload(decode=True)
+                with self.estado.lock:
+                    self.estado.documentos.append({"id_carga": id_carga, "filename": p.get_filename(),
+                                                   "size": len(contenido),
+                                                   "sha256": hashlib.sha256(contenido).hexdigest()})
+                resultados.append({"filename": p.get_filename(), "ok": True})
+            self.estado.tocar_carga(id_carga, "UPLOADED")
+            return self._json(201, {"results": resultados})
+
+        if url.path == "/storage/pdf/link":
+            datos = json.loads(self._body() or b"{}")
+            with self.estado.lock:
+                previo = next((d for d in self.estado.documentos if d["sha256"] == datos.get("sha256")), None)
+            if previo is None:
+                return self._json(409, {"detail": "contenido no almacenado"})
+            return self._registrar_documento(datos["id_carga"], datos.get("filename") or previo["filename"],
+                                             previo["size"], previo["sha256"])
+
+        if url.path == "/storage/pdf/uploads":
+            if self._simular_red():
+                return
+            datos = json.loads(self._body() or b"{}")
+            upload_id = uuid.uuid4().hex
+            self.estado.subidas[upload_id] = {**datos, "offset": 0, "sha": hashlib.sha256()}
+            return self._json(201, {"upload_id": upload_id})
+
+        m = re.fullmatch(r"/storage/pdf/uploads/([\w-]+)/complete", url.path)
+        if m:
+            if self._simular_red():
+                return
+            datos = json.loads(self._body() or b"{}")
+            sub = self.estado.subidas.get(m.group(1))
+            if sub is None:
+                return self._json(404, {"detail": "upload_id desconocido"})
+            if sub["offset"] != sub["size"]:
+                return self._json(409, {"detail": f"incompleto: {sub['offset']}/{sub['size']}"})
+            self.estado.subidas.pop(m.group(1))
+            return self._registrar_documento(datos.get("id_carga") or sub["id_carga"],
+                                             datos.get("filename") or sub["filename"],
+                                             sub["size"], sub["sha"].hexdigest())
+
+        self._body()
+        self._json(404, {"detail": "not found"})
+
+    # ---------------- PUT (bloques) ----------------
+    def do_PUT(self):
+        url = urlparse(self.path)
+        m = re.fullmatch(r"/storage/pdf/uploads/([\w-]+)", url.path)
+        if not m:
+            self._body()
+            return self._json(404, {"detail": "not found"})
+        if self._simular_red():
+            return
+
+        sub = self.estado.subidas.get(m.group(1))
+        bloque = self._body()
+        if sub is None:
+            return self._json(404, {"detail": "upload_id desconocido"})
+
+        inicio = int(re.match(r"bytes (\d+)-", self.headers.get("Content-Range", "")).group(1))
+        if inicio != sub["offset"]:
+            # Bloque fuera de orden: se informa el offset real para que el cliente reanude
+            return self._json(409, {"offset": sub["offset"]})
+        sub["sha"].update(bloque)
+        sub["offset"] += len(bloque)
+        self._json(200, {"offset": sub["offset"]})
+
+    def _registrar_documento(self, id_carga: str, filename: str, size: int, sha256: str):
+        with self.estado.lock:
+            self.estado.documentos.append(
+                {"id_carga": id_carga, "filename": filename, "size": size, "sha256": sha256}
+            )
+        self.estado.tocar_carga(id_carga, "UPLOADED")
+        return self._json(201, {"id_carga": id_carga, "filename": filename, "size": size, "sha256": sha256})
+
+
+def iniciar_servidor(port: int = 0, latencia: float = 0.0, fail_rate: float = 0.0,
+                     excel_bytes: int = 2 * 1024 * 1024, latencia_dashboard: float = 0.0,
+                     fail_rate_dashboard: float = 0.0):
+    """Arranca el mock en un hilo daemon. Devuelve (servidor, estado, api_base)."""
+    estado = EstadoMock(latencia=latencia, fail_rate=fail_rate, excel_bytes=excel_bytes,
+                        latencia_dashboard=latencia_dashboard, fail_rate_dashboard=fail_rate_dashboard)
+    handler = type("Handler", (MockHandler,), {"estado": estado})
+    servidor = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    host, puerto = servidor.server_address
+    return servidor, estado, f"http://{host}:{puerto}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backend local de pruebas para Extracta")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de latencia por petición de subida")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probabilidad de 503 en endpoints de subida")
+    parser.add_argument("--excel-mb", type=float, default=2.0, help="tamaño del Excel de extracciones simulado")
+    parser.add_argument("--dashboard-latency", type=float, default=0.0,
+                        help="segundos de latencia en /dashboard/* (cargas, retry, Excel, id-carga)")
+    parser.add_argument("--dashboard-fail-rate", type=float, default=0.0, help="probabilidad de 503 en /dashboard/*")
+    args = parser.parse_args()
+
+    servidor, _, api_base = iniciar_servidor(
+        args.port, args.latency, args.fail_rate, int(args.excel_mb * 1024 * 1024),
+        args.dashboard_latency, args.dashboard_fail_rate,
+    )
+    print(f"Mock backend en {api_base} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servidor.shutdown()
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import streamlit as st
+
+from api_client import obtener_cambios_cargas, olvidar_cargas_sincronizadas
+from db_local import consultar_cargas_locales, cursor_cargas, guardar_cargas, kpis_por_periodo
+
+# --------------------------------------------------
+# CONFIG SINCRONIZACIÓN
+# --------------------------------------------------
+# Cada cuánto se piden al backend las cargas cambiadas (además de al despertar)
+CARGAS_SYNC_SECS = 10
+# Vistas (filtros + página, tendencias) ya resueltas que se comparten entre sesiones
+VISTAS_MAX = 64
+
+
+# --------------------------------------------------
+# ESPEJO LOCAL DE CARGAS (backend -> crud.db)
+# --------------------------------------------------
+class SincronizadorCargas:
+    """
+    Hilo de fondo, uno por proceso, que trae de /dashboard/cargas solo lo
+    cambiado desde el último updated_at guardado y lo vuelca en la tabla
+    `cargas` de crud.db. El dashboard consulta siempre esa tabla, así que
+    sigue respondiendo aunque el backend vaya lento o no conteste.
+
+    Es además el único punto de lectura del espejo para las sesiones: cada
+    vista se consulta una vez por `version` del espejo y todas las sesiones
+    que la piden reciben el mismo objeto (de solo lectura). Así, N
+    operadores mirando el dashboard cuestan lo mismo que uno.
+    """
+
+    def __init__(self, intervalo: float = CARGAS_SYNC_SECS):
+        self.intervalo = intervalo
+        self.ultima_ok: Optional[float] = None
+        self.ultimo_error: Optional[str] = None
+        # Sube cada vez que una pasada cambia filas del espejo
+        self.version = 0
+        self._inicio_ok: Optional[float] = None
+        self._vistas = OrderedDict()
+        self._lock_vistas = threading.Lock()
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="sync-cargas", daemon=True)
+        self._hilo.start()
+
+    def sincronizar(self) -> int:
+        """
+        Una pasada (bloqueante); devuelve cuántas filas cambiaron en el espejo.
+        Si mientras se esperaba el lock otra sesión completó una pasada que
+        empezó después de pedir esta, se reutiliza (varios "Refrescar" a la
+        vez = una sola llamada al backend).
+        """
+        pedido = time.monotonic()
+        with self._lock:
+            if self._inicio_ok is not None and self._inicio_ok >= pedido:
+                return 0
+            inicio = time.monotonic()
+            try:
+                cambiadas = guardar_cargas(obtener_cambios_cargas(cursor_cargas()))
+            except Exception as e:
+                olvidar_cargas_sincronizadas()
+                self.ultimo_error = str(e)
+                raise
+            self._inicio_ok = inicio
+            self.ultima_ok = time.time()
+            self.ultimo_error = None
+            if cambiadas:
+                with self._lock_vistas:
+                    self.version += 1
+                    self._vistas.clear()
+            return cambiadas
+
+    def compartido(self, clave: tuple, calcular: Callable):
+        """
+        Resultado de `calcular()` para la versión actual del espejo, calculado
+        una sola vez para todas las sesiones. No debe modificarse.
+        """
+        with self._lock_vistas:
+            version = self.version
+            if clave in self._vistas:
+                self._vistas.move_to_end(clave)
+                return self._vistas[clave]
+
+        valor = calcular()
+        with self._lock_vistas:
+            # Si el espejo cambió mientras se calculaba, se entrega pero no se guarda
+            if self.version == version:
+                self._vistas[clave] = valor
+                while len(self._vistas) > VISTAS_MAX:
+                    self._vistas.popitem(last=False)
+        return valor
+
+    def despertar(self) -> None:
+        """Adelanta la próxima pasada (p. ej. al terminar un lote o un reintento)."""
+        self._despertar.set()
+
+    def _bucle(self) -> None:
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.sincronizar()
+            except Exception:
+                # Queda en ultimo_error; se reintenta en la siguiente vuelta
+                pass
+
+
+@st.cache_resource(show_spinner=False)
+def get_sincronizador() -> SincronizadorCargas:
+    return SincronizadorCargas(CARGAS_SYNC_SECS)
+
+
+def vista_cargas(filtros: dict, pagina: int, tam_pagina: int) -> dict:
+    """consultar_cargas_locales compartido entre sesiones; "items" es una tupla."""
+    def calcular():
+        resultado = consultar_cargas_locales(filtros, pagina, tam_pagina)
+        return {**resultado, "items": tuple(resultado["items"])}
+
+    return get_sincronizador().compartido(("cargas", tuple(sorted(filtros.items())), pagina, tam_pagina), calcular)
+
+
+def vista_kpis(granularidad: str, limite: int) -> tuple:
+    """kpis_por_periodo compartido entre sesiones."""
+    return get_sincronizador().compartido(
+        ("kpis", granularidad, limite), lambda: tuple(kpis_por_periodo(granularidad, limite))
+    )
@@ -0,0 +1,578 @@
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+import streamlit as st
+
+from api_client import (
+    UPLOAD_CHUNKED_THRESHOLD,
+    existe_pdf_en_backend,
+    get_estado_subidas,
+    invalidar_cache_cargas,
+    subir_pdf,
+    subir_pdfs_en_lote,
+    vincular_pdf_existente,
+)
+from auditoria import auditar_subida, registrar_documento_async
+from db_local import documento_por_hash
+from metricas import registrar, throughput_subidas
+from sincronizacion import get_sincronizador
+from validacion_pdf import (
+    PDF_CABECERA_VENTANA,
+    PDF_COLA_VENTANA,
+    analisis_disponible,
+    chequeo_rapido,
+    servir_analisis,
+)
+
+# --------------------------------------------------
+# CONFIG SUBIDA
+# --------------------------------------------------
+# Subidas simultáneas en todo el proceso (el tiempo total escala con esto, no con el nº de archivos)
+UPLOAD_MAX_WORKERS = 6
+# Antes de subir: saltar PDFs repetidos y vincular los que el backend ya tiene
+DEDUP_HABILITADO = True
+DEDUP_CONSULTAR_BACKEND = True
+HASH_CHUNK = 1024 * 1024
+# Lotes terminados que se conservan para consultar su resultado
+TRABAJOS_MAX_HISTORIAL = 50
+# Validación previa: parseo con pypdf (si está instalado) en procesos aparte
+VALIDACION_MAX_PROCESOS = 2
+# Un análisis que tarda más que esto (desde que tiene proceso, no en cola) se abandona
+# (PDF patológico) y el PDF se envía sin validar
+VALIDACION_TIMEOUT_SECS = 120
+# PDFs a partir de este tamaño se intentan recomprimir antes de enviarlos
+PDF_RECOMPRIMIR_DESDE = 20 * 1024 * 1024
+# Planificación del lote: los PDFs pequeños viajan juntos en una sola petición
+# (si el backend lo acepta) y el resto sale de menor a mayor
+PAQUETE_MAX_ARCHIVO = 1024 * 1024
+PAQUETE_MAX_BYTES = 8 * 1024 * 1024
+PAQUETE_MAX_ARCHIVOS = 20
+# Los muy grandes arrancan primero (sin ocupar todos los workers) para no quedar solos al final
+PLANIFICADOR_GRANDE_DESDE = 32 * 1024 * 1024
+
+
+# --------------------------------------------------
+# SUBIDA DE UN ARCHIVO
+# --------------------------------------------------
+def nombre_unico(nombre: str) -> str:
+    base, ext = os.path.splitext(nombre)
+    return f"{base}_{uuid.uuid4().hex}{ext}"
+
+
+def calcular_sha256(archivo) -> str:
+    # Por bloques con read(): getbuffer() sobre un UploadedFile deja de
+    # compartir el buffer y copia el PDF entero
+    h = hashlib.sha256()
+    archivo.seek(0)
+    while bloque := archivo.read(HASH_CHUNK):
+        h.update(bloque)
+    archivo.seek(0)
+    return h.hexdigest()
+
+
+class ProcesoValidacion:
+    """
+    Un proceso de análisis propio (servir_analisis), para poder terminar
+    justo el que se cuelga sin tocar los análisis de otras subidas.
+    """
+
+    def __init__(self):
+        # spawn: hacer fork de un proceso con hilos (Streamlit, pool de subida) no es seguro
+        contexto = multiprocessing.get_context("spawn")
+        self._conn, extremo_hijo = contexto.Pipe()
+        self._proceso = contexto.Process(target=servir_analisis, args=(extremo_hijo,), daemon=True)
+        self._proceso.start()
+        extremo_hijo.close()
+
+    def analizar(self, ruta: str, recomprimir: bool, timeout: float) -> dict:
+        """TimeoutError si no responde a tiempo; EOFError/OSError si el proceso ha muerto."""
+        self._conn.send((ruta, recomprimir))
+        if not self._conn.poll(timeout):
+            raise TimeoutError(f"análisis sin respuesta en {timeout:g} s")
+        return self._conn.recv()
+
+    def terminar(self) -> None:
+        self._proceso.terminate()
+        self._proceso.join()
+        self._conn.close()
+
+
+class PoolValidacion:
+    """
+    Como mucho `procesos` análisis a la vez. Cada PDF espera turno antes de
+    tomar un proceso, así el plazo solo cuenta su propio análisis y no la
+    cola que forman los workers de subida.
+    """
+
+    def __init__(self, procesos: int):
+        self._turnos = threading.BoundedSemaphore(procesos)
+        self._libres: list[ProcesoValidacion] = []
+        self._lock = threading.Lock()
+
+    def analizar(self, ruta: str, recomprimir: bool, timeout: float) -> Optional[dict]:
+        """Resultado de analizar_pdf, o None si el análisis se colgó o tumbó su proceso."""
+        with self._turnos:
+            with self._lock:
+                proceso = self._libres.pop() if self._libres else None
+            if proceso is None:
+                proceso = ProcesoValidacion()
+            try:
+                analisis = proceso.analizar(ruta, recomprimir, timeout)
+            except (TimeoutError, EOFError, OSError):
+                # Colgado o muerto (p. ej. un PDF que tumba a pypdf): se descarta
+                # solo ese proceso; el siguiente análisis arranca uno nuevo
+                proceso.terminar()
+                return None
+            with self._lock:
+                self._libres.append(proceso)
+            return analisis
+
+
+@st.cache_resource(show_spinner=False)
+def get_pool_validacion() -> PoolValidacion:
+    return PoolValidacion(VALIDACION_MAX_PROCESOS)
+
+
+class PdfRecomprimido(io.BytesIO):
+    """Versión recomprimida de un UploadedFile: mismo nombre, otro contenido."""
+
+    def __init__(self, name: str, contenido: bytes):
+        super().__init__(contenido)
+        self.name = name
+        self.size = len(contenido)
+
+
+def validar_rapido(archivo) -> Optional[str]:
+    # Solo se leen cabecera y cola, en este hilo
+    archivo.seek(0)
+    cabecera = archivo.read(PDF_CABECERA_VENTANA)
+    archivo.seek(max(0, archivo.size - PDF_COLA_VENTANA))
+    cola = archivo.read(PDF_COLA_VENTANA)
+    archivo.seek(0)
+    return chequeo_rapido(cabecera, cola)
+
+
+def preparar_envio(archivo):
+    """
+    Análisis estructural (y recompresión de los grandes) en el pool de
+    validación. Devuelve (motivo_rechazo, archivo_a_enviar).
+
+    El PDF llega al proceso como ruta de un archivo temporal, copiado por
+    bloques: ni getvalue() ni pickle duplican el PDF en memoria.
+    """
+    if not analisis_disponible():
+        return None, archivo
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        archivo.seek(0)
+        shutil.copyfileobj(archivo, tmp, HASH_CHUNK)
+        archivo.seek(0)
+    try:
+        analisis = get_pool_validacion().analizar(
+            tmp.name, archivo.size >= PDF_RECOMPRIMIR_DESDE, VALIDACION_TIMEOUT_SECS
+        )
+    finally:
+        os.remove(tmp.name)
+    if analisis is None:
+        # El análisis es una comprobación previa: sin él el PDF se envía tal cual
+        return None, archivo
+    if analisis["error"]:
+        return analisis["error"], archivo
+    if analisis["pdf"] is not None:
+        return None, PdfRecomprimido(archivo.name, analisis["pdf"])
+    return None, archivo
+
+
+def _hash_almacenado(sha256: str) -> Optional[str]:
+    """
+    Hash con el que el backend conoce este PDF, o None si no lo tiene. Los
+    que se enviaron recomprimidos están guardados con el hash de esos bytes,
+    que solo sabe el índice local.
+    """
+    documento = documento_por_hash(sha256)
+    if documento:
+        return documento["sha256_almacenado"] or sha256
+    if DEDUP_CONSULTAR_BACKEND and existe_pdf_en_backend(sha256):
+        return sha256
+    return None
+
+
+def _preparar(archivo, id_carga: str, vistos: dict, lock: threading.Lock, resultado: dict):
+    """
+    Todo lo previo al envío. Devuelve el archivo a enviar, o None si
+    `resultado` ya es definitivo (rechazado o vinculado) o es un duplicado
+    que se resuelve con _resolver_duplicados.
+    """
+    if archivo.size == 0:
+        raise Exception("PDF vacío")
+
+    # Lo que no es un PDF válido no viaja: se rechaza aquí, no como ERROR en el backend
+    motivo = validar_rapido(archivo)
+    if motivo:
+        resultado.update(accion="rechazado", error=motivo)
+        return None
+
+    if DEDUP_HABILITADO:
+        sha256 = resultado["sha256"] = calcular_sha256(archivo)
+
+        # Repetido dentro del mismo lote: solo viaja el primero, y el
+        # duplicado hereda su resultado cuando termine (ver _resolver_duplicados)
+        with lock:
+            original = vistos.setdefault(sha256, {"archivo": archivo, "resultado": resultado, "listo": threading.Event()})
+        if original["archivo"] is not archivo:
+            resultado.update(accion="duplicado", error=f"igual a {original['archivo'].name}")
+            return None
+
+        # Ya almacenado en una carga anterior: se vincula sin reenviar bytes
+        almacenado = _hash_almacenado(sha256)
+        if almacenado and vincular_pdf_existente(almacenado, id_carga, archivo.name):
+            registrar_documento_async(archivo.name, archivo.name, archivo.size, sha256, id_carga, almacenado)
+            resultado.update(ok=True, accion="vinculado")
+            return None
+
+    # Solo se analiza/recomprime lo que de verdad se va a enviar
+    motivo, envio = preparar_envio(archivo)
+    if motivo:
+        resultado.update(accion="rechazado", error=motivo)
+        return None
+    return envio
+
+
+def _publicar_originales(resultados: list, vistos: dict) -> None:
+    """Los resultados de este grupo ya son definitivos: sus duplicados pueden leerlos."""
+    for r in resultados:
+        original = vistos.get(r["sha256"]) if r["sha256"] else None
+        if original is not None and original["resultado"] is r:
+            original["listo"].set()
+
+
+def _resolver_duplicados(resultados: list, vistos: dict) -> None:
+    """
+    Cada duplicado espera al resultado de su original y lo hereda. Se llama
+    después de _publicar_originales del mismo grupo: el original ya está en
+    curso en algún worker (o en este mismo grupo y ya publicado), así que
+    la espera siempre termina.
+    """
+    for r in resultados:
+        if r["accion"] != "duplicado":
+            continue
+        original = vistos[r["sha256"]]
+        original["listo"].wait()
+        if original["resultado"]["ok"]:
+            r["ok"] = True
+        else:
+            r["error"] = f"{r['error']}, que falló: {original['resultado']['error']}"
+
+
+def _clave_sesion(archivo, envio, resultado: dict) -> Optional[str]:
+    """
+    Clave de la sesión reanudable: el contenido, no nombre + tamaño (dos
+    PDFs distintos con el mismo nombre y tamaño no deben continuar la subida
+    del otro). No incluye la carga: cada "Iniciar carga" pide un id_carga
+    nuevo y el reintento debe reanudar igual.
+    """
+    if envio.size < UPLOAD_CHUNKED_THRESHOLD:
+        return None  # va en un POST único, sin sesión
+    return resultado["sha256"] or calcular_sha256(archivo)
+
+
+def _nuevo_resultado(nombre: str, size: int) -> dict:
+    return {"archivo": nombre, "ok": False, "error": None, "accion": None, "sha256": None,
+            "bytes": size, "ahorro": 0, "ms": None}
+
+
+def _marcar_subido(archivo, envio, nombre_envio: str, id_carga: str, resultado: dict) -> None:
+    resultado.update(ok=True, accion="subido", bytes=envio.size, ahorro=archivo.size - envio.size)
+    if resultado["sha256"]:
+        # El backend guarda (y busca) por el hash de lo recibido: si se envió
+        # recomprimido, el índice lo apunta para vincular la próxima vez
+        almacenado = calcular_sha256(envio) if envio is not archivo else None
+        # Por la cola de auditoría: el worker no espera al commit en crud.db
+        registrar_documento_async(archivo.name, nombre_envio, archivo.size, resultado["sha256"], id_carga, almacenado)
+
+
+def subir_archivo(archivo, id_carga: str, vistos: dict, lock: threading.Lock) -> dict:
+    resultado = _nuevo_resultado(archivo.name, archivo.size)
+    comienzo = time.perf_counter()
+    try:
+        envio = _preparar(archivo, id_carga, vistos, lock, resultado)
+        if envio is None:
+            return resultado
+
+        nombre_envio = nombre_unico(archivo.name)
+
+        # Se envía el propio UploadedFile (o su versión recomprimida) en streaming;
+        # los grandes por bloques reanudables, todos con reintentos
+        inicio = time.perf_counter()
+        subir_pdf(envio, nombre_envio, id_carga, clave=_clave_sesion(archivo, envio, resultado))
+        registrar("subida", "pdf", (time.perf_counter() - inicio) * 1000, bytes_=envio.size)
+        _marcar_subido(archivo, envio, nombre_envio, id_carga, resultado)
+        return resultado
+    except Exception as e:
+        resultado["error"] = str(e)
+        return resultado
+    finally:
+        # Validación + envío de este PDF, para el historial
+        resultado["ms"] = (time.perf_counter() - comienzo) * 1000
+        _publicar_originales([resultado], vistos)
+        # Suelta la referencia a los bytes del PDF en cuanto termina su envío
+        archivo.close()
+        _resolver_duplicados([resultado], vistos)
+
+
+def subir_paquete(archivos: list, id_carga: str, vistos: dict, lock: threading.Lock) -> list:
+    """
+    Varios PDFs pequeños: cada uno se valida/deduplica por separado y los
+    que quedan viajan en una sola petición. Si el backend no acepta lotes,
+    se envían de uno en uno. Devuelve un resultado por archivo, en orden.
+    """
+    resultados = [_nuevo_resultado(a.name, a.size) for a in archivos]
+    pendientes = []
+    comienzo = time.perf_counter()
+    try:
+        for archivo, resultado in zip(archivos, resultados):
+            try:
+                envio = _preparar(archivo, id_carga, vistos, lock, resultado)
+            except Exception as e:
+                resultado["error"] = str(e)
+                envio = None
+            if envio is None:
+                resultado["ms"] = (time.perf_counter() - comienzo) * 1000
+                continue
+            pendientes.append((archivo, envio, nombre_unico(archivo.name), resultado))
+
+        if len(pendientes) > 1:
+            inicio = time.perf_counter()
+            try:
+                respuestas = subir_pdfs_en_lote([(envio, nombre) for _, envio, nombre, _ in pendientes], id_carga)
+            except Exception as e:
+                for *_, resultado in pendientes:
+                    resultado["error"] = str(e)
+                return resultados
+            if respuestas is not None:
+                registrar("subida", "paquete", (time.perf_counter() - inicio) * 1000,
+                          bytes_=sum(envio.size for _, envio, _, _ in pendientes))
+                for (archivo, envio, nombre, resultado), r in zip(pendientes, respuestas):
+                    if r["ok"]:
+                        _marcar_subido(archivo, envio, nombre, id_carga, resultado)
+                    else:
+                        resultado["error"] = r["error"] or "rechazado por el backend"
+                return resultados
+
+        for archivo, envio, nombre, resultado in pendientes:
+            try:
+                inicio = time.perf_counter()
+                subir_pdf(envio, nombre, id_carga, clave=_clave_sesion(archivo, envio, resultado))
+                registrar("subida", "pdf", (time.perf_counter() - inicio) * 1000, bytes_=envio.size)
+                _marcar_subido(archivo, envio, nombre, id_carga, resultado)
+            except Exception as e:
+                resultado["error"] = str(e)
+        return resultados
+    finally:
+        # Los que viajaron juntos comparten la latencia del paquete
+        for resultado in resultados:
+            if resultado["ms"] is None:
+                resultado["ms"] = (time.perf_counter() - comienzo) * 1000
+        _publicar_originales(resultados, vistos)
+        _resolver_duplicados(resultados, vistos)
+        for archivo in archivos:
+            archivo.close()
+
+
+def planificar(tamanos: list, workers: int = UPLOAD_MAX_WORKERS, paquetes: bool = True) -> list:
+    """
+    Orden de envío de un lote: lista de grupos de índices (un grupo = una
+    tarea del pool).
+    - Los muy grandes (>= PLANIFICADOR_GRANDE_DESDE) primero, de mayor a
+      menor, como mucho workers - 1: corren en paralelo con el resto en
+      vez de quedar solos al final.
+    - Los pequeños (< PAQUETE_MAX_ARCHIVO) agrupados en paquetes, si
+      `paquetes`: una petición por paquete en vez de una por archivo, y al
+      menos tantos paquetes como workers para no perder paralelismo.
+    - Todo lo demás de menor a mayor, para ver resultados cuanto antes.
+    """
+    orden = sorted(range(len(tamanos)), key=lambda i: tamanos[i])
+    grandes = [i for i in reversed(orden) if tamanos[i] >= PLANIFICADOR_GRANDE_DESDE][:max(0, workers - 1)]
+    adelantados = set(grandes)
+    pequenos = sum(1 for t in tamanos if t < PAQUETE_MAX_ARCHIVO)
+    por_paquete = max(2, min(PAQUETE_MAX_ARCHIVOS, math.ceil(pequenos / max(1, workers))))
+
+    grupos = [[i] for i in grandes]
+    paquete, bytes_paquete = [], 0
+    for i in orden:
+        if i in adelantados:
+            continue
+        empaquetable = paquetes and tamanos[i] < PAQUETE_MAX_ARCHIVO
+        if paquete and (
+            not empaquetable
+            or len(paquete) >= por_paquete
+            or bytes_paquete + tamanos[i] > PAQUETE_MAX_BYTES
+        ):
+            grupos.append(paquete)
+            paquete, bytes_paquete = [], 0
+        if empaquetable:
+            paquete.append(i)
+            bytes_paquete += tamanos[i]
+        else:
+            grupos.append([i])
+    if paquete:
+        grupos.append(paquete)
+    return grupos
+
+
+# --------------------------------------------------
+# LOTES EN SEGUNDO PLANO
+# --------------------------------------------------
+class TrabajoCarga:
+    """Un lote de PDFs para un id_carga; su progreso se consulta desde cualquier sesión."""
+
+    def __init__(self, id_carga: str, nombres: list, tamanos: list, usuario: Optional[str] = None):
+        self.id = uuid.uuid4().hex[:10]
+        self.id_carga = id_carga
+        self.usuario = usuario
+        self.nombres = nombres
+        self.tamanos = tamanos
+        self.total = len(nombres)
+        self.resultados = [None] * self.total
+        self.hechos = 0
+        self.bytes_total = sum(tamanos)
+        self.bytes_hechos = 0
+        self.inicio = time.time()
+        self.fin = None
+        self._lock = threading.Lock()
+        self._terminado = threading.Event()
+        if self.total == 0:
+            self._marcar_fin()
+
+    @property
+    def terminado(self) -> bool:
+        return self._terminado.is_set()
+
+    def registrar(self, i: int, resultado: dict) -> None:
+        with self._lock:
+            self.resultados[i] = resultado
+            self.hechos += 1
+            self.bytes_hechos += self.tamanos[i]
+            ultimo = self.hechos == self.total
+        if ultimo:
+            self._marcar_fin()
+
+    def _marcar_fin(self) -> None:
+        self.fin = time.time()
+        self._terminado.set()
+        enviados = sum(r["bytes"] for r in self.resultados if r and r["accion"] == "subido")
+        registrar("subida", "lote", (self.fin - self.inicio) * 1000, bytes_=enviados)
+        invalidar_cache_cargas()
+        get_sincronizador().despertar()
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        return self._terminado.wait(timeout)
+
+    def eta(self) -> Optional[float]:
+        """Segundos restantes según el ritmo del propio lote (al empezar, el de lotes anteriores)."""
+        if self.terminado:
+            return 0.0
+        with self._lock:
+            restantes = self.bytes_total - self.bytes_hechos
+            hechos = self.bytes_hechos
+        transcurrido = time.time() - self.inicio
+        if hechos and transcurrido > 0:
+            return restantes / (hechos / transcurrido)
+        mbps = throughput_subidas()
+        return restantes / (mbps * 1024 * 1024) if mbps else None
+
+    def resumen(self) -> dict:
+        eta = self.eta()
+        with self._lock:
+            return {
+                "id": self.id,
+                "id_carga": self.id_carga,
+                "total": self.total,
+                "hechos": self.hechos,
+                "terminado": self.terminado,
+                "resultados": [r for r in self.resultados if r is not None],
+                "segundos": (self.fin or time.time()) - self.inicio,
+                "eta": eta,
+            }
+
+
+class GestorCargas:
+    """
+    Pool de subida compartido por todo el proceso. Los lotes siguen
+    corriendo aunque la sesión que los lanzó haga rerun, cambie de menú o
+    se cierre; el progreso queda disponible por id de trabajo.
+    """
+
+    def __init__(self, max_workers: int = UPLOAD_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        self._lock = threading.Lock()
+        self._trabajos = OrderedDict()
+
+    def lanzar(self, archivos, id_carga: str, usuario: Optional[str] = None) -> str:
+        tamanos = [a.size for a in archivos]
+        trabajo = TrabajoCarga(id_carga, [a.name for a in archivos], tamanos, usuario)
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+            self._podar()
+
+        vistos, lock_vistos = {}, threading.Lock()
+        paquetes = get_estado_subidas().lote_servidor is not False
+        for grupo in planificar(tamanos, self.max_workers, paquetes):
+            if len(grupo) == 1:
+                fut = self._pool.submit(subir_archivo, archivos[grupo[0]], id_carga, vistos, lock_vistos)
+            else:
+                fut = self._pool.submit(subir_paquete, [archivos[i] for i in grupo], id_carga, vistos, lock_vistos)
+            fut.add_done_callback(partial(self._al_terminar, trabajo, grupo))
+        return trabajo.id
+
+    @staticmethod
+    def _al_terminar(trabajo: TrabajoCarga, grupo: list, fut) -> None:
+        # Cada archivo del grupo tiene que quedar registrado pase lo que pase:
+        # si no, el trabajo no termina nunca y el fragment de progreso sigue
+        # consultándolo (una excepción en un done_callback solo se loguea)
+        try:
+            resultado = fut.result()
+            resultados = resultado if isinstance(resultado, list) else [resultado]
+        except Exception as e:
+            resultados = []
+            for i in grupo:
+                r = _nuevo_resultado(trabajo.nombres[i], trabajo.tamanos[i])
+                r["error"] = f"error interno: {e}"
+                resultados.append(r)
+        for i, r in zip(grupo, resultados):
+            try:
+                auditar_subida(r, trabajo.id_carga, trabajo.usuario)
+            except Exception:
+                pass  # el historial no puede dejar el lote a medias
+            trabajo.registrar(i, r)
+
+    def _podar(self) -> None:
+        terminados = [k for k, t in self._trabajos.items() if t.terminado]
+        for k in terminados[:max(0, len(terminados) - TRABAJOS_MAX_HISTORIAL)]:
+            del self._trabajos[k]
+
+    def obtener(self, trabajo_id: str) -> Optional[TrabajoCarga]:
+        with self._lock:
+            return self._trabajos.get(trabajo_id)
+
+    def activos(self) -> list:
+        with self._lock:
+            return [t for t in self._trabajos.values() if not t.terminado]
+
+
+@st.cache_resource(show_spinner=False)
+def get_gestor_cargas() -> GestorCargas:
+    return GestorCargas(UPLOAD_MAX_WORKERS)
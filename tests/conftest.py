@@ -0,0 +1,77 @@
+"""
+Pruebas de Extracta contra mock_backend.py (sin tocar Azure), en un
+directorio temporal con una copia de crud.db, igual que bench/run_bench.py:
+
+    python -m pytest -q
+
+El mock arranca al cargar este archivo: api_client lee EXTRACTA_API_BASE
+al importarse y los módulos de prueba lo importan al recogerse.
+"""
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "bench"))
+
+import mock_backend  # noqa: E402
+
+_, ESTADO_MOCK, API_BASE = mock_backend.iniciar_servidor(0)
+os.environ["EXTRACTA_API_BASE"] = API_BASE
+
+
+class ArchivoSubido(io.BytesIO):
+    """Lo mínimo de un UploadedFile de Streamlit: name, size y file-like."""
+
+    def __init__(self, name: str, contenido: bytes):
+        super().__init__(contenido)
+        self.name = name
+        self.size = len(contenido)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def directorio_trabajo():
+    directorio = tempfile.mkdtemp(prefix="extracta_tests_")
+    shutil.copy(os.path.join(RAIZ, "crud.db"), os.path.join(directorio, "crud.db"))
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    yield directorio
+    os.chdir(anterior)
+    shutil.rmtree(directorio, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def estado_limpio(monkeypatch):
+    """Circuito, timeouts, caché y estado de subidas nuevos en cada prueba; backoff sin esperas."""
+    import api_client
+
+    for recurso in (api_client.get_disyuntor, api_client.get_timeouts_adaptativos,
+                    api_client.get_cache_cargas, api_client.get_estado_subidas):
+        recurso.clear()
+    monkeypatch.setattr(api_client, "esperar_backoff", lambda intento: None)
+    ESTADO_MOCK.latencia = ESTADO_MOCK.fail_rate = 0.0
+    ESTADO_MOCK.latencia_dashboard = ESTADO_MOCK.fail_rate_dashboard = 0.0
+    yield
+
+
+@pytest.fixture
+def mock():
+    return ESTADO_MOCK
+
+
+@pytest.fixture
+def pdf():
+    """pdf(tam) -> bytes de un PDF válido de una página con `tam` bytes aleatorios."""
+    from run_bench import pdf_sintetico
+
+    return pdf_sintetico
+
+
+@pytest.fixture
+def archivo():
+    return ArchivoSubido
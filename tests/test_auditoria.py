@@ -0,0 +1,20 @@
+import threading
+
+import auditoria
+
+
+def test_los_descartes_por_cola_llena_se_cuentan_todos(monkeypatch):
+    # El escritor no consume: todo lo que no cabe en la cola se descarta
+    monkeypatch.setattr(auditoria.EscritorAuditoria, "_bucle", lambda self: None)
+    monkeypatch.setattr(auditoria.atexit, "register", lambda *args: None)
+    escritor = auditoria.EscritorAuditoria(cola_max=10)
+    hilos = [
+        threading.Thread(target=lambda: [escritor.encolar("evento", ()) for _ in range(5000)])
+        for _ in range(8)
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert escritor.pendientes == 10
+    assert escritor.descartados == 8 * 5000 - 10
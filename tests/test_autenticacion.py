@@ -0,0 +1,14 @@
+from autenticacion import hash_password, verificar_password
+
+
+def test_verificar_password():
+    almacenado = hash_password("secreta", iteraciones=1000)
+    assert verificar_password("secreta", almacenado)
+    assert not verificar_password("otra", almacenado)
+
+
+def test_hash_corrupto_no_verifica():
+    algoritmo, iteraciones, sal, esperado = hash_password("secreta", iteraciones=1000).split("$")
+    assert not verificar_password("secreta", "$".join((algoritmo, iteraciones, sal, esperado[:-3])))
+    assert not verificar_password("secreta", "$".join((algoritmo, iteraciones, sal[:-3], esperado)))
+    assert not verificar_password("secreta", "sin formato")
@@ -0,0 +1,76 @@
+import pytest
+
+import db_local
+
+
+@pytest.fixture
+def espejo_vacio():
+    db_local.inicializar_db()
+    with db_local.conexion() as conn:
+        conn.execute("DELETE FROM cargas")
+        db_local.recalcular_kpis(conn)
+
+
+def _estados() -> dict:
+    with db_local.conexion() as conn:
+        return {r["estado"]: r["n"] for r in conn.execute("SELECT estado, n FROM kpi_estados WHERE n > 0")}
+
+
+def _carga(id_carga: str, estado: str, updated_at: str, error=None) -> dict:
+    return {"id_carga": id_carga, "status": estado, "updated_at": updated_at, "error_message": error}
+
+
+def test_triggers_cuentan_altas_y_transiciones(espejo_vacio):
+    assert db_local.guardar_cargas([
+        _carga("k1", "UPLOADED", "2026-03-01T10:00:00"),
+        _carga("k2", "UPLOADED", "2026-03-01T10:05:00"),
+        _carga("k3", "uploaded", "2026-03-01T11:00:00"),
+    ]) == 3
+    assert _estados() == {"UPLOADED": 3}
+
+    db_local.guardar_cargas([
+        _carga("k1", "PROCESSED", "2026-03-01T10:02:00"),
+        _carga("k2", "ERROR", "2026-03-01T10:06:00", "fallo OCR"),
+    ])
+    assert _estados() == {"UPLOADED": 1, "PROCESSED": 1, "ERROR": 1}
+
+    (dia,) = db_local.kpis_por_periodo("dia")
+    assert (dia["bucket"], dia["recibidas"], dia["procesadas"], dia["errores"]) == ("2026-03-01", 3, 1, 1)
+    assert dia["tasa_error"] == 0.5
+    assert dia["media_proceso_s"] == pytest.approx(120, abs=1)
+
+    horas = {k["bucket"]: k["recibidas"] for k in db_local.kpis_por_periodo("hora")}
+    assert horas == {"2026-03-01 10": 2, "2026-03-01 11": 1}
+
+
+def test_reguardar_sin_cambios_no_toca_los_contadores(espejo_vacio):
+    cargas = [_carga("k1", "UPLOADED", "2026-03-02T09:00:00"), _carga("k2", "ERROR", "2026-03-02T09:00:00")]
+    db_local.guardar_cargas(cargas)
+    antes = (_estados(), db_local.kpis_por_periodo("dia"))
+
+    assert db_local.guardar_cargas(cargas) == 0
+    assert (_estados(), db_local.kpis_por_periodo("dia")) == antes
+
+
+def test_triggers_coinciden_con_el_recuento(espejo_vacio):
+    db_local.guardar_cargas([_carga(f"r{i}", "UPLOADED", f"2026-03-03T0{i % 10}:00:00") for i in range(30)])
+    db_local.guardar_cargas([_carga(f"r{i}", "PROCESSED", f"2026-03-03T1{i % 10}:00:00") for i in range(0, 30, 3)])
+    por_triggers = _estados()
+
+    with db_local.conexion() as conn:
+        db_local.recalcular_kpis(conn)
+    assert _estados() == por_triggers == {"UPLOADED": 20, "PROCESSED": 10}
+
+
+def test_consulta_local_pagina_y_cuenta_con_filtros(espejo_vacio):
+    db_local.guardar_cargas([
+        _carga(f"p{i:02d}", "ERROR" if i % 4 == 0 else "PROCESSED", f"2026-03-04T10:{i:02d}:00") for i in range(20)
+    ])
+    pagina = db_local.consultar_cargas_locales({}, 2, 8)
+    assert pagina["total"] == 20
+    assert pagina["conteos"] == {"PROCESSED": 15, "ERROR": 5, "UPLOADED": 0}
+    assert [r["id_carga"] for r in pagina["items"]] == [f"p{i:02d}" for i in range(11, 3, -1)]
+
+    errores = db_local.consultar_cargas_locales({"estado": "ERROR", "texto": "p1"}, 1, 10)
+    assert [r["id_carga"] for r in errores["items"]] == ["p16", "p12"]
+    assert errores["total"] == 2
@@ -0,0 +1,22 @@
+import json
+import threading
+
+from metricas import RegistroMetricas
+
+
+def test_el_archivo_recibe_todas_las_mediciones(tmp_path):
+    archivo = tmp_path / "metricas.jsonl"
+    registro = RegistroMetricas(archivo=str(archivo))
+    hilos = [
+        threading.Thread(target=lambda: [registro.registrar("http", "GET /x", 1.0) for _ in range(500)])
+        for _ in range(4)
+    ]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert registro.vaciar(10)
+    lineas = archivo.read_text(encoding="utf-8").splitlines()
+    assert len(lineas) == len(registro.mediciones("http")) == 2000
+    assert json.loads(lineas[0])["nombre"] == "GET /x"
@@ -0,0 +1,156 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import api_client
+import mock_backend
+from api_client import CircuitoAbierto, Disyuntor
+
+
+# --------------------------------------------------
+# CIRCUIT BREAKER
+# --------------------------------------------------
+def test_disyuntor_se_abre_tras_el_umbral():
+    d = Disyuntor(umbral=3, enfriamiento=60)
+    for _ in range(2):
+        d.fallo()
+    d.permitir()
+    assert d.estado == "cerrado"
+
+    d.fallo()
+    assert d.estado == "abierto"
+    with pytest.raises(CircuitoAbierto):
+        d.permitir()
+
+
+def test_exito_reinicia_la_cuenta_de_fallos():
+    d = Disyuntor(umbral=2, enfriamiento=60)
+    d.fallo()
+    d.exito()
+    d.fallo()
+    assert d.estado == "cerrado"
+
+
+def test_semiabierto_deja_pasar_una_sola_prueba():
+    d = Disyuntor(umbral=1, enfriamiento=0)
+    d.fallo()
+    assert d.estado == "semiabierto"
+
+    d.permitir()
+    with pytest.raises(CircuitoAbierto):
+        d.permitir()
+
+    d.exito()
+    assert d.estado == "cerrado"
+    d.permitir()
+
+
+def test_prueba_fallida_vuelve_a_abrir():
+    d = Disyuntor(umbral=1, enfriamiento=0.05)
+    d.fallo()
+    time.sleep(0.06)
+    d.permitir()
+    d.fallo()
+    assert d.estado == "abierto"
+
+
+def test_liberar_suelta_la_prueba_sin_cerrar():
+    d = Disyuntor(umbral=1, enfriamiento=0)
+    d.fallo()
+    d.permitir()
+    d.liberar()
+    assert d.estado == "semiabierto"
+    d.permitir()
+
+
+def test_http_request_libera_la_prueba_si_la_llamada_no_llega(monkeypatch):
+    d = api_client.get_disyuntor()
+    for _ in range(d.umbral):
+        d.fallo()
+    d._abierto_hasta = 0.0
+
+    def roto(*args, **kwargs):
+        raise RuntimeError("fallo local, no del backend")
+
+    monkeypatch.setattr(api_client.get_http_session(), "request", roto)
+    with pytest.raises(RuntimeError):
+        api_client.http_request("GET", api_client.API_ID_CARGA_URL)
+    monkeypatch.undo()
+
+    api_client.http_request("GET", api_client.API_ID_CARGA_URL)
+    assert d.estado == "cerrado"
+
+
+def test_5xx_opcional_no_abre_el_circuito(monkeypatch):
+    def caido(self):
+        self._json(503, {"detail": "lookup caído"})
+
+    monkeypatch.setattr(mock_backend.MockHandler, "do_GET", caido)
+    d = api_client.get_disyuntor()
+    for _ in range(d.umbral + 1):
+        api_client.http_request("GET", api_client.API_PDF_LOOKUP_URL, opcional=True)
+    assert d.fallos == 0
+
+    for _ in range(d.umbral):
+        api_client.http_request("GET", api_client.API_PDF_LOOKUP_URL)
+    assert d.estado == "abierto"
+
+
+# --------------------------------------------------
+# REINTENTOS
+# --------------------------------------------------
+def test_con_reintentos_solo_reintenta_errores_transitorios():
+    llamadas = []
+
+    def transitorio():
+        llamadas.append(1)
+        if len(llamadas) < 3:
+            raise requests.ConnectionError("red")
+        return "ok"
+
+    assert api_client.con_reintentos(transitorio, intentos=5) == "ok"
+    assert len(llamadas) == 3
+
+    def definitivo():
+        llamadas.append(1)
+        raise ValueError("no se reintenta")
+
+    llamadas.clear()
+    with pytest.raises(ValueError):
+        api_client.con_reintentos(definitivo, intentos=5)
+    assert len(llamadas) == 1
+
+
+# --------------------------------------------------
+# REINTENTO MASIVO
+# --------------------------------------------------
+def test_reintento_en_lote_con_error_sin_ok_cuenta_como_fallo(monkeypatch):
+    resultados = [{"id_carga": "c1", "error": "carga no encontrada"}, {"id_carga": "c2"}]
+    monkeypatch.setattr(api_client, "_json_o_error", lambda resp: {"results": resultados})
+    assert [(r["id_carga"], r["ok"]) for r in api_client._reintentar_lote_backend(["c1", "c2", "c3"])] == [
+        ("c1", False), ("c2", True), ("c3", False)
+    ]
+
+
+# --------------------------------------------------
+# CACHÉ DE CARGAS
+# --------------------------------------------------
+def test_invalidar_no_espera_a_una_consulta_en_curso(mock):
+    mock.tocar_carga("cache-1")
+    mock.latencia_dashboard = 0.5
+    cache = api_client.get_cache_cargas()
+    lectores = [threading.Thread(target=cache.obtener) for _ in range(3)]
+    for t in lectores:
+        t.start()
+    time.sleep(0.1)
+
+    inicio = time.perf_counter()
+    cache.invalidar()
+    assert time.perf_counter() - inicio < 0.05
+
+    for t in lectores:
+        t.join()
+    mock.latencia_dashboard = 0.0
+    assert "cache-1" in set(cache.obtener()["id_carga"])
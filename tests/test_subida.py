@@ -0,0 +1,334 @@
+import email.parser
+import hashlib
+import io
+import threading
+import time
+
+import pytest
+
+import api_client
+import mock_backend
+import subida
+from auditoria import get_escritor_auditoria
+from subida import GestorCargas, planificar
+
+KB = 1024
+MB = 1024 * 1024
+
+
+def _resultados(trabajo) -> dict:
+    assert trabajo.esperar(60), "el lote no terminó"
+    return {r["archivo"]: r for r in trabajo.resumen()["resultados"]}
+
+
+def _responder_html(handler) -> None:
+    cuerpo = b"<html>login</html>"
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/html")
+    handler.send_header("Content-Length", str(len(cuerpo)))
+    handler.end_headers()
+    handler.wfile.write(cuerpo)
+
+
+def _perder_respuesta(monkeypatch, ruta: str) -> None:
+    """El mock procesa los POST a `ruta` pero responde 502, como un gateway que corta la respuesta."""
+    original = mock_backend.MockHandler.do_POST
+
+    def do_post(handler):
+        if handler.path != ruta:
+            return original(handler)
+        # El handler sigue atendiendo la conexión keep-alive: solo esta respuesta es 502
+        handler.send_response = lambda status, *a: type(handler).send_response(handler, 502, *a)
+        try:
+            return original(handler)
+        finally:
+            del handler.send_response
+
+    monkeypatch.setattr(mock_backend.MockHandler, "do_POST", do_post)
+
+
+# --------------------------------------------------
+# PLANIFICACIÓN DEL LOTE
+# --------------------------------------------------
+@pytest.mark.parametrize("tamanos", [
+    [],
+    [10 * KB] * 50,
+    [40 * MB, 5 * MB, 100 * KB, 40 * MB, 2 * MB, 50 * KB],
+    [40 * MB] * 10,
+])
+def test_planificar_envia_cada_archivo_una_vez(tamanos):
+    grupos = planificar(tamanos, workers=4)
+    assert sorted(i for g in grupos for i in g) == list(range(len(tamanos)))
+
+
+def test_planificar_adelanta_los_grandes_sin_ocupar_todos_los_workers():
+    tamanos = [40 * MB, 33 * MB, 50 * MB, 60 * MB, 2 * MB]
+    grupos = planificar(tamanos, workers=3)
+    assert grupos[:2] == [[3], [2]]
+    assert all(len(g) == 1 for g in grupos)
+
+
+def test_planificar_empaqueta_los_pequenos_con_limites():
+    tamanos = [100 * KB] * 40 + [3 * MB]
+    grupos = planificar(tamanos, workers=4)
+    paquetes = [g for g in grupos if len(g) > 1]
+    assert len(paquetes) >= 4
+    for g in paquetes:
+        assert len(g) <= subida.PAQUETE_MAX_ARCHIVOS
+        assert sum(tamanos[i] for i in g) <= subida.PAQUETE_MAX_BYTES
+    assert [40] in grupos
+    assert all(len(g) == 1 for g in planificar(tamanos, workers=4, paquetes=False))
+
+
+def test_paquete_no_se_reenvia_si_la_respuesta_se_pierde(monkeypatch, mock, pdf):
+    _perder_respuesta(monkeypatch, "/storage/pdf/batch")
+    enviados = len(mock.documentos)
+    envios = [(io.BytesIO(pdf(10 * KB)), f"paq{i}.pdf") for i in range(3)]
+    with pytest.raises(api_client.ErrorHTTP):
+        api_client.subir_pdfs_en_lote(envios, "CARGA-PAQ")
+    assert [d["filename"] for d in mock.documentos[enviados:]] == ["paq0.pdf", "paq1.pdf", "paq2.pdf"]
+
+
+def test_paquete_con_error_sin_ok_cuenta_como_fallo(monkeypatch, pdf):
+    monkeypatch.setattr(api_client, "_json_o_error", lambda resp: {"results": [{"error": "ilegible"}, {}]})
+    envios = [(io.BytesIO(pdf(10 * KB)), "a.pdf"), (io.BytesIO(pdf(10 * KB)), "b.pdf")]
+    assert api_client.subir_pdfs_en_lote(envios, "CARGA-PAQ") == [
+        {"ok": False, "error": "ilegible"}, {"ok": True, "error": None}
+    ]
+
+
+# --------------------------------------------------
+# MULTIPART
+# --------------------------------------------------
+def test_multipart_escapa_nombres_y_respeta_content_length():
+    nombre = 'fact "2024"\r\nX-Inyectada: 1.pdf'
+    cuerpo = api_client.MultipartStream(
+        {"id_carga": "C1"}, [("file", nombre, io.BytesIO(b"%PDF-1.4 datos"), "application/pdf")]
+    )
+    datos = b"".join(cuerpo)
+    assert len(datos) == len(cuerpo)
+    assert b"\r\nX-Inyectada" not in datos
+
+    mensaje = email.parser.BytesParser().parsebytes(
+        b"Content-Type: " + cuerpo.content_type.encode() + b"\r\n\r\n" + datos
+    )
+    partes = mensaje.get_payload()
+    assert [p.get_param("name", header="content-disposition") for p in partes] == ["id_carga", "file"]
+    assert partes[1].get_payload(decode=True) == b"%PDF-1.4 datos"
+
+
+# --------------------------------------------------
+# DEDUPLICACIÓN
+# --------------------------------------------------
+def test_lookup_con_respuesta_no_json_no_bloquea_la_subida(monkeypatch):
+    monkeypatch.setattr(mock_backend.MockHandler, "do_GET", _responder_html)
+    assert api_client.existe_pdf_en_backend("0" * 64) is None
+    assert api_client.get_estado_subidas().dedup_pausa_hasta > time.monotonic()
+
+
+def test_vincular_con_respuesta_no_json_no_cuenta_como_vinculado(monkeypatch):
+    original = mock_backend.MockHandler.do_POST
+
+    def do_post(handler):
+        if handler.path.startswith("/storage/pdf/link"):
+            handler._body()
+            return _responder_html(handler)
+        return original(handler)
+
+    monkeypatch.setattr(mock_backend.MockHandler, "do_POST", do_post)
+    assert api_client.vincular_pdf_existente("0" * 64, "C1", "a.pdf") is False
+
+
+def test_pdf_ya_almacenado_se_vincula_sin_reenviar(mock, pdf, archivo):
+    contenido = pdf(20 * KB)
+    api_client.subir_pdf(io.BytesIO(contenido), "previo.pdf", "CARGA-A")
+    enviados = len(mock.documentos)
+
+    trabajo = GestorCargas(max_workers=2)
+    r = _resultados(trabajo.obtener(trabajo.lanzar([archivo("otra_vez.pdf", contenido)], "CARGA-B")))
+    assert r["otra_vez.pdf"]["accion"] == "vinculado"
+    nuevos = mock.documentos[enviados:]
+    assert [(d["id_carga"], d["filename"]) for d in nuevos] == [("CARGA-B", "otra_vez.pdf")]
+
+
+def test_pdf_recomprimido_se_vincula_la_segunda_vez(monkeypatch, mock, pdf, archivo):
+    # El backend guarda el hash de los bytes recomprimidos, no el del original
+    recomprimido = pdf(MB)
+    monkeypatch.setattr(subida, "preparar_envio", lambda a: (None, subida.PdfRecomprimido(a.name, recomprimido)))
+    contenido = pdf(subida.PDF_RECOMPRIMIR_DESDE + MB)
+
+    gestor = GestorCargas(max_workers=2)
+    primero = _resultados(gestor.obtener(gestor.lanzar([archivo("grande.pdf", contenido)], "CARGA-R1")))
+    assert primero["grande.pdf"]["accion"] == "subido"
+    assert get_escritor_auditoria().vaciar(10)
+
+    segundo = _resultados(gestor.obtener(gestor.lanzar([archivo("grande.pdf", contenido)], "CARGA-R2")))
+    assert segundo["grande.pdf"]["accion"] == "vinculado"
+    assert [d["id_carga"] for d in mock.documentos if d["filename"].startswith("grande")][-1] == "CARGA-R2"
+
+
+# --------------------------------------------------
+# LOTES CONCURRENTES
+# --------------------------------------------------
+def test_lote_concurrente_acota_el_paralelismo_y_sube_todo(monkeypatch, mock, pdf, archivo):
+    en_vuelo, pico, lock = 0, 0, threading.Lock()
+    subir_real = subida.subir_pdf
+
+    def subir_contando(*args, **kwargs):
+        nonlocal en_vuelo, pico
+        with lock:
+            en_vuelo += 1
+            pico = max(pico, en_vuelo)
+        try:
+            time.sleep(0.05)
+            return subir_real(*args, **kwargs)
+        finally:
+            with lock:
+                en_vuelo -= 1
+
+    monkeypatch.setattr(subida, "subir_pdf", subir_contando)
+    gestor = GestorCargas(max_workers=3)
+    archivos = [archivo(f"p{i}.pdf", pdf(MB + i)) for i in range(8)]
+    r = _resultados(gestor.obtener(gestor.lanzar(archivos, "CARGA-LOTE")))
+
+    assert all(x["ok"] and x["accion"] == "subido" for x in r.values()), r
+    assert 1 < pico <= 3
+    assert sum(d["id_carga"] == "CARGA-LOTE" for d in mock.documentos) == 8
+
+
+def test_duplicado_en_el_lote_hereda_el_resultado_del_original(monkeypatch, pdf, archivo):
+    def falla(fileobj, filename, *args, **kwargs):
+        raise api_client.ErrorHTTP(type("R", (), {"status_code": 400, "text": "rechazado"})())
+
+    monkeypatch.setattr(subida, "subir_pdf", falla)
+    contenido = pdf(2 * MB)
+    gestor = GestorCargas(max_workers=2)
+    r = _resultados(gestor.obtener(gestor.lanzar(
+        [archivo("a.pdf", contenido), archivo("copia_a.pdf", contenido)], "CARGA-DUP"
+    )))
+    # Cuál es el original depende de qué worker llega antes
+    (duplicado,) = [x for x in r.values() if x["accion"] == "duplicado"]
+    assert not any(x["ok"] for x in r.values())
+    assert "que falló: HTTP 400: rechazado" in duplicado["error"]
+
+
+def test_el_lote_termina_aunque_un_worker_lance(monkeypatch, pdf, archivo):
+    subir_real = subida.subir_archivo
+
+    def roto(archivo_subido, *args):
+        if archivo_subido.name == "roto.pdf":
+            raise RuntimeError("boom")
+        return subir_real(archivo_subido, *args)
+
+    monkeypatch.setattr(subida, "subir_archivo", roto)
+    gestor = GestorCargas(max_workers=2)
+    archivos = [archivo("bien.pdf", pdf(2 * MB)), archivo("roto.pdf", pdf(2 * MB + 1))]
+    r = _resultados(gestor.obtener(gestor.lanzar(archivos, "CARGA-ROTA")))
+    assert r["bien.pdf"]["ok"]
+    assert r["roto.pdf"]["error"] == "error interno: boom"
+
+
+# --------------------------------------------------
+# SUBIDA REANUDABLE
+# --------------------------------------------------
+@pytest.fixture
+def bloques_pequenos(monkeypatch):
+    monkeypatch.setattr(api_client, "UPLOAD_CHUNKED_THRESHOLD", 64 * KB)
+    monkeypatch.setattr(api_client, "UPLOAD_CHUNK_SIZE", 16 * KB)
+
+
+def test_reanuda_en_otro_intento_con_otro_id_carga(monkeypatch, bloques_pequenos, pdf):
+    contenido = pdf(100 * KB)
+    clave = hashlib.sha256(contenido).hexdigest()
+    enviar_real = api_client._enviar_bloque
+
+    def se_corta(upload_id, offset, bloque, total):
+        if offset >= 32 * KB:
+            raise api_client.requests.ConnectionError("red caída")
+        return enviar_real(upload_id, offset, bloque, total)
+
+    monkeypatch.setattr(api_client, "_enviar_bloque", se_corta)
+    with pytest.raises(api_client.requests.ConnectionError):
+        api_client.subir_pdf(io.BytesIO(contenido), "grande.pdf", "CARGA-1", clave=clave)
+    assert clave in api_client.get_estado_subidas().sesiones
+
+    offsets = []
+
+    def registra(upload_id, offset, bloque, total):
+        offsets.append(offset)
+        return enviar_real(upload_id, offset, bloque, total)
+
+    monkeypatch.setattr(api_client, "_enviar_bloque", registra)
+    r = api_client.subir_pdf(io.BytesIO(contenido), "grande.pdf", "CARGA-2", clave=clave)
+    assert (r["id_carga"], r["sha256"]) == ("CARGA-2", clave)
+    assert offsets[0] == 32 * KB
+    assert clave not in api_client.get_estado_subidas().sesiones
+
+
+def test_sesion_perdida_en_el_backend_abre_otra(monkeypatch, mock, bloques_pequenos, pdf):
+    contenido = pdf(100 * KB)
+    enviar_real = api_client._enviar_bloque
+    perdidas = []
+
+    def pierde(upload_id, offset, bloque, total):
+        if offset == 32 * KB and not perdidas:
+            perdidas.append(mock.subidas.pop(upload_id))
+        return enviar_real(upload_id, offset, bloque, total)
+
+    monkeypatch.setattr(api_client, "_enviar_bloque", pierde)
+    r = api_client.subir_pdf(io.BytesIO(contenido), "grande.pdf", "CARGA-3", clave="k")
+    assert perdidas and r["size"] == len(contenido)
+    assert api_client.get_estado_subidas().reanudable_servidor is True
+
+
+def test_sin_protocolo_reanudable_usa_un_post_unico(monkeypatch, bloques_pequenos, pdf):
+    monkeypatch.setattr(api_client, "API_UPLOAD_SESSIONS_URL", api_client.API_UPLOAD_SESSIONS_URL + "-no-existe")
+    contenido = pdf(100 * KB)
+    r = api_client.subir_pdf(io.BytesIO(contenido), "grande.pdf", "CARGA-4", clave="k")
+    assert r["size"] == len(contenido)
+    assert api_client.get_estado_subidas().reanudable_servidor is False
+
+
+def test_post_unico_no_se_reintenta_si_pudo_guardarse(monkeypatch, mock, pdf):
+    _perder_respuesta(monkeypatch, "/storage/pdf")
+    enviados = len(mock.documentos)
+    with pytest.raises(api_client.ErrorHTTP):
+        api_client.subir_pdf(io.BytesIO(pdf(20 * KB)), "una_vez.pdf", "CARGA-6")
+    assert [d["filename"] for d in mock.documentos[enviados:]] == ["una_vez.pdf"]
+
+
+@pytest.mark.parametrize("status,intentos", [(503, 3), (429, 3), (504, 1), (500, 1)])
+def test_post_unico_solo_se_reintenta_si_no_llego_a_procesarse(monkeypatch, pdf, status, intentos):
+    llamadas = []
+    enviar_real = api_client.subir_pdf_a_api
+
+    def falla_dos_veces(*args):
+        llamadas.append(1)
+        if len(llamadas) <= 2:
+            raise api_client.ErrorHTTP(type("R", (), {"status_code": status, "text": ""})())
+        return enviar_real(*args)
+
+    monkeypatch.setattr(api_client, "subir_pdf_a_api", falla_dos_veces)
+    try:
+        api_client.subir_pdf(io.BytesIO(pdf(20 * KB)), "x.pdf", "CARGA-7")
+    except api_client.ErrorHTTP:
+        pass
+    assert len(llamadas) == intentos
+
+
+def test_fallo_definitivo_olvida_la_sesion(monkeypatch, bloques_pequenos, pdf):
+    def rechaza(upload_id, offset, bloque, total):
+        raise api_client.ErrorHTTP(type("R", (), {"status_code": 400, "text": "no"})())
+
+    monkeypatch.setattr(api_client, "_enviar_bloque", rechaza)
+    with pytest.raises(api_client.ErrorHTTP):
+        api_client.subir_pdf(io.BytesIO(pdf(100 * KB)), "grande.pdf", "CARGA-5", clave="k")
+    assert api_client.get_estado_subidas().sesiones == {}
+
+
+def test_sesiones_caducadas_se_purgan():
+    estado = api_client.EstadoSubidas(sesion_ttl=0)
+    estado.guardar_sesion("vieja", "u1", 10)
+    assert estado.sesion("vieja") is None
+    estado.guardar_sesion("otra", "u2", 10)
+    assert list(estado.sesiones) == ["otra"]
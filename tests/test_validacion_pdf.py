@@ -0,0 +1,88 @@
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import subida
+from validacion_pdf import PDF_CABECERA_VENTANA, PDF_COLA_VENTANA, analizar_pdf, chequeo_rapido
+
+
+def _chequear(datos: bytes):
+    return chequeo_rapido(datos[:PDF_CABECERA_VENTANA], datos[-PDF_COLA_VENTANA:])
+
+
+def test_chequeo_rapido_acepta_un_pdf_normal(pdf):
+    assert _chequear(pdf(10 * 1024)) is None
+
+
+def test_chequeo_rapido_rechaza_lo_que_no_es_pdf():
+    assert "cabecera" in _chequear(b"hola, no soy un PDF")
+
+
+def test_chequeo_rapido_detecta_cifrado_en_el_trailer():
+    datos = b"%PDF-1.7\n...\ntrailer\n<< /Root 1 0 R /Encrypt 5 0 R >>\nstartxref\n123\n%%EOF\n"
+    assert "cifrado" in _chequear(datos)
+
+
+def test_datos_tras_el_eof_no_se_rechazan_en_el_chequeo_rapido(pdf):
+    # Escáneres y escrituras incrementales: el %%EOF queda fuera de la ventana
+    assert _chequear(pdf(10 * 1024) + b"\0" * (2 * PDF_COLA_VENTANA)) is None
+
+
+def test_analizar_pdf_decide_sobre_la_cola(tmp_path, pdf):
+    pytest.importorskip("pypdf")
+    con_cola = tmp_path / "con_cola.pdf"
+    con_cola.write_bytes(pdf(10 * 1024) + b"\0" * (2 * PDF_COLA_VENTANA))
+    assert analizar_pdf(str(con_cola), False)["error"] is None
+
+    truncado = tmp_path / "truncado.pdf"
+    truncado.write_bytes(pdf(50 * 1024)[:-30 * 1024])
+    assert analizar_pdf(str(truncado), False)["error"].startswith("PDF dañado")
+
+
+# --------------------------------------------------
+# POOL DE VALIDACIÓN
+# --------------------------------------------------
+def _servir_lento(conn):
+    """Como servir_analisis, pero cada análisis tarda y el PDF marcado con %COLGAR no responde nunca."""
+    while True:
+        try:
+            ruta, recomprimir = conn.recv()
+        except EOFError:
+            return
+        with open(ruta, "rb") as f:
+            if b"%COLGAR" in f.read():
+                time.sleep(3600)
+        time.sleep(0.8)
+        conn.send(analizar_pdf(ruta, recomprimir))
+
+
+@pytest.fixture
+def pool_lento(monkeypatch):
+    pytest.importorskip("pypdf")
+    monkeypatch.setattr(subida, "servir_analisis", _servir_lento)
+    monkeypatch.setattr(subida, "VALIDACION_MAX_PROCESOS", 2)
+    monkeypatch.setattr(subida, "VALIDACION_TIMEOUT_SECS", 3)
+    subida.get_pool_validacion.clear()
+    yield
+    subida.get_pool_validacion.clear()
+    for proceso in multiprocessing.active_children():
+        proceso.terminate()
+        proceso.join()
+
+
+def test_un_analisis_colgado_no_afecta_a_los_demas(pool_lento, pdf, archivo):
+    # Truncados: solo el análisis con pypdf los rechaza, así se ve que sí se validaron
+    # (los 5 esperan en cola más que el plazo entre todos, pero el plazo no cuenta la cola)
+    truncados = [archivo(f"t{i}.pdf", pdf(50 * 1024 + i)[:-30 * 1024]) for i in range(5)]
+    colgado = archivo("colgado.pdf", pdf(10 * 1024) + b"%COLGAR\n")
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futuros = {a.name: pool.submit(subida.preparar_envio, a) for a in [colgado, *truncados]}
+        resultados = {nombre: f.result() for nombre, f in futuros.items()}
+
+    assert resultados.pop("colgado.pdf") == (None, colgado)
+    for motivo, envio in resultados.values():
+        assert motivo.startswith("PDF dañado")
+    assert len(multiprocessing.active_children()) <= 2
@@ -0,0 +1,103 @@
+"""
+Validación de PDFs antes de subirlos.
+
+chequeo_rapido() mira solo los bytes de cabecera y cola del archivo y
+descarta lo que claramente no es un PDF utilizable. analizar_pdf() parsea
+la estructura con pypdf y, si se pide, recomprime; es CPU intensivo y se
+ejecuta en procesos aparte (servir_analisis, ver subida.py), por eso no
+importa Streamlit y lee el PDF de una ruta en disco (no viaja por pickle).
+"""
+import functools
+import importlib.util
+import io
+import os
+import re
+from typing import Optional
+
+# --------------------------------------------------
+# CONFIG VALIDACIÓN
+# --------------------------------------------------
+# La cabecera %PDF- puede ir precedida de basura, pero dentro del primer KB
+PDF_CABECERA_VENTANA = 1024
+# %%EOF y el trailer se buscan en la cola del archivo (solo para detectar cifrado:
+# si no están ahí, decide analizar_pdf)
+PDF_COLA_VENTANA = 4096
+
+_RE_CABECERA = re.compile(rb"%PDF-(\d\.\d)")
+
+
+@functools.lru_cache(maxsize=None)
+def analisis_disponible() -> bool:
+    # pypdf es opcional (sin él solo se hace el chequeo rápido) y solo se
+    # importa en los procesos de análisis, no en el de la app
+    return importlib.util.find_spec("pypdf") is not None
+
+
+def chequeo_rapido(cabecera: bytes, cola: bytes) -> Optional[str]:
+    """
+    Motivo de rechazo, o None si cabecera/cola parecen de un PDF sin cifrar.
+    `cabecera` son los primeros PDF_CABECERA_VENTANA bytes y `cola` los
+    últimos PDF_COLA_VENTANA.
+    """
+    if not _RE_CABECERA.search(cabecera):
+        return "no es un PDF (falta la cabecera %PDF-)"
+
+    # Sin %%EOF/startxref en la cola no se rechaza: escáneres y escrituras
+    # incrementales dejan datos detrás del %%EOF y el PDF sigue siendo válido.
+    # Un truncado de verdad lo rechaza analizar_pdf.
+    if b"%%EOF" not in cola or b"startxref" not in cola:
+        return None
+    if b"/Encrypt" in cola:
+        return "PDF cifrado o protegido con contraseña"
+    return None
+
+
+def analizar_pdf(ruta: str, recomprimir: bool) -> dict:
+    """
+    Se ejecuta en otro proceso. Devuelve {"error", "paginas", "pdf"}:
+    error = motivo de rechazo o None; pdf = bytes recomprimidos solo si
+    se pidió y quedaron más pequeños.
+    """
+    import pypdf
+
+    resultado = {"error": None, "paginas": None, "pdf": None}
+    try:
+        lector = pypdf.PdfReader(ruta)
+        if lector.is_encrypted:
+            resultado["error"] = "PDF cifrado o protegido con contraseña"
+            return resultado
+        resultado["paginas"] = len(lector.pages)
+        if not resultado["paginas"]:
+            resultado["error"] = "PDF sin páginas"
+            return resultado
+    except Exception as e:
+        resultado["error"] = f"PDF dañado ({e})"
+        return resultado
+
+    if recomprimir:
+        try:
+            escritor = pypdf.PdfWriter(clone_from=lector)
+            for pagina in escritor.pages:
+                pagina.compress_content_streams()
+            escritor.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+            salida = io.BytesIO()
+            escritor.write(salida)
+            if salida.tell() < os.path.getsize(ruta):
+                resultado["pdf"] = salida.getvalue()
+        except Exception:
+            pass  # si no se puede recomprimir se envía el original
+
+    return resultado
+
+
+def servir_analisis(conn) -> None:
+    """
+    Bucle de un proceso de análisis: recibe (ruta, recomprimir) por `conn`
+    y responde con analizar_pdf() hasta que el otro extremo se cierra.
+    """
+    while True:
+        try:
+            ruta, recomprimir = conn.recv()
+        except EOFError:
+            return
+        conn.send(analizar_pdf(ruta, recomprimir))